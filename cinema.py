@@ -1,16 +1,27 @@
 import yaml
+import os
 import sys
+import argparse
+import contextlib
 from copy import copy
 
 import cinema_utils as utils
+import cinema_backend
+import cinema_pool
+import migrate
+import cinema_cache
+import cinema_seats
+import cinema_metrics
+import cinema_statements
+import cinema_commit
+import cinema_journal
 
 this = sys.modules[__name__]
 
 # TODO:
 # Salesman:
-# 1. Checking customers
-# 2. Checking repertoire
-# 3. Issuing tickets
+# 1. Checking repertoire
+# 2. Issuing tickets
 # Manager:
 # 2. Updating / delete tickets
 
@@ -29,15 +40,117 @@ def _load_config():
 
 
 
+def _get_pool(role: str, replica: bool = False) -> cinema_pool.ConnectionPool:
+    # One connection pool per database role (and one for its reads from the replica), created on the
+    # first login with that role
+    key = (role, replica)
+    if key not in this.pools:
+        credentials = utils.Credentials(username=role,
+                                        password=this.config['credentials'][role])
+        server = this.config['replica'] if replica else this.config
+
+        this.pools[key] = cinema_pool.ConnectionPool(credentials=credentials,
+                                                     host=server['host'],
+                                                     port=server['port'],
+                                                     database=this.config['database'],
+                                                     backend=this.backend,
+                                                     statements=this.statements,
+                                                     **this.config.get('pool', {}))
+
+    return this.pools[key]
+
+
+
+def _connector(role: str) -> utils.DBConnector:
+    credentials = utils.Credentials(username=role,
+                                    password=this.config['credentials'][role])
+
+    # Connections are borrowed from the role's pool, cached data is shared by all connectors
+    # The listings read from the replica's pool when the 'replica' section has a host
+    replica = this.config.get('replica', {})
+    return utils.DBConnector(credentials=credentials,
+                             host=this.config['host'],
+                             port=this.config['port'],
+                             database=this.config['database'],
+                             pool=_get_pool(role),
+                             read_pool=_get_pool(role, replica=True) if replica.get('host') else None,
+                             read_your_writes=replica.get('read_your_writes', utils.READ_YOUR_WRITES),
+                             replica_retry=replica.get('retry_interval', utils.REPLICA_RETRY),
+                             cache=this.cache,
+                             seat_index=this.seat_index,
+                             metrics=this.metrics,
+                             statements=this.statements,
+                             group_commit=this.group_commit,
+                             journal=this.journal,
+                             hold_ttl=this.config.get('holds', {}).get('ttl', utils.HOLD_TTL),
+                             archive_chunk=this.config.get('archive', {}).get('chunk', utils.ARCHIVE_CHUNK))
+
+
+
+def _group_committer() -> cinema_commit.GroupCommitter:
+    # The writer of the group commit mode sells on a connection of its own, outside the role pools
+    group_config = dict(this.config.get('group_commit', {}))
+    if not group_config.pop('enabled', False):
+        return None
+
+    role = group_config.pop('role', 'salesman')
+    connector = utils.DBConnector(credentials=utils.Credentials(username=role,
+                                                                password=this.config['credentials'][role]),
+                                  host=this.config['host'],
+                                  port=this.config['port'],
+                                  database=this.config['database'],
+                                  backend=this.backend,
+                                  metrics=this.metrics,
+                                  statements=this.statements)
+    if not connector.open():
+        raise SystemExit
+
+    committer = cinema_commit.GroupCommitter(connector=connector, **group_config)
+    committer.start()
+    return committer
+
+
+
+def _sales_journal() -> cinema_journal.SalesJournal:
+    # The journal's flusher sells the journaled tickets on a connection of its own, outside the role pools
+    # It is opened (and reopened after a failure) by the flusher - the journal starts without the database
+    journal_config = dict(this.config.get('journal', {}))
+    if not journal_config.pop('enabled', False):
+        return None
+
+    role = journal_config.pop('role', 'salesman')
+    connector = utils.DBConnector(credentials=utils.Credentials(username=role,
+                                                                password=this.config['credentials'][role]),
+                                  host=this.config['host'],
+                                  port=this.config['port'],
+                                  database=this.config['database'],
+                                  backend=this.backend,
+                                  statements=this.statements)
+
+    journal = cinema_journal.SalesJournal(connector=connector, **journal_config)
+    journal.start()
+    return journal
+
+
+
 def _init_connection():
     print("Connecting to the database...")
-    this.init_credentials = utils.Credentials(username=this.config['init_user'], 
-                                              password=this.config['credentials'][this.config['init_user']])
-
-    this.init_connector = utils.DBConnector(credentials=this.init_credentials,
-                                            host=this.config['host'],
-                                            port=this.config['port'],
-                                            database=this.config['database'])
+    this.backend = cinema_backend.backend_from_config(this.config)
+    if not this.backend.has_users:
+        # The embedded database is kept at the latest schema version without an administrator
+        connection = this.backend.connect()
+        migrate.migrate(connection, engine=this.backend.name)
+        connection.close()
+    this.pools = {}
+    this.cache = cinema_cache.TTLCache(**this.config.get('cache', {}))
+    this.seat_index = cinema_seats.SeatIndex(**this.config.get('seat_index', {}))
+    this.metrics = cinema_metrics.Metrics(**this.config.get('metrics', {}))
+    this.statements = cinema_statements.StatementRegistry(statements=utils.STATEMENTS,
+                                                          backend=this.backend,
+                                                          metrics=this.metrics)
+    this.group_commit = _group_committer()
+    this.journal = _sales_journal()
+    this.init_connector = _connector(this.config['init_user'])
 
     if not this.init_connector.open():
         print("Error: Database connection")
@@ -52,20 +165,25 @@ def _init():
 
 
 
+def _shutdown():
+    # Sells the sales queued for the group commit and flushes the journal - the journaled sales it can not
+    # sell are sold by the next run
+    if this.group_commit:
+        this.group_commit.close()
+        this.group_commit = None
+    if this.journal:
+        this.journal.close()
+        this.journal = None
+
+
+
 def _open_app(init_cmd: utils.Prompt):
     role = this.init_connector.get_role(init_cmd.get_credentials())
     while not role:
         print("Error: Invalid credentials\nTry again!")
         role = this.init_connector.get_role(init_cmd.get_credentials())
     
-    db_credentials = utils.Credentials(username=role, 
-                                        password=this.config['credentials'][role])
-
-    # Connect to the database with a new role
-    connector = utils.DBConnector(credentials=db_credentials,
-                                    host=this.config['host'],
-                                    port=this.config['port'],
-                                    database=this.config['database'])
+    connector = _connector(role)
 
     # Opening the application                  
     if connector.open():
@@ -84,14 +202,80 @@ def _open_app(init_cmd: utils.Prompt):
 
 
 
+def _script_input(prompt: str) -> str:
+    # Commands of a script can not ask for more input
+    print(f"Error: '{prompt.strip()}' has to be given as a command argument in script mode", file=sys.stderr)
+    return "cancel"
+
+
+
+def _script_credentials() -> utils.Credentials:
+    # Staff credentials: CINEMA_USERNAME / CINEMA_PASSWORD or the 'script' section of the config
+    script_config = this.config.get('script', {})
+    credentials = utils.Credentials()
+
+    if not credentials.set(os.environ.get("CINEMA_USERNAME", script_config.get('username', None)),
+                           os.environ.get("CINEMA_PASSWORD", script_config.get('password', None))):
+        raise SystemExit(1)
+    return credentials
+
+
+
+def _run_script(path: str, output: str):
+    # Progress messages go to stderr so that stdout holds only the command output
+    with contextlib.redirect_stdout(sys.stderr):
+        _init()
+        role = this.init_connector.get_role(_script_credentials())
+        if not role:
+            print("Error: Invalid credentials")
+            raise SystemExit(1)
+
+        connector = _connector(role)
+        connector.output = output
+        if not connector.open():
+            print("Error: Database connection")
+            raise SystemExit(1)
+
+    cmd = utils.Prompt(connector, read=_script_input, console=False)
+    try:
+        with (sys.stdin if path == "-" else open(path, 'r')) as script:
+            for line in script:
+                command = line.strip()
+                if not command or command.startswith('#'):
+                    continue
+                if cmd.exec(command):
+                    break
+
+        connector.close()
+    finally:
+        # Also after 'exit'
+        _shutdown()
+
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Cinema ticket sales app")
+    parser.add_argument("--script", metavar="FILE", default=None,
+                        help="run the commands of FILE ('-' for stdin) without interactive prompts")
+    parser.add_argument("--format", choices=["table", "jsonl", "csv"], default="jsonl",
+                        help="output format of the script mode (default: jsonl)")
+    args = parser.parse_args()
+
+    if args.script:
+        _run_script(args.script, args.format)
+        return
+
     print("Cinema ticket sales app\n")
 
     _init()
     init_cmd = utils.Prompt(this.init_connector)
 
-    while True:
-        _open_app(init_cmd)
+    try:
+        while True:
+            _open_app(init_cmd)
+    finally:
+        # 'exit' ends the application with SystemExit
+        _shutdown()
 
 
 
@@ -0,0 +1,322 @@
+import re
+import sqlite3
+import hashlib
+from datetime import datetime
+
+try:
+    import mariadb
+except ImportError:
+    mariadb = None
+
+
+
+class DatabaseError(Exception):
+    pass
+
+
+
+class PoolError(DatabaseError):
+    pass
+
+
+
+# Errors of all available drivers - 'except Error' works for every backend
+Error = (DatabaseError, sqlite3.Error) + ((mariadb.Error,) if mariadb else ())
+
+
+
+# MariaDB / MySQL server - the production backend with the schema from docs/cinema_db.md
+class MariaDBBackend:
+    name = "mariadb"
+    has_users = True    # the server authenticates every database role
+    locking_read = " FOR UPDATE"    # reads the latest row version and locks it until the commit
+    nocase = ""     # the default collations compare (and LIKE matches) case-insensitively
+
+
+    def __getattribute__(self, name: str):
+        return object.__getattribute__(self, name)
+
+
+    def connect(self, credentials, host: str, port: int, database: str):
+        if not mariadb:
+            raise DatabaseError("The mariadb package is not installed")
+
+        return mariadb.connect(
+            user=credentials.username,
+            password=credentials.password,
+            host=host,
+            port=port,
+            database=database
+        )
+
+
+    def ping(self, connection):
+        connection.ping()
+
+
+    def begin(self, connection):
+        # autocommit is off - a transaction is always open
+        pass
+
+
+    def read_only(self, connection):
+        # Connections of a read replica - a write sent by mistake fails instead of diverging the replica
+        cursor = connection.cursor()
+        cursor.execute("SET SESSION TRANSACTION READ ONLY")
+        cursor.close()
+
+
+    def stream_cursor(self, connection):
+        # Unbuffered: rows are read from the server as they are fetched, not all at execute
+        # The connection can not run other statements until the result is read
+        return connection.cursor(buffered=False)
+
+
+    def prepared_cursor(self, connection):
+        # Binary protocol cursor - the statement is parsed by the server at the first execute and
+        # only the parameters are sent when the same statement is executed again
+        return connection.cursor(prepared=True)
+
+
+    def explain_index(self, cursor, query: str, params: tuple, table: str) -> str:
+        # Name of the index used for the table (alias) in the query plan
+        cursor.execute("EXPLAIN " + query, params)
+        for (_, _, p_table, _, _, key, *_) in cursor.fetchall():
+            if p_table == table:
+                return key
+        return None
+
+
+
+# Embedded SQLite database (a file or ':memory:') emulating the MariaDB schema, procedures and triggers
+# Database roles are not emulated - every connection has full access
+class SQLiteBackend:
+    name = "sqlite"
+    has_users = False
+    locking_read = ""   # a single writer at a time - reads always see the latest data
+    nocase = " COLLATE NOCASE"      # LIKE prefixes use only NOCASE indexes (migration 6)
+
+
+    def __init__(self, path: str = ":memory:"):
+        self.path = path
+        self._memory = path == ":memory:"
+        if self._memory:
+            # All connections of the process share one in-memory database, kept alive by _keeper
+            self.path = f"file:cinema_{id(self)}?mode=memory&cache=shared"
+        self._keeper = None
+        self._keeper = self.connect()
+
+
+    def __getattribute__(self, name: str):
+        return object.__getattribute__(self, name)
+
+
+    def connect(self, credentials=None, host: str = None, port: int = None, database: str = None):
+        connection = sqlite3.connect(self.path,
+                                     uri=self._memory,
+                                     timeout=30,
+                                     check_same_thread=False,
+                                     detect_types=sqlite3.PARSE_DECLTYPES)
+        connection.create_function("PASSWORD", 1, _mysql_password, deterministic=True)
+        connection.execute("PRAGMA foreign_keys = ON")
+
+        if not self._keeper:
+            connection.executescript(SQLITE_SCHEMA)
+            if not connection.execute("SELECT COUNT(*) FROM Customers").fetchone()[0]:
+                connection.executescript(SQLITE_DATA)
+            connection.commit()
+        return connection
+
+
+    def ping(self, connection):
+        connection.execute("SELECT 1")
+
+
+    def begin(self, connection):
+        # sqlite3 opens transactions only before DML - savepoints need an explicit one
+        # IMMEDIATE takes the write lock at once: a deferred transaction reading first could deadlock
+        # with another writer and fail with 'database is locked' instead of waiting for it
+        if not connection.in_transaction:
+            connection.execute("BEGIN IMMEDIATE")
+
+
+    def read_only(self, connection):
+        connection.execute("PRAGMA query_only = ON")
+
+
+    def stream_cursor(self, connection):
+        # sqlite3 cursors step through the result as it is fetched
+        return connection.cursor()
+
+
+    def prepared_cursor(self, connection):
+        # sqlite3 keeps the compiled statements of a connection in its statement cache
+        return connection.cursor()
+
+
+    def explain_index(self, cursor, query: str, params: tuple, table: str) -> str:
+        cursor.execute("EXPLAIN QUERY PLAN " + query, params)
+        for (*_, detail) in cursor.fetchall():
+            match = re.match(r"(?:SEARCH|SCAN) (\w+)(?: AS (\w+))?.* USING (?:COVERING )?INDEX (\w+)", detail)
+            if match and table in match.group(1, 2):
+                return match.group(3)
+        return None
+
+
+
+def backend_from_config(config: dict):
+    if config.get('engine', "mariadb") == "sqlite":
+        return SQLiteBackend(config.get('sqlite_path', ":memory:"))
+    return MariaDBBackend()
+
+
+
+def _mysql_password(password: str) -> str:
+    # MySQL / MariaDB PASSWORD(): '*' + upper hex of SHA1(SHA1(password))
+    if password is None:
+        return None
+    return '*' + hashlib.sha1(hashlib.sha1(password.encode()).digest()).hexdigest().upper()
+
+
+
+sqlite3.register_adapter(datetime, lambda value: value.strftime('%Y-%m-%d %H:%M:%S'))
+sqlite3.register_converter("DATETIME", lambda value: datetime.fromisoformat(value.decode()))
+
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS Staff (
+    username VARCHAR(30) NOT NULL,
+    pswd VARCHAR(50) NOT NULL,
+    role TEXT CHECK(role IN ('salesman', 'manager')),
+
+    PRIMARY KEY(username)
+);
+
+CREATE TABLE IF NOT EXISTS Customers (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name VARCHAR(30),
+    surname VARCHAR(30),
+    phoneNumber CHAR(9),
+    email VARCHAR(50),
+    n_tickets INT
+);
+
+CREATE TABLE IF NOT EXISTS Languages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name VARCHAR(30) NOT NULL,
+    type TEXT NOT NULL CHECK(type IN ('Original', 'Subtitles', 'Voiceover', 'Dubbing'))
+);
+
+CREATE TABLE IF NOT EXISTS Movies (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    title VARCHAR(50) NOT NULL,
+    length INT NOT NULL CHECK(length > 0),
+    language_id INT NOT NULL CHECK(language_id > 0) REFERENCES Languages(id)
+);
+
+CREATE TABLE IF NOT EXISTS Rooms (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    s_max INT NOT NULL CHECK(s_max > 0),
+    ticket_price INT CHECK(ticket_price > 0)
+);
+
+CREATE TABLE IF NOT EXISTS Schedule (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    movie_id INT NOT NULL CHECK(movie_id > 0) REFERENCES Movies(id),
+    room_id INT NOT NULL CHECK(room_id > 0) REFERENCES Rooms(id),
+    start_time DATETIME NOT NULL,
+    s_taken INT NOT NULL CHECK(s_taken >= 0)
+);
+
+CREATE TABLE IF NOT EXISTS Tickets (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    customer_id INT NOT NULL CHECK(customer_id >= 0) REFERENCES Customers(id),
+    schedule_id INT NOT NULL CHECK(schedule_id > 0) REFERENCES Schedule(id),
+    n_seats INT NOT NULL CHECK(n_seats > 0)
+);
+
+-- Rooms.ticket_price DEFAULT (s_max / 2)
+CREATE TRIGGER IF NOT EXISTS roomPriceDefault
+    AFTER INSERT ON Rooms
+    FOR EACH ROW WHEN NEW.ticket_price IS NULL
+    BEGIN
+        UPDATE Rooms SET ticket_price = MAX(NEW.s_max / 2, 1) WHERE id = NEW.id;
+    END;
+
+-- checkMovieOverlap: a room can not play two movies at the same time
+-- Only the screenings starting less than the longest movie earlier are checked (an index range scan)
+CREATE TRIGGER IF NOT EXISTS movieOverlapInsert
+    BEFORE INSERT ON Schedule
+    FOR EACH ROW
+    BEGIN
+        SELECT RAISE(ABORT, 'Movie overlap')
+            WHERE EXISTS (
+                SELECT 1
+                    FROM Schedule AS s JOIN Movies AS m ON s.movie_id = m.id
+                    WHERE s.room_id = NEW.room_id
+                        AND s.start_time > datetime(NEW.start_time,
+                            '-' || (SELECT MAX(length) FROM Movies) || ' minutes')
+                        AND s.start_time < datetime(NEW.start_time,
+                            '+' || (SELECT length FROM Movies WHERE id = NEW.movie_id) || ' minutes')
+                        AND NEW.start_time < datetime(s.start_time, '+' || m.length || ' minutes'));
+    END;
+
+CREATE TRIGGER IF NOT EXISTS movieOverlapUpdate
+    BEFORE UPDATE OF movie_id, room_id, start_time ON Schedule
+    FOR EACH ROW
+    BEGIN
+        SELECT RAISE(ABORT, 'Movie overlap')
+            WHERE EXISTS (
+                SELECT 1
+                    FROM Schedule AS s JOIN Movies AS m ON s.movie_id = m.id
+                    WHERE s.room_id = NEW.room_id AND s.id <> NEW.id
+                        AND s.start_time > datetime(NEW.start_time,
+                            '-' || (SELECT MAX(length) FROM Movies) || ' minutes')
+                        AND s.start_time < datetime(NEW.start_time,
+                            '+' || (SELECT length FROM Movies WHERE id = NEW.movie_id) || ' minutes')
+                        AND NEW.start_time < datetime(s.start_time, '+' || m.length || ' minutes'));
+    END;
+
+-- updateTakenSeats: keeps Schedule.s_taken in sync with the tickets and rejects overflows
+CREATE TRIGGER IF NOT EXISTS takenSeatsInsert
+    BEFORE INSERT ON Tickets
+    FOR EACH ROW
+    BEGIN
+        SELECT RAISE(ABORT, 'Seat number overflow')
+            FROM Schedule AS s JOIN Rooms AS r ON s.room_id = r.id
+            WHERE s.id = NEW.schedule_id AND s.s_taken + NEW.n_seats NOT BETWEEN 0 AND r.s_max;
+        UPDATE Schedule SET s_taken = s_taken + NEW.n_seats WHERE id = NEW.schedule_id;
+    END;
+
+CREATE TRIGGER IF NOT EXISTS takenSeatsUpdate
+    BEFORE UPDATE OF schedule_id, n_seats ON Tickets
+    FOR EACH ROW
+    BEGIN
+        SELECT RAISE(ABORT, 'Seat number overflow')
+            FROM Schedule AS s JOIN Rooms AS r ON s.room_id = r.id
+            WHERE s.id = NEW.schedule_id AND s.s_taken - OLD.n_seats + NEW.n_seats NOT BETWEEN 0 AND r.s_max;
+        UPDATE Schedule SET s_taken = s_taken - OLD.n_seats + NEW.n_seats WHERE id = NEW.schedule_id;
+    END;
+
+CREATE TRIGGER IF NOT EXISTS takenSeatsDelete
+    BEFORE DELETE ON Tickets
+    FOR EACH ROW
+    BEGIN
+        SELECT RAISE(ABORT, 'Seat number overflow')
+            FROM Schedule AS s
+            WHERE s.id = OLD.schedule_id AND s.s_taken - OLD.n_seats < 0;
+        UPDATE Schedule SET s_taken = s_taken - OLD.n_seats WHERE id = OLD.schedule_id;
+    END;
+"""
+
+
+
+SQLITE_DATA = """
+INSERT INTO Customers(name, n_tickets) VALUES ('anonim', 0);
+
+INSERT INTO Languages(name, type) VALUES
+    ('English', 'Subtitles'),
+    ('English', 'Voiceover'),
+    ('English', 'Dubbing');
+"""
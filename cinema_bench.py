@@ -0,0 +1,636 @@
+import argparse
+import contextlib
+import io
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import yaml
+from datetime import datetime, timedelta
+
+import cinema_utils as utils
+import cinema_backend
+import cinema_commit
+import cinema_seats
+import migrate
+
+
+
+class _RowCursor:
+    # Minimal cursor replaying pre-generated rows - isolates the result set
+    # building cost from the database round-trips
+    def __init__(self, rows: list):
+        self.rows = rows
+        self.pos = 0
+
+
+    def fetchall(self) -> list:
+        rows = self.rows[self.pos:]
+        self.pos = len(self.rows)
+        return rows
+
+
+    def fetchmany(self, size: int) -> list:
+        rows = self.rows[self.pos:self.pos + size]
+        self.pos += len(rows)
+        return rows
+
+
+
+class _Terminal:
+    # Simulated box-office terminal of cinema_server
+    def __init__(self, host: str, port: int):
+        self.sock = socket.create_connection((host, port))
+        self.buffer = b""
+
+
+    def expect(self, *prompts: str) -> str:
+        prompts = tuple(prompt.encode() for prompt in prompts)
+        while not self.buffer.endswith(prompts):
+            data = self.sock.recv(65536)
+            if not data:
+                raise ConnectionError("session closed")
+            self.buffer += data
+        (output, self.buffer) = (self.buffer, b"")
+        return output.decode()
+
+
+    def send(self, line: str):
+        self.sock.sendall((line + "\n").encode())
+
+
+    def close(self):
+        self.sock.close()
+
+
+
+def _connector(role: str) -> utils.DBConnector:
+    with open("docs/db_config.yaml", 'r') as file:
+        config = yaml.safe_load(file)
+
+    backend = cinema_backend.backend_from_config(config)
+    if not backend.has_users:
+        connection = backend.connect()
+        with contextlib.redirect_stdout(io.StringIO()):
+            migrate.migrate(connection, engine=backend.name)
+        connection.close()
+
+    connector = utils.DBConnector(credentials=utils.Credentials(username=role,
+                                                                password=config['credentials'][role]),
+                                  host=config['host'],
+                                  port=config['port'],
+                                  database=config['database'],
+                                  backend=backend)
+    if not connector.open():
+        raise SystemExit
+    return connector
+
+
+
+def _report_latency(name: str, latencies: list, n_rows: int = None):
+    # n_rows: rows returned by a single call - adds the row throughput to the report
+    latencies = sorted(latencies)
+    p50 = statistics.median(latencies)
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    total = max(sum(latencies), 1e-9)
+    rows = f"  rows/s: {n_rows * len(latencies) / total:12.0f}" if n_rows is not None else ""
+    print(f"{name:<24} calls: {len(latencies):>7}  p50: {p50 * 1e3:8.3f} ms  p99: {p99 * 1e3:8.3f} ms  "
+          f"calls/s: {len(latencies) / total:9.1f}{rows}")
+
+
+
+def _time_calls(fn, n: int) -> list:
+    # Latencies of n calls of fn - the printed output is rendered but discarded
+    latencies = []
+    for _ in range(n):
+        output = io.StringIO()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(output):
+            fn()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+
+def _report(name: str, n_rows: int, elapsed: float):
+    print(f"{name:<24} rows: {n_rows:>9}  time: {elapsed:9.4f} s  "
+          f"per row: {elapsed / max(n_rows, 1) * 1e6:7.3f} us  rows/s: {n_rows / max(elapsed, 1e-9):12.0f}")
+
+
+
+def bench_resultset(args):
+    print("ResultSet building (Tickets rows: id, customer_id, schedule_id, n_seats)\n")
+    for n_rows in args.sizes:
+        rows = [(i, i % 1000, i % 5000, 1 + i % 6) for i in range(n_rows)]
+
+        start = time.perf_counter()
+        result = utils.ResultSet.from_cursor(_RowCursor(rows),
+                                             ['id', 'customer_id', 'schedule_id', 'n_seats'],
+                                             chunk_size=utils.FETCH_CHUNK_SIZE)
+        result.table()
+        _report("ticket showall", len(result), time.perf_counter() - start)
+
+
+
+def bench_issue(args):
+    # Issue-to-print latency of 'ticket new' - the tickets are cancelled afterwards
+    connector = _connector("manager")
+    latencies = []
+    issued = []
+
+    for _ in range(args.n):
+        output = io.StringIO()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(output):
+            ticket = connector.manage_tickets("new", customer_id=args.customer,
+                                            schedule_id=args.schedule,
+                                            n_seats=args.seats)
+        latencies.append(time.perf_counter() - start)
+        if not ticket:
+            print(output.getvalue().strip())
+            break
+        issued.append(ticket.id)
+
+    for ticket_id in issued:
+        connector.manage_tickets("cancel", id=ticket_id)
+    connector.close()
+
+    if latencies:
+        _report_latency("ticket new", latencies)
+
+
+
+def bench_available(args):
+    # SeatIndex.find latency on a synthetic day of screenings
+    day = datetime(2026, 1, 1)
+    rows = []
+    for s_id in range(args.screenings):
+        start = day + timedelta(minutes=random.randrange(9 * 60, 23 * 60))
+        s_max = random.choice([50, 120, 300, 500])
+        rows.append((s_id, s_id % args.movies, f"Movie {s_id % args.movies}", "English", "Subtitles",
+                     start, random.randrange(s_max + 1), s_max))
+
+    index = cinema_seats.SeatIndex()
+    index.load(day, rows)
+
+    queries = [dict(), dict(movie_id=1), dict(start=day.replace(hour=18).time(), end=day.replace(hour=21).time())]
+    for kwargs in queries:
+        latencies = []
+        for _ in range(args.n):
+            start = time.perf_counter()
+            index.find(6, day, **kwargs)
+            latencies.append(time.perf_counter() - start)
+        _report_latency(f"available 6 {' '.join(map(str, kwargs.values())) or 'any'}"[:24], latencies)
+
+
+
+def bench_ops(args):
+    # Latency of every DBConnector operation against the configured database - see gen_data.py
+    connector = _connector("manager")
+    connector.output = args.format
+    date = args.date.strftime('%Y-%m-%d')
+    credentials = utils.Credentials(username=args.user, password=args.password)
+
+    connector.cursor.execute("SELECT COUNT(*) FROM Tickets")
+    (n_tickets,) = connector.cursor.fetchone()
+    n_schedule = len(connector._fetch_schedule(date, date))
+    n_repertoire = len(connector._fetch_repertoire(date, date))
+    screenings = connector.find_screenings(args.seats, date)
+    if not screenings:
+        print(f"Error: No screening with {args.seats} free seats on {date} - generate data with gen_data.py")
+        connector.close()
+        return
+    schedule_id = screenings[0][0]
+
+    print(f"Database: {connector.backend.name}  tickets: {n_tickets}  screenings on {date}: {n_schedule}\n")
+
+    if args.user:
+        _report_latency("get_role", _time_calls(lambda: connector.get_role(credentials), args.n))
+    _report_latency("display_schedule", _time_calls(lambda: connector.display_schedule(date), args.n), n_schedule)
+    _report_latency("display_repertoire", _time_calls(lambda: connector.display_repertoire(date), args.n),
+                    n_repertoire)
+    _report_latency("find_screenings", _time_calls(lambda: connector.find_screenings(args.seats, date), args.n))
+    _report_latency("get_price", _time_calls(lambda: connector.get_price(schedule_id), args.n))
+    _report_latency("get_customer_data", _time_calls(lambda: connector.get_customer_data(args.customer), args.n))
+    _report_latency("get_last_ticket", _time_calls(connector.get_last_ticket, args.n))
+
+    # Every issued ticket is cancelled right away - the screening never runs out of seats
+    # and the data is left unchanged
+    (new_latencies, cancel_latencies) = ([], [])
+    for _ in range(args.n):
+        tickets = []
+        new_latencies += _time_calls(lambda: tickets.append(connector.manage_tickets(
+            "new", customer_id=args.customer, schedule_id=schedule_id, n_seats=args.seats)), 1)
+        if not tickets[0]:
+            print(f"Error: Issuing a ticket for the screening {schedule_id} failed")
+            break
+        cancel_latencies += _time_calls(lambda: connector.manage_tickets("cancel", id=tickets[0].id), 1)
+
+    if cancel_latencies:
+        _report_latency("manage_tickets new", new_latencies)
+        _report_latency("manage_tickets cancel", cancel_latencies)
+    connector.connection.commit()
+
+    _report_latency("manage_tickets showall", _time_calls(lambda: connector.manage_tickets("showall"),
+                                                          args.showall), n_tickets)
+    connector.close()
+
+
+
+def bench_contention(args):
+    # Ticket sales throughput of concurrent sellers (one connection each) on a single screening
+    # Every sold ticket is cancelled by its seller right away - the screening never runs out of seats
+    setup = _connector("manager")
+    schedule_id = args.schedule
+    if not schedule_id:
+        setup.cursor.execute("""
+        SELECT s.id
+            FROM Schedule AS s JOIN Rooms AS r ON s.room_id = r.id
+            ORDER BY r.s_max - s.s_taken DESC, s.id
+            LIMIT 1
+        """)
+        (schedule_id,) = setup.cursor.fetchone()
+    setup.close()
+
+    print(f"Screening: {schedule_id}  mode: {args.mode}  tickets per seller: {args.n}\n")
+
+    def sell(connector: utils.DBConnector) -> int:
+        if args.mode == "holds":
+            ticket = connector.manage_tickets("new", customer_id=args.customer, schedule_id=schedule_id,
+                                              n_seats=args.seats)
+            return ticket.id if ticket else None
+
+        # The ticket insert alone - the takenSeatsInsert trigger locks the screening until the commit
+        try:
+            connector.cursor.execute("INSERT INTO Tickets(customer_id, schedule_id, n_seats) VALUES (?, ?, ?)",
+                                     (args.customer, schedule_id, args.seats))
+            connector.connection.commit()
+            return connector.cursor.lastrowid
+        except cinema_backend.Error:
+            connector.connection.rollback()
+            return None
+
+    for n_sellers in args.sellers:
+        connectors = [_connector("manager") for _ in range(n_sellers)]
+        latencies = []
+        failed = []
+        lock = threading.Lock()
+        ready = threading.Barrier(n_sellers + 1)
+
+        def seller(connector: utils.DBConnector):
+            (seller_latencies, seller_failed) = ([], 0)
+            ready.wait()
+            for _ in range(args.n):
+                start = time.perf_counter()
+                ticket_id = sell(connector)
+                seller_latencies.append(time.perf_counter() - start)
+                if not ticket_id:
+                    seller_failed += 1
+                    continue
+                connector.manage_tickets("cancel", id=ticket_id)
+                connector.connection.commit()
+
+            with lock:
+                latencies.extend(seller_latencies)
+                failed.append(seller_failed)
+
+        threads = [threading.Thread(target=seller, args=(connector,)) for connector in connectors]
+        # The sellers' output is discarded - redirected once for all threads
+        with contextlib.redirect_stdout(io.StringIO()):
+            for thread in threads:
+                thread.start()
+            ready.wait()
+            start = time.perf_counter()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - start
+
+        retries = sum(connector.hold_retries for connector in connectors)
+        for connector in connectors:
+            connector.close()
+
+        sold = len(latencies) - sum(failed)
+        print(f"sellers: {n_sellers:>3}  sold: {sold:>6}  failed: {sum(failed):>5}  retries: {retries:>6}  "
+              f"time: {elapsed:8.3f} s  throughput: {sold / elapsed:8.1f} tickets/s")
+        _report_latency(f"  sale ({n_sellers} sellers)", latencies)
+
+
+
+def bench_statements(args):
+    # Latency per call of the registry statements - the SQL text sent (and parsed) with every call
+    # against the prepared statements of the connector's StatementRegistry
+    connector = _connector("manager")
+    connector.cursor.execute("SELECT MAX(id) FROM Tickets")
+    (ticket_id,) = connector.cursor.fetchone()
+    connector.cursor.execute("SELECT MAX(id) FROM Schedule")
+    (schedule_id,) = connector.cursor.fetchone()
+
+    day = (args.date, args.date + timedelta(days=1))
+    params = {
+        'role': (args.user or "", args.password or ""),
+        'price': (schedule_id,),
+        'customer': (args.customer,),
+        'last_ticket': (),
+        'ticket': (ticket_id,),
+        'schedule': day,
+        'repertoire': day
+    }
+
+    print(f"Database: {connector.backend.name}  calls per statement: {args.n}\n")
+    text_cursor = connector.connection.cursor()
+    for (name, values) in params.items():
+        def text():
+            text_cursor.execute(utils.STATEMENTS[name], values)
+            text_cursor.fetchall()
+
+        def prepared():
+            connector.statements.execute(connector.connection, name, values).fetchall()
+
+        # The first calls open the cursors and fill the statement caches
+        text()
+        prepared()
+        _report_latency(f"{name} (text)", _time_calls(text, args.n))
+        _report_latency(f"{name} (prepared)", _time_calls(prepared, args.n))
+
+    text_cursor.close()
+    stats = connector.statements.stats()
+    print(f"\nprepared: {stats['prepares']}  calls: {stats['calls']}")
+    connector.close()
+
+
+
+def bench_commit(args):
+    # 'ticket new' throughput of concurrent sellers committing every sale in its command's unit of work
+    # against the group commit (one commit per window of sales of all sellers)
+    # The sellers spread their sales over the screenings with the most free seats - no hot screening
+    # row - and the sold tickets are cancelled in one transaction after every round
+    setup = _connector("manager")
+    setup.cursor.execute("""
+    SELECT s.id
+        FROM Schedule AS s JOIN Rooms AS r ON s.room_id = r.id
+        ORDER BY r.s_max - s.s_taken DESC, s.id
+        LIMIT ?
+    """, (args.screenings,))
+    screenings = [schedule_id for (schedule_id,) in setup.cursor.fetchall()]
+
+    print(f"Database: {setup.backend.name}  screenings: {len(screenings)}  tickets per seller: {args.n}  "
+          f"group window: {args.window:g} ms\n")
+
+    for mode in args.modes:
+        committer = None
+        if mode == "group":
+            committer = cinema_commit.GroupCommitter(connector=_connector("manager"), window_ms=args.window,
+                                                     max_batch=args.max_batch)
+            committer.start()
+
+        for n_sellers in args.sellers:
+            connectors = [_connector("manager") for _ in range(n_sellers)]
+            for connector in connectors:
+                connector.group_commit = committer
+            latencies = []
+            sold = []
+            lock = threading.Lock()
+            ready = threading.Barrier(n_sellers + 1)
+
+            def seller(seller_no: int, connector: utils.DBConnector):
+                (seller_latencies, seller_sold) = ([], [])
+                ready.wait()
+                for i in range(args.n):
+                    schedule_id = screenings[(seller_no + i * n_sellers) % len(screenings)]
+                    start = time.perf_counter()
+                    with connector.transaction():
+                        ticket = connector.manage_tickets("new", customer_id=args.customer,
+                                                          schedule_id=schedule_id, n_seats=args.seats)
+                    seller_latencies.append(time.perf_counter() - start)
+                    if ticket:
+                        seller_sold.append(ticket.id)
+
+                with lock:
+                    latencies.extend(seller_latencies)
+                    sold.extend(seller_sold)
+
+            threads = [threading.Thread(target=seller, args=(seller_no, connector))
+                       for (seller_no, connector) in enumerate(connectors)]
+            with contextlib.redirect_stdout(io.StringIO()):
+                for thread in threads:
+                    thread.start()
+                ready.wait()
+                start = time.perf_counter()
+                for thread in threads:
+                    thread.join()
+                elapsed = time.perf_counter() - start
+
+            for connector in connectors:
+                connector.close()
+            for i in range(0, len(sold), 1000):
+                chunk = sold[i:i + 1000]
+                setup.cursor.execute(f"DELETE FROM Tickets WHERE id IN ({', '.join('?' * len(chunk))})", tuple(chunk))
+            setup.connection.commit()
+
+            print(f"{mode:<8} sellers: {n_sellers:>3}  sold: {len(sold):>6}  failed: {len(latencies) - len(sold):>5}  "
+                  f"time: {elapsed:8.3f} s  throughput: {len(sold) / elapsed:8.1f} tickets/s")
+            _report_latency(f"  sale ({n_sellers} sellers)", latencies)
+
+        if committer:
+            group = committer.stats()
+            committer.close()
+            print(f"Group commit: {group['sales']} sales in {group['batches']} commits "
+                  f"({group['avg_batch']:.1f} per commit)")
+        print()
+
+    setup.close()
+
+
+
+def bench_startup(args):
+    # Cumulative import time of the application modules (python -X importtime) against a budget
+    imports = {}
+    for _ in range(args.n):
+        process = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {args.module}"],
+                                 capture_output=True, text=True)
+        if process.returncode:
+            print(process.stderr.strip().splitlines()[-1])
+            raise SystemExit(1)
+
+        for line in process.stderr.splitlines():
+            if not line.startswith("import time:") or "cumulative" in line:
+                continue
+            (_, cumulative, name) = line[len("import time:"):].split("|")
+            imports.setdefault(name.strip(), []).append(int(cumulative) / 1e3)
+
+    # The best of n runs filters out the cold disk cache
+    times = {name: min(values) for (name, values) in imports.items()}
+    total = times[args.module]
+    for (name, ms) in sorted(times.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{name:<40} {ms:8.1f} ms")
+
+    heavy = [name for name in args.forbid if name in times]
+    print(f"\nimport {args.module}: {total:.1f} ms (budget: {args.budget:.0f} ms)")
+    if heavy:
+        print(f"Error: Imported at startup: {', '.join(heavy)}")
+    if heavy or total > args.budget:
+        raise SystemExit(1)
+
+
+
+def bench_server(args):
+    # Command throughput of cinema_server with many concurrent terminals
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    ready = threading.Barrier(args.terminals + 1)
+
+    def terminal():
+        session_latencies = []
+        try:
+            term = _Terminal(args.host, args.port)
+            term.expect("Username: ")
+            term.send(args.user)
+            term.expect("Password: ")
+            term.send(args.password)
+            if "Success" not in term.expect("cmd> ", "Username: "):
+                raise ConnectionError("login failed")
+        except (OSError, ConnectionError) as e:
+            with lock:
+                errors.append(str(e))
+            ready.abort()
+            return
+
+        try:
+            ready.wait()
+        except threading.BrokenBarrierError:
+            return
+
+        for i in range(args.commands):
+            start = time.perf_counter()
+            term.send(args.command[i % len(args.command)])
+            term.expect("cmd> ")
+            session_latencies.append(time.perf_counter() - start)
+        term.send("exit")
+        term.close()
+
+        with lock:
+            latencies.extend(session_latencies)
+
+    threads = [threading.Thread(target=terminal) for _ in range(args.terminals)]
+    for thread in threads:
+        thread.start()
+
+    try:
+        ready.wait()
+    except threading.BrokenBarrierError:
+        for thread in threads:
+            thread.join()
+        print(f"Error: {errors[0] if errors else 'session setup failed'}")
+        return
+
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    print(f"terminals: {args.terminals}  commands: {len(latencies)}  time: {elapsed:.3f} s  "
+          f"throughput: {len(latencies) / elapsed:.1f} commands/s")
+    _report_latency("command", latencies)
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cinema application benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    resultset = commands.add_parser("resultset", help="listing result set building scaling")
+    resultset.add_argument("--sizes", type=int, nargs='+',
+                           default=[1000, 10000, 100000, 1000000])
+    resultset.set_defaults(run=bench_resultset)
+
+    issue = commands.add_parser("issue", help="'ticket new' issue-to-print latency")
+    issue.add_argument("--schedule", type=int, required=True)
+    issue.add_argument("--customer", type=int, default=1)
+    issue.add_argument("--seats", type=int, default=1)
+    issue.add_argument("-n", type=int, default=200)
+    issue.set_defaults(run=bench_issue)
+
+    available = commands.add_parser("available", help="seat availability index lookups")
+    available.add_argument("--screenings", type=int, default=500)
+    available.add_argument("--movies", type=int, default=40)
+    available.add_argument("-n", type=int, default=1000)
+    available.set_defaults(run=bench_available)
+
+    ops = commands.add_parser("ops", help="latency of every DBConnector operation")
+    ops.add_argument("--date", type=lambda date: datetime.strptime(date, '%Y-%m-%d'), default=datetime.today(),
+                     help="day of the listed screenings (default: today)")
+    ops.add_argument("--user", default=None, help="staff username for get_role")
+    ops.add_argument("--password", default=None)
+    ops.add_argument("--customer", type=int, default=1)
+    ops.add_argument("--seats", type=int, default=2, help="seats of the searched screenings and issued tickets")
+    ops.add_argument("--format", choices=["table", "jsonl", "csv"], default="table",
+                     help="output format rendered by the listing operations")
+    ops.add_argument("-n", type=int, default=200)
+    ops.add_argument("--showall", type=int, default=5, help="calls of 'ticket showall' (listing all tickets)")
+    ops.set_defaults(run=bench_ops)
+
+    contention = commands.add_parser("contention", help="ticket sales throughput of concurrent sellers")
+    contention.add_argument("--schedule", type=int, default=None,
+                            help="screening sold by every seller (default: the one with the most free seats)")
+    contention.add_argument("--sellers", type=int, nargs='+', default=[1, 2, 4, 8, 16],
+                            help="numbers of concurrent sellers")
+    contention.add_argument("--mode", choices=["holds", "direct"], default="holds",
+                            help="'ticket new' with seat holds or the plain ticket insert")
+    contention.add_argument("--customer", type=int, default=1)
+    contention.add_argument("--seats", type=int, default=1)
+    contention.add_argument("-n", type=int, default=100, help="tickets sold by every seller")
+    contention.set_defaults(run=bench_contention)
+
+    commit = commands.add_parser("commit", help="ticket sales throughput with a commit per sale and the group commit")
+    commit.add_argument("--modes", choices=["command", "group"], nargs='+', default=["command", "group"],
+                        help="'command': every sale committed by its command, 'group': the group commit")
+    commit.add_argument("--sellers", type=int, nargs='+', default=[1, 4, 16, 64],
+                        help="numbers of concurrent sellers")
+    commit.add_argument("--screenings", type=int, default=50, help="screenings the sales are spread over")
+    commit.add_argument("--window", type=float, default=5, help="group commit window [ms]")
+    commit.add_argument("--max-batch", type=int, default=64, help="sales per group commit")
+    commit.add_argument("--customer", type=int, default=1)
+    commit.add_argument("--seats", type=int, default=1)
+    commit.add_argument("-n", type=int, default=50, help="tickets sold by every seller")
+    commit.set_defaults(run=bench_commit)
+
+    statements = commands.add_parser("statements", help="text protocol against prepared statement latency")
+    statements.add_argument("--date", type=lambda date: datetime.strptime(date, '%Y-%m-%d'),
+                            default=datetime.today().replace(hour=0, minute=0, second=0, microsecond=0),
+                            help="day of the schedule and repertoire queries (default: today)")
+    statements.add_argument("--user", default=None, help="staff username of the role query")
+    statements.add_argument("--password", default=None)
+    statements.add_argument("--customer", type=int, default=1)
+    statements.add_argument("-n", type=int, default=2000)
+    statements.set_defaults(run=bench_statements)
+
+    startup = commands.add_parser("startup", help="application import time (python -X importtime)")
+    startup.add_argument("--module", default="cinema")
+    startup.add_argument("--budget", type=float, default=150, help="maximum import time [ms]")
+    startup.add_argument("--forbid", nargs='*', default=["pandas", "numpy", "tabulate"],
+                         help="modules which must not be imported at startup")
+    startup.add_argument("--top", type=int, default=10, help="slowest imports listed")
+    startup.add_argument("-n", type=int, default=5)
+    startup.set_defaults(run=bench_startup)
+
+    server = commands.add_parser("server", help="cinema_server throughput with concurrent terminals")
+    server.add_argument("--host", default="127.0.0.1")
+    server.add_argument("--port", type=int, default=7070)
+    server.add_argument("--user", required=True)
+    server.add_argument("--password", required=True)
+    server.add_argument("--terminals", type=int, default=50)
+    server.add_argument("--commands", type=int, default=100, help="commands per terminal")
+    server.add_argument("--command", nargs='+', default=["schedule", "repertoire", "available 2"])
+    server.set_defaults(run=bench_server)
+
+    args = parser.parse_args()
+    args.run(args)
+
+
+
+if __name__ == "__main__":
+    main()
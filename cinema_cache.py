@@ -0,0 +1,85 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+
+# Least-recently-used cache with per-entry time to live, shared by the connectors of the application
+class TTLCache:
+    def __init__(self, **kwargs):
+        self.ttl = kwargs.get("ttl", 60)            # seconds an entry stays valid
+        self.max_size = kwargs.get("max_size", 64)  # entries kept before the least recently used is evicted
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._entries = OrderedDict()   # key -> (expires_at, value)
+        self._lock = threading.RLock()
+
+
+    def __getattribute__(self, name: str):
+        return object.__getattribute__(self, name)
+
+
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key, None)
+            if entry and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+
+            if entry:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+
+
+    def update(self, update_fn):
+        # Write-through: replaces every live value with update_fn(key, value) keeping its expiry time
+        with self._lock:
+            for (key, (expires_at, value)) in list(self._entries.items()):
+                self._entries[key] = (expires_at, update_fn(key, value))
+
+
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+
+
+    def invalidate_if(self, match_fn):
+        # Drops every entry for which match_fn(key, value) is true
+        with self._lock:
+            for (key, (_, value)) in list(self._entries.items()):
+                if match_fn(key, value):
+                    del self._entries[key]
+
+
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'entries': len(self._entries),
+                    'hits': self.hits,
+                    'misses': self.misses,
+                    'hit_ratio': round(self.hits / lookups, 3) if lookups else 0.0,
+                    'evictions': self.evictions}
@@ -0,0 +1,168 @@
+import queue
+import threading
+import time
+
+from cinema_backend import Error as DBError, DatabaseError
+
+
+
+class _Sale:
+    def __init__(self, order: tuple):
+        self.order = order
+        self.result = None      # ticket id or the exception of the rejected order
+        self.done = threading.Event()
+
+
+
+# Group commit of the ticket sales of all sessions
+# The sessions queue their orders and wait, a single writer thread sells the orders collected over a short
+# window (or up to max_batch orders) on its own connection and commits them together - one commit (and
+# one log flush of the database) per batch instead of one per ticket. An order is rejected alone
+# (DBConnector.sell_orders sells each one in a savepoint), a failed commit rejects the whole batch
+class GroupCommitter:
+    def __init__(self, **kwargs):
+        self.connector = kwargs.get("connector", None)  # DBConnector used only by the writer thread (reopened by it)
+        self.window = kwargs.get("window_ms", 5) / 1e3  # seconds the writer collects orders after the first one
+        self.max_batch = kwargs.get("max_batch", 64)
+
+        self.batches = 0
+        self.sales = 0
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+
+    def __getattribute__(self, name: str):
+        return object.__getattribute__(self, name)
+
+
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="group-commit", daemon=True)
+        self._thread.start()
+
+
+
+    def submit(self, order: tuple) -> int:
+        # Sells a (customer_id, schedule_id, n_seats) order - the id of the committed ticket
+        # Raises the SeatConflict or the database error rejecting the order
+        if not self._thread:
+            raise DatabaseError("Group commit is not running")
+
+        sale = _Sale(tuple(order))
+        self._queue.put(sale)
+        sale.done.wait()
+        if isinstance(sale.result, Exception):
+            raise sale.result
+        return sale.result
+
+
+
+    def close(self):
+        # Sells the queued orders and stops the writer
+        if self._thread:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        self.connector.close()
+
+
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'batches': self.batches,
+                'sales': self.sales,
+                'avg_batch': self.sales / self.batches if self.batches else 0.0
+            }
+
+
+
+    def _run(self):
+        while True:
+            sale = self._queue.get()
+            if sale is None:
+                return
+
+            batch = [sale]
+            deadline = time.monotonic() + self.window
+            stop = False
+            while len(batch) < self.max_batch:
+                try:
+                    sale = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if sale is None:
+                    stop = True
+                    break
+                batch.append(sale)
+
+            self._commit(batch)
+            if stop:
+                return
+
+
+
+    def _connection(self):
+        # The writer's connection is checked before every batch - a connection closed by the server
+        # (wait_timeout, a restart) is reopened instead of failing every following sale
+        connector = self.connector
+        if connector.connection:
+            try:
+                connector.backend.ping(connector.connection)
+                return connector.connection
+            except DBError:
+                self._disconnect()
+
+        connector.connection = connector.backend.connect(connector.credentials, connector.host, connector.port,
+                                                         connector.database)
+        connector.cursor = connector.connection.cursor()
+        if connector.metrics:
+            connector.cursor = connector.metrics.cursor(connector.cursor)
+        return connector.connection
+
+
+
+    def _disconnect(self):
+        # Drops the broken connection - the next batch opens a new one
+        connection = self.connector.connection
+        self.connector.connection = None
+        self.connector.cursor = None
+        if not connection:
+            return
+
+        self.connector.statements.forget(connection)
+        try:
+            connection.close()
+        except DBError:
+            pass
+
+
+
+    def _commit(self, batch: list):
+        # A batch failing outside the database still wakes its sessions up
+        results = [DatabaseError("Group commit failed")] * len(batch)
+        try:
+            connection = self._connection()
+            results = self.connector.sell_orders([sale.order for sale in batch])
+            connection.commit()
+
+        except Exception as e:
+            # Any failure rejects the whole batch - the writer keeps running for the next one
+            if self.connector.connection:
+                try:
+                    self.connector.connection.rollback()
+                except DBError:
+                    self._disconnect()
+            results = [e] * len(batch)
+
+        finally:
+            self.connector.flush_metrics()
+            with self._lock:
+                self.batches += 1
+                self.sales += sum(1 for result in results if not isinstance(result, Exception))
+
+            for (sale, result) in zip(batch, results):
+                sale.result = result
+                sale.done.set()
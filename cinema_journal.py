@@ -0,0 +1,348 @@
+import os
+import json
+import threading
+import time
+import uuid
+import weakref
+from datetime import datetime
+
+from cinema_backend import Error as DBError
+from cinema_seatmap import SeatConflict
+
+
+
+# Free seats of the upcoming screenings: s_max - s_taken - the seats of the live holds
+SEATS_QUERY = """
+SELECT s.id, r.s_max - s.s_taken - (SELECT COALESCE(SUM(h.n_seats), 0)
+                                        FROM SeatHolds AS h
+                                        WHERE h.schedule_id = s.id AND h.expires_at > ?)
+    FROM Schedule AS s JOIN Rooms AS r ON s.room_id = r.id
+"""
+
+
+
+# Local journal of the ticket sales for a slow or unreachable database
+# A sale is appended (and fsync'd) to a JSON lines file and acknowledged at once when the locally cached
+# free seats of its screening allow it. A flusher thread sells the journaled sales on its own connection in
+# batches (DBConnector.insert_orders - checked against the sold and the live held seats): the tickets and the
+# JournalSales rows (migration 8) of a batch are committed together, so a batch replayed after a crash skips
+# the sales which reached the database. Sales rejected by the database (the cached seats were stale, e.g.
+# seats held after the last reload) are written to the journal as conflicts and reported to the session
+# (owner) which recorded them
+# Records: {"sale": id, "order": [customer_id, schedule_id, n_seats], "at": time} - a journaled sale,
+# {"sale": id, "ticket": ticket_id} - a sold one, {"sale": id, "error": message} - a rejected one
+class SalesJournal:
+    def __init__(self, **kwargs):
+        self.path = kwargs.get("path", "docs/sales_journal.jsonl")
+        self.connector = kwargs.get("connector", None)          # DBConnector of the flusher (opened by it)
+        self.flush_interval = kwargs.get("flush_interval", 1)   # seconds between the flushes
+        self.batch = kwargs.get("batch", 500)                   # sales per flush transaction
+        self.refresh_interval = kwargs.get("refresh_interval", 60)  # seconds between the seat count reloads
+        self.max_size = kwargs.get("max_size", 1 << 20)         # bytes - larger journals are compacted
+
+        self.flushed = 0
+        self.last_error = None      # error of the last failed flush - None when the database is reachable
+
+        self._pending = {}      # sale id -> (customer_id, schedule_id, n_seats, at), in the journal order
+        self._conflicts = []    # (sale id, customer_id, schedule_id, n_seats, at, error)
+        self._owners = {}       # sale id -> owner of a pending sale recorded by this run
+        self._unreported = weakref.WeakKeyDictionary()  # owner -> conflicts not returned by new_conflicts yet
+        self._free = {}         # schedule_id -> free seats in the database (without the pending sales)
+        self._reserved = {}     # schedule_id -> seats of the pending sales
+        self._refreshed_at = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = False
+        self._thread = None
+        self._file = None
+
+
+    def __getattribute__(self, name: str):
+        return object.__getattribute__(self, name)
+
+
+
+    def start(self):
+        # Reads the sales left by the previous run and starts the flusher
+        torn = False
+        if os.path.exists(self.path):
+            torn = self._load()
+        self._file = open(self.path, 'a', encoding="utf-8")
+        if torn:
+            # The next record starts on a line of its own
+            self._file.write("\n")
+        try:
+            # The sales are acknowledged from the first command on - unless the database is down
+            self._refresh()
+        except DBError as e:
+            self.last_error = str(e)
+            self._disconnect()
+        self._thread = threading.Thread(target=self._run, name="sales-journal", daemon=True)
+        self._thread.start()
+
+
+
+    def record(self, order: tuple, owner=None) -> str:
+        # Journals a (customer_id, schedule_id, n_seats) sale - returns its id once it is on the disk
+        # Raises SeatConflict when the cached free seats of the screening do not allow it
+        # owner: the session (e.g. its DBConnector) its conflict is reported to - see new_conflicts
+        (customer_id, schedule_id, n_seats) = (int(order[0]), int(order[1]), int(order[2]))
+        with self._lock:
+            free = self._free_seats(schedule_id)
+            if free is None:
+                raise SeatConflict(f"No cached seat count of the screening {schedule_id} - not an upcoming "
+                                   f"screening or the database is not reachable")
+            if n_seats > free:
+                raise SeatConflict(f"Only {max(free, 0)} free seats")
+
+            sale_id = uuid.uuid4().hex
+            at = datetime.now().replace(microsecond=0).isoformat(sep=' ')
+            self._append({'sale': sale_id, 'order': [customer_id, schedule_id, n_seats], 'at': at})
+            self._add(sale_id, (customer_id, schedule_id, n_seats, at))
+            if owner is not None:
+                self._owners[sale_id] = owner
+            return sale_id
+
+
+
+    def new_conflicts(self, owner) -> list:
+        # Conflicts of the owner's sales not returned before - (sale id, customer_id, schedule_id, n_seats, at,
+        # error). The conflicts of the previous runs are only listed by conflicts
+        with self._lock:
+            return self._unreported.pop(owner, [])
+
+
+
+    def pending(self) -> list:
+        # Journaled sales not in the database yet - (sale id, customer_id, schedule_id, n_seats, at)
+        with self._lock:
+            return [(sale_id, *sale) for (sale_id, sale) in self._pending.items()]
+
+
+
+    def conflicts(self) -> list:
+        with self._lock:
+            return list(self._conflicts)
+
+
+
+    def flush(self):
+        # Wakes the flusher up - the pending sales are sold without waiting for the flush interval
+        self._wake.set()
+
+
+
+    def close(self):
+        # Stops the flusher after a last flush - the sales it could not sell stay in the journal
+        if self._thread:
+            self._stop = True
+            self._wake.set()
+            self._thread.join()
+            self._thread = None
+        if self._file:
+            self._file.close()
+            self._file = None
+        self._disconnect()
+
+
+
+    def _free_seats(self, schedule_id: int) -> int:
+        # Must be called with the lock held
+        free = self._free.get(schedule_id, None)
+        if free is None:
+            return None
+        return free - self._reserved.get(schedule_id, 0)
+
+
+
+    def _add(self, sale_id: str, sale: tuple):
+        # Must be called with the lock held
+        self._pending[sale_id] = sale
+        self._reserved[sale[1]] = self._reserved.get(sale[1], 0) + sale[2]
+
+
+
+    def _pop(self, sale_id: str) -> tuple:
+        # Must be called with the lock held - None for a sale which is not pending
+        self._owners.pop(sale_id, None)
+        sale = self._pending.pop(sale_id, None)
+        if sale:
+            self._reserved[sale[1]] -= sale[2]
+        return sale
+
+
+
+    def _append(self, record: dict):
+        # Must be called with the lock held - the record is on the disk when it returns
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+
+
+    def _load(self) -> bool:
+        # True when the last record was torn by a crash
+        line = "\n"
+        with open(self.path, 'r', encoding="utf-8") as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A record torn by a crash was never acknowledged
+                    continue
+
+                sale_id = record['sale']
+                if 'order' in record:
+                    self._add(sale_id, (*record['order'], record['at']))
+                elif 'error' in record:
+                    sale = self._pop(sale_id) or (None, None, None, None)
+                    self._conflicts.append((sale_id, *sale, record['error']))
+                else:
+                    self._pop(sale_id)
+        return not line.endswith("\n")
+
+
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self._refresh()
+                while self._flush_batch():
+                    pass
+                self.last_error = None
+
+            except DBError as e:
+                # The database is unreachable or failing - the sales wait in the journal for the next flush
+                self.last_error = str(e)
+                self._disconnect()
+
+            self._compact()
+            if self._stop:
+                return
+
+
+
+    def _connection(self):
+        # Opened here instead of DBConnector.open - the flusher reports its errors in last_error, not on
+        # the terminal of the session
+        connector = self.connector
+        if not connector.connection:
+            connector.connection = connector.backend.connect(connector.credentials, connector.host, connector.port,
+                                                             connector.database)
+            connector.cursor = connector.connection.cursor()
+        return connector.connection
+
+
+
+    def _disconnect(self):
+        # Drops the (possibly broken) connection - the next flush opens a new one
+        connection = self.connector.connection
+        self.connector.connection = None
+        self.connector.cursor = None
+        if not connection:
+            return
+
+        self.connector.statements.forget(connection)
+        try:
+            connection.close()
+        except DBError:
+            pass
+
+
+
+    def _refresh(self):
+        # Reloads the free seats of the upcoming screenings every refresh_interval seconds
+        if self._refreshed_at and time.monotonic() - self._refreshed_at < self.refresh_interval:
+            return
+
+        connection = self._connection()
+        now = datetime.now().replace(microsecond=0)
+        # Only this thread sells the pending sales - the database counts never include them
+        self.connector.cursor.execute(SEATS_QUERY + "WHERE s.start_time >= ?", (now, now))
+        free = dict(self.connector.cursor.fetchall())
+        connection.commit()
+        with self._lock:
+            self._free = free
+        self._refreshed_at = time.monotonic()
+
+
+
+    def _flush_batch(self) -> bool:
+        # Sells the oldest pending sales - True when more sales are waiting
+        with self._lock:
+            batch = list(self._pending.items())[:self.batch]
+        if not batch:
+            return False
+
+        connection = self._connection()
+        cursor = self.connector.cursor
+        sale_ids = [sale_id for (sale_id, _) in batch]
+        try:
+            # Sales of a batch committed before the journal recorded it (a crash or a lost connection)
+            cursor.execute(f"SELECT sale_id, ticket_id FROM JournalSales WHERE sale_id IN "
+                           f"({', '.join('?' * len(sale_ids))})", tuple(sale_ids))
+            sold = dict(cursor.fetchall())
+
+            orders = [(sale_id, sale[:3]) for (sale_id, sale) in batch if sale_id not in sold]
+            (ticket_ids, failed) = self.connector.insert_orders([order for (_, order) in orders])
+            rejected = {orders[order_no - 1][0]: error for (order_no, _, error) in failed}
+            inserted = [sale_id for (sale_id, _) in orders if sale_id not in rejected]
+            if inserted:
+                cursor.executemany("INSERT INTO JournalSales(sale_id, ticket_id) VALUES (?, ?)",
+                                   list(zip(inserted, ticket_ids)))
+            connection.commit()
+
+        except DBError:
+            try:
+                connection.rollback()
+            except DBError:
+                pass
+            raise
+
+        with self._lock:
+            if sold:
+                # Sold by an earlier flush - the cached counts may have them already, they are reloaded
+                self._refreshed_at = None
+            for (sale_id, ticket_id) in sold.items():
+                self._pop(sale_id)
+                self._append({'sale': sale_id, 'ticket': ticket_id})
+            for (sale_id, ticket_id) in zip(inserted, ticket_ids):
+                (_, schedule_id, n_seats, _) = self._pop(sale_id)
+                if schedule_id in self._free:
+                    self._free[schedule_id] -= n_seats
+                self._append({'sale': sale_id, 'ticket': ticket_id})
+            for (sale_id, error) in rejected.items():
+                owner = self._owners.get(sale_id, None)
+                conflict = (sale_id, *self._pop(sale_id), error)
+                # The cached count was wrong - reloaded with the next flush
+                self._refreshed_at = None
+                self._conflicts.append(conflict)
+                if owner is not None:
+                    self._unreported.setdefault(owner, []).append(conflict)
+                self._append({'sale': sale_id, 'error': error})
+            self.flushed += len(sold) + len(inserted)
+            return bool(self._pending)
+
+
+
+    def _compact(self):
+        # Rewrites a large journal with the pending sales and the conflicts only
+        with self._lock:
+            if self._file.tell() < self.max_size:
+                return
+
+            with open(self.path + ".tmp", 'w', encoding="utf-8") as file:
+                for (sale_id, customer_id, schedule_id, n_seats, at, error) in self._conflicts:
+                    file.write(json.dumps({'sale': sale_id, 'order': [customer_id, schedule_id, n_seats], 'at': at}) +
+                               "\n" + json.dumps({'sale': sale_id, 'error': error}) + "\n")
+                for (sale_id, (customer_id, schedule_id, n_seats, at)) in self._pending.items():
+                    file.write(json.dumps({'sale': sale_id, 'order': [customer_id, schedule_id, n_seats], 'at': at}) +
+                               "\n")
+                file.flush()
+                os.fsync(file.fileno())
+
+            self._file.close()
+            os.replace(self.path + ".tmp", self.path)
+            self._file = open(self.path, 'a', encoding="utf-8")
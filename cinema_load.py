@@ -0,0 +1,334 @@
+import argparse
+import contextlib
+import random
+import re
+import statistics
+import sys
+import threading
+import time
+from datetime import datetime
+
+import cinema
+import cinema_utils as utils
+from cinema_server import _SessionOutput
+
+
+
+# Default command mix of a cashier session: command -> weight
+MIX = {
+    'schedule': 25,
+    'repertoire': 10,
+    'customer': 10,
+    'customer_find': 10,
+    'ticket_new': 25,
+    'ticket_cancel': 10,
+    'staff_show': 5,
+    'available': 5
+}
+
+# Error classes of the command output: (class, pattern) - the first matching class counts
+ERRORS = [
+    ("overflow", re.compile(r"Seat number overflow")),                  # rejected by the takenSeatsInsert trigger
+    ("full", re.compile(r"Only \d+ free seats")),                       # rejected by the seat hold check
+    ("lock", re.compile(r"lock|deadlock|keeps changing", re.IGNORECASE)),
+    ("pool", re.compile(r"Database connection|No free connection"))
+]
+
+TICKET_ID = re.compile(r"Ticker nr: (\d+)")
+
+
+
+# Commands of one session level - shared by its session threads
+class _Level:
+    def __init__(self, **kwargs):
+        self.n_sessions = kwargs.get("n_sessions", 1)
+        self.deadline = kwargs.get("deadline", None)
+
+        self.latencies = {}     # command -> [seconds]
+        self.checkouts = []     # seconds waited for a pooled connection
+        self.errors = {}        # error class -> count
+        self.hold_retries = 0
+        self._lock = threading.Lock()
+
+
+    def __getattribute__(self, name: str):
+        return object.__getattribute__(self, name)
+
+
+
+    def record(self, commands: list, latencies: list, checkouts: list, errors: dict, hold_retries: int):
+        with self._lock:
+            for (command, latency) in zip(commands, latencies):
+                self.latencies.setdefault(command, []).append(latency)
+            self.checkouts += checkouts
+            for (error, count) in errors.items():
+                self.errors[error] = self.errors.get(error, 0) + count
+            self.hold_retries += hold_retries
+
+
+
+class _Session:
+    # Simulated cashier: a Prompt on a connector borrowing a pooled connection for every command
+    # (like a cinema_server session) - the commands are drawn from the mix
+    def __init__(self, no: int, args, workload: dict):
+        self.rng = random.Random(args.seed + no)
+        self.args = args
+        self.workload = workload
+        self.connector = cinema._connector(args.role)
+        self.prompt = utils.Prompt(self.connector, read=_no_input, console=False)
+        self.issued = []    # ids of the tickets sold by the session and not cancelled yet
+        self.output = []
+
+
+    def __getattribute__(self, name: str):
+        return object.__getattribute__(self, name)
+
+
+
+    def run(self, level: _Level):
+        (commands, latencies, checkouts, errors) = ([], [], [], {})
+        retries_before = self.connector.hold_retries
+        sys.stdout.bind(self.output.append)
+        try:
+            while time.monotonic() < level.deadline:
+                (name, command) = self._next_command()
+
+                start = time.perf_counter()
+                if self.connector.open():
+                    checkouts.append(time.perf_counter() - start)
+                    try:
+                        self.prompt.exec(command)
+                    finally:
+                        self.connector.close()
+                latencies.append(time.perf_counter() - start)
+                commands.append(name)
+
+                output = ''.join(self.output)
+                self.output.clear()
+                self._check_output(name, output, errors)
+
+                if self.args.think:
+                    time.sleep(self.rng.expovariate(1e3 / self.args.think))
+
+        finally:
+            sys.stdout.unbind()
+
+        level.record(commands, latencies, checkouts, errors, self.connector.hold_retries - retries_before)
+
+
+
+    def _next_command(self) -> tuple:
+        name = self.rng.choices(list(self.args.mix), weights=list(self.args.mix.values()))[0]
+        if name == "ticket_cancel" and not self.issued:
+            name = "ticket_new"
+
+        if name == "schedule":
+            return name, f"schedule {self.workload['date']}"
+        if name == "repertoire":
+            return name, f"repertoire {self.workload['date']}"
+        if name == "available":
+            return name, f"available {self.rng.randint(1, self.args.max_seats)} {self.workload['date']}"
+        if name == "customer":
+            return name, f"customer {self.rng.randint(*self.workload['customers'])}"
+        if name == "customer_find":
+            return name, f"customer find {self.rng.choice(self.workload['prefixes'])}"
+        if name == "staff_show":
+            return name, "staff show"
+        if name == "ticket_cancel":
+            return name, f"ticket cancel {self.issued.pop(self.rng.randrange(len(self.issued)))}"
+
+        # The hot screening gets the given share of the sales - it sells out during a long run
+        screenings = self.workload['screenings']
+        schedule_id = (self.workload['hot'] if self.rng.random() < self.args.hot else self.rng.choice(screenings))
+        return name, (f"ticket new {schedule_id} {self.rng.randint(1, self.args.max_seats)} "
+                      f"{self.rng.randint(*self.workload['customers'])}")
+
+
+
+    def _check_output(self, name: str, output: str, errors: dict):
+        if name == "ticket_new":
+            self.issued += [int(ticket_id) for ticket_id in TICKET_ID.findall(output)]
+
+        for line in output.splitlines():
+            if not line.startswith("Error"):
+                continue
+            error = next((error for (error, pattern) in ERRORS if pattern.search(line)), "other")
+            errors[error] = errors.get(error, 0) + 1
+            if error == "other" and self.args.verbose:
+                sys.stderr.write(f"{name}: {line}\n")
+
+
+
+    def cancel_issued(self):
+        # Leaves the database as it was before the run
+        if not self.issued or not self.connector.open():
+            return
+        sys.stdout.bind(self.output.append)
+        try:
+            for ticket_id in self.issued:
+                self.connector.manage_tickets("cancel", id=ticket_id)
+        finally:
+            sys.stdout.unbind()
+            self.connector.close()
+        self.issued = []
+
+
+
+
+
+def _no_input(prompt: str) -> str:
+    # Every command of the mix has all its arguments
+    print(f"Error: '{prompt.strip()}' has to be given as a command argument")
+    return "cancel"
+
+
+def _parse_mix(text: str) -> dict:
+    # 'schedule=30,ticket_new=20' - commands left out are not run
+    mix = {}
+    for item in text.split(','):
+        (name, _, weight) = item.partition('=')
+        if name.strip() not in MIX or not weight.strip().isdigit():
+            raise argparse.ArgumentTypeError(f"'{item}' - expected <command>=<weight> with a command of: "
+                                             f"{', '.join(MIX)}")
+        mix[name.strip()] = int(weight)
+    return mix
+
+
+def _percentile(values: list, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def _row_lock_waits(connector: utils.DBConnector) -> tuple:
+    # InnoDB row lock waits and their total time [ms] so far - None for backends without the counters
+    if connector.backend.name != "mariadb":
+        return None
+    connector.cursor.execute("SHOW GLOBAL STATUS WHERE Variable_name IN ('Innodb_row_lock_waits', 'Innodb_row_lock_time')")
+    status = dict(connector.cursor.fetchall())
+    return int(status.get('Innodb_row_lock_waits', 0)), int(status.get('Innodb_row_lock_time', 0))
+
+
+def _workload(connector: utils.DBConnector, date: str) -> dict:
+    # Screenings of the day, the customer id range and surname prefixes for the generated commands
+    screenings = connector._fetch_schedule(date, date)
+    if not screenings:
+        return None
+
+    # The 'premiere': the screening starting closest to 19:00
+    evening = datetime.strptime(date, '%Y-%m-%d').replace(hour=19)
+    hot = min(screenings, key=lambda row: abs((row[5] - evening).total_seconds()))[0]
+
+    connector.cursor.execute("SELECT MIN(id), MAX(id) FROM Customers")
+    customers = connector.cursor.fetchone()
+    connector.cursor.execute("SELECT surname FROM Customers WHERE surname IS NOT NULL LIMIT 1000")
+    prefixes = sorted({surname[:3] for (surname,) in connector.cursor.fetchall()}) or ["a"]
+
+    return {'date': date,
+            'screenings': [row[0] for row in screenings],
+            'hot': hot,
+            'customers': customers,
+            'prefixes': prefixes}
+
+
+def _report(level: _Level, elapsed: float, lock_waits: tuple):
+    n_commands = sum(len(latencies) for latencies in level.latencies.values())
+    all_latencies = [latency for latencies in level.latencies.values() for latency in latencies]
+    print(f"\nsessions: {level.n_sessions}  commands: {n_commands}  time: {elapsed:.2f} s  "
+          f"throughput: {n_commands / elapsed:.1f} commands/s")
+    if not all_latencies:
+        return
+
+    result = utils.ResultSet(['command', 'calls', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms'])
+    rows = [(name, len(latencies), *(round(_percentile(latencies, p) * 1e3, 2) for p in (0.5, 0.95, 0.99)),
+             round(max(latencies) * 1e3, 2))
+            for (name, latencies) in sorted(level.latencies.items())]
+    rows.append(("all", len(all_latencies), *(round(_percentile(all_latencies, p) * 1e3, 2) for p in (0.5, 0.95, 0.99)),
+                 round(max(all_latencies) * 1e3, 2)))
+    result.extend(rows)
+    print(result.table())
+
+    errors = '  '.join(f"{error}: {level.errors.get(error, 0)}" for (error, _) in ERRORS + [("other", None)])
+    checkout = (f"{statistics.median(level.checkouts) * 1e3:.2f} / {_percentile(level.checkouts, 0.99) * 1e3:.2f} / "
+                f"{max(level.checkouts) * 1e3:.2f} ms" if level.checkouts else "-")
+    waits = f"{lock_waits[0]} ({lock_waits[1]} ms)" if lock_waits else "n/a"
+    print(f"errors - {errors}")
+    print(f"hold retries: {level.hold_retries}  row lock waits: {waits}  connection checkout p50 / p99 / max: {checkout}")
+
+
+
+def run(args):
+    with contextlib.redirect_stdout(sys.stderr):
+        cinema._init()
+    sys.stdout = _SessionOutput(sys.stdout)
+
+    setup = cinema._connector(args.role)
+    if not setup.open():
+        raise SystemExit(1)
+    workload = _workload(setup, args.date)
+    setup.close()
+    if not workload:
+        print(f"Error: No screenings on {args.date} - generate data with gen_data.py --start {args.date}")
+        raise SystemExit(1)
+
+    print(f"Database: {cinema.backend.name}  screenings: {len(workload['screenings'])}  hot screening: "
+          f"{workload['hot']}  mix: {', '.join(f'{name}={weight}' for (name, weight) in args.mix.items())}")
+
+    sessions = []
+    try:
+        for n_sessions in args.sessions:
+            while len(sessions) < n_sessions:
+                sessions.append(_Session(len(sessions), args, workload))
+
+            setup.open()
+            lock_waits = _row_lock_waits(setup)
+            setup.close()
+
+            level = _Level(n_sessions=n_sessions, deadline=time.monotonic() + args.duration)
+            threads = [threading.Thread(target=session.run, args=(level,)) for session in sessions[:n_sessions]]
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - start
+
+            setup.open()
+            if lock_waits:
+                lock_waits = tuple(after - before for (after, before) in zip(_row_lock_waits(setup), lock_waits))
+            setup.close()
+            _report(level, elapsed, lock_waits)
+
+    finally:
+        if not args.keep:
+            for session in sessions:
+                session.cancel_issued()
+        for pool in cinema.pools.values():
+            pool.close()
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Box office load generator - concurrent cashier sessions "
+                                                 "running a command mix against the configured database")
+    parser.add_argument("--sessions", type=int, nargs='+', default=[1, 4, 16, 64],
+                        help="numbers of concurrent sessions - one run each")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of every run")
+    parser.add_argument("--date", default=datetime.today().strftime('%Y-%m-%d'),
+                        help="day of the listed and sold screenings (default: today)")
+    parser.add_argument("--mix", type=_parse_mix, default=MIX,
+                        help=f"command weights (default: {','.join(f'{name}={weight}' for (name, weight) in MIX.items())})")
+    parser.add_argument("--role", default="manager", help="database role of the sessions")
+    parser.add_argument("--hot", type=float, default=0.3, help="share of the sales for the 19:00 screening")
+    parser.add_argument("--max-seats", type=int, default=4, help="seats per ticket (1 to max)")
+    parser.add_argument("--think", type=float, default=0, help="mean think time between commands [ms]")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--keep", action="store_true", help="keep the sold tickets (cancelled by default)")
+    parser.add_argument("--verbose", action="store_true", help="print the unclassified errors to stderr")
+    args = parser.parse_args()
+
+    run(args)
+
+
+
+if __name__ == "__main__":
+    main()
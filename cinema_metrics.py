@@ -0,0 +1,305 @@
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from cinema_backend import Error as DBError
+
+
+
+# Upper bounds [s] of the latency histogram buckets - the last bucket is +Inf
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+
+class _Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+
+    def observe(self, value: float):
+        for (i, bound) in enumerate(BUCKETS):
+            if value <= bound:
+                break
+        else:
+            i = len(BUCKETS)
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+
+
+class _StatementStats:
+    def __init__(self):
+        self.duration = _Histogram()
+        self.rows = 0
+        self.errors = 0
+
+
+
+class _CommandStats:
+    def __init__(self):
+        self.duration = _Histogram()
+        self.round_trips = 0
+        self.max_round_trips = 0
+
+
+
+# Per-statement and per-command statistics shared by all connectors (and server sessions)
+class Metrics:
+    def __init__(self, **kwargs):
+        self.slow_query_ms = kwargs.get("slow_query_ms", 100)           # statements logged when slower
+        self.slow_query_log = kwargs.get("slow_query_log", None)        # slow query log file, None disables
+        self.prometheus_file = kwargs.get("prometheus_file", None)      # Prometheus text dump, None disables
+        self.dump_interval = kwargs.get("dump_interval", 15)            # seconds between the dumps
+
+        self._statements = {}   # normalized statement -> _StatementStats
+        self._commands = {}     # command name -> _CommandStats
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._log_lock = threading.Lock()
+        self._dump_lock = threading.Lock()
+        self._last_dump = time.monotonic()
+
+
+    def __getattribute__(self, name: str):
+        return object.__getattribute__(self, name)
+
+
+
+    def cursor(self, cursor):
+        return InstrumentedCursor(cursor, self)
+
+
+
+    def record(self, statement: str, elapsed: float, rows: int, error: bool = False, params=None):
+        key = _normalize(statement)
+        with self._lock:
+            stats = self._statements.setdefault(key, _StatementStats())
+            stats.duration.observe(elapsed)
+            stats.rows += max(rows, 0)
+            stats.errors += int(error)
+
+        if self.slow_query_log and elapsed * 1e3 >= self.slow_query_ms:
+            self._log_slow(key, elapsed, rows, error, params)
+
+
+
+    def round_trip(self):
+        # Statements outside of a command (logins, connector setup) are not attributed to any
+        if getattr(self._local, "round_trips", None) is not None:
+            self._local.round_trips += 1
+
+
+
+    @contextmanager
+    def command(self, name: str):
+        # Times a user command and counts the statements it executes in this thread
+        self._local.round_trips = 0
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            round_trips = self._local.round_trips
+            self._local.round_trips = None
+
+            with self._lock:
+                stats = self._commands.setdefault(name, _CommandStats())
+                stats.duration.observe(elapsed)
+                stats.round_trips += round_trips
+                stats.max_round_trips = max(stats.max_round_trips, round_trips)
+
+            # A session finishing a command while another one is dumping leaves the dump to it
+            if (self.prometheus_file and time.monotonic() - self._last_dump >= self.dump_interval
+                    and self._dump_lock.acquire(blocking=False)):
+                try:
+                    self._dump()
+                finally:
+                    self._dump_lock.release()
+
+
+
+    def statement_stats(self) -> list:
+        # Rows: (statement, calls, errors, rows, avg ms, max ms, histogram bucket counts...)
+        with self._lock:
+            return [(key, s.duration.count, s.errors, s.rows,
+                     round(s.duration.sum / s.duration.count * 1e3, 3), round(s.duration.max * 1e3, 3),
+                     *s.duration.counts)
+                    for (key, s) in sorted(self._statements.items(), key=lambda item: -item[1].duration.sum)]
+
+
+
+    def command_stats(self) -> list:
+        # Rows: (command, calls, avg ms, max ms, avg round-trips, max round-trips)
+        with self._lock:
+            return [(name, c.duration.count,
+                     round(c.duration.sum / c.duration.count * 1e3, 3), round(c.duration.max * 1e3, 3),
+                     round(c.round_trips / c.duration.count, 2), c.max_round_trips)
+                    for (name, c) in sorted(self._commands.items())]
+
+
+
+    def prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            _histogram_lines(lines, "cinema_query_duration_seconds", "Statement execution and fetch time",
+                             "statement", {key: s.duration for (key, s) in self._statements.items()})
+            _counter_lines(lines, "cinema_query_rows_total", "Rows fetched or changed by the statement",
+                           "statement", {key: s.rows for (key, s) in self._statements.items()})
+            _counter_lines(lines, "cinema_query_errors_total", "Failed executions of the statement",
+                           "statement", {key: s.errors for (key, s) in self._statements.items()})
+            _histogram_lines(lines, "cinema_command_duration_seconds", "User command time",
+                             "command", {name: c.duration for (name, c) in self._commands.items()})
+            _counter_lines(lines, "cinema_command_round_trips_total", "Statements executed by the command",
+                           "command", {name: c.round_trips for (name, c) in self._commands.items()})
+        return '\n'.join(lines) + '\n'
+
+
+
+    def dump(self):
+        # Replaces the Prometheus text file (e.g. for the node exporter textfile collector)
+        with self._dump_lock:
+            self._dump()
+
+
+
+    def _dump(self):
+        # The temporary file is shared - must be called with the dump lock held
+        self._last_dump = time.monotonic()
+        if not self.prometheus_file:
+            return
+        with open(self.prometheus_file + ".tmp", 'w') as file:
+            file.write(self.prometheus())
+        os.replace(self.prometheus_file + ".tmp", self.prometheus_file)
+
+
+
+    def _log_slow(self, statement: str, elapsed: float, rows: int, error: bool, params):
+        if "PASSWORD(" in statement.upper():
+            params = "<hidden>"     # staff credentials never reach the log
+        line = (f"{datetime.now().isoformat(sep=' ', timespec='milliseconds')}  {elapsed * 1e3:10.3f} ms  "
+                f"rows: {rows:>7}  {'ERROR  ' if error else ''}{statement}  params: {_short(params)}\n")
+        with self._log_lock:
+            try:
+                with open(self.slow_query_log, 'a') as file:
+                    file.write(line)
+            except OSError:
+                pass
+
+
+
+# Cursor proxy recording every statement in Metrics
+# The time and row count of a statement include its fetches, so they are recorded on the next
+# execute, flush or close
+class InstrumentedCursor:
+    def __init__(self, cursor, metrics: Metrics):
+        self._cursor = cursor
+        self._metrics = metrics
+        self._pending = None    # [statement, elapsed, rows, params]
+
+
+    def __getattr__(self, name: str):
+        return getattr(self._cursor, name)
+
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+
+    def execute(self, statement: str, params=()):
+        return self._run(self._cursor.execute, statement, params, params)
+
+
+    def executemany(self, statement: str, rows):
+        rows = list(rows)
+        return self._run(self._cursor.executemany, statement, rows, f"{len(rows)} rows")
+
+
+    def fetchone(self):
+        return self._fetch(self._cursor.fetchone, lambda row: int(row is not None))
+
+
+    def fetchmany(self, size: int = None):
+        return self._fetch(lambda: self._cursor.fetchmany(size) if size else self._cursor.fetchmany(), len)
+
+
+    def fetchall(self):
+        return self._fetch(self._cursor.fetchall, len)
+
+
+    def close(self):
+        self.flush()
+        self._cursor.close()
+
+
+    def flush(self):
+        if self._pending:
+            self._metrics.record(*self._pending[:3], params=self._pending[3])
+            self._pending = None
+
+
+    def _run(self, execute_fn, statement: str, params, logged_params):
+        self.flush()
+        self._metrics.round_trip()
+        start = time.perf_counter()
+        try:
+            result = execute_fn(statement, params)
+        except DBError:
+            self._metrics.record(statement, time.perf_counter() - start, 0, error=True, params=logged_params)
+            raise
+
+        # Statements without a result set report the affected rows right away
+        rowcount = self._cursor.rowcount if self._cursor.description is None else 0
+        self._pending = [statement, time.perf_counter() - start, max(rowcount or 0, 0), logged_params]
+        return result
+
+
+    def _fetch(self, fetch_fn, count_fn):
+        start = time.perf_counter()
+        result = fetch_fn()
+        if self._pending:
+            self._pending[1] += time.perf_counter() - start
+            self._pending[2] += count_fn(result)
+        return result
+
+
+
+
+
+def _normalize(statement: str) -> str:
+    # One line per statement - the parameters are placeholders already
+    return re.sub(r"\s+", " ", statement).strip().rstrip(';')
+
+
+def _short(params, limit: int = 200) -> str:
+    text = str(params)
+    return text if len(text) <= limit else text[:limit] + "..."
+
+
+def _label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+
+
+def _histogram_lines(lines: list, name: str, help: str, label: str, histograms: dict):
+    lines += [f"# HELP {name} {help}", f"# TYPE {name} histogram"]
+    for (key, histogram) in sorted(histograms.items()):
+        key = _label(key)
+        cumulative = 0
+        for (bound, count) in zip(BUCKETS + ("+Inf",), histogram.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{label}="{key}",le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_sum{{{label}="{key}"}} {histogram.sum:.6f}')
+        lines.append(f'{name}_count{{{label}="{key}"}} {histogram.count}')
+
+
+def _counter_lines(lines: list, name: str, help: str, label: str, counters: dict):
+    lines += [f"# HELP {name} {help}", f"# TYPE {name} counter"]
+    for (key, value) in sorted(counters.items()):
+        lines.append(f'{name}{{{label}="{_label(key)}"}} {value}')
@@ -0,0 +1,79 @@
+from bisect import bisect_left, bisect_right
+from datetime import timedelta
+
+
+
+# Screenings of a room as [start, end) intervals ordered by the start time
+# Every interval overlapping [start, end) starts in (start - longest interval, end), so an overlap check
+# is a bisection plus a scan of the few intervals starting in that window
+class RoomTimeline:
+    def __init__(self):
+        self.starts = []
+        self.entries = []   # (start, end, ref) ordered like starts
+        self.max_length = timedelta(0)
+
+
+    def __getattribute__(self, name: str):
+        return object.__getattribute__(self, name)
+
+
+
+    def overlap(self, start, end):
+        # ref of an interval overlapping [start, end) or None
+        first = bisect_right(self.starts, start - self.max_length)
+        last = bisect_left(self.starts, end)
+        for (_, i_end, ref) in self.entries[first:last]:
+            if i_end > start:
+                return ref
+        return None
+
+
+
+    def add(self, start, end, ref):
+        i = bisect_right(self.starts, start)
+        self.starts.insert(i, start)
+        self.entries.insert(i, (start, end, ref))
+        self.max_length = max(self.max_length, end - start)
+
+
+
+def window(entries: list, lengths: dict) -> tuple:
+    # [start, end) range of the existing screenings which can overlap the entries
+    max_length = timedelta(minutes=max(lengths.values(), default=0))
+    starts = [start for (_, _, start) in entries]
+    return (min(starts) - max_length, max(starts) + max_length)
+
+
+
+def plan(entries: list, lengths: dict, rooms: set, existing: list) -> tuple:
+    # entries: (movie_id, room_id, start) rows of the new schedule
+    # lengths: movie_id -> length [min] of the movies, rooms: ids of the rooms
+    # existing: (schedule_id, room_id, start, length) screenings already in the database
+    # Returns the accepted (row_no, entry) and the rejected (row_no, entry, reason) rows - an entry is
+    # rejected when it overlaps an existing screening or an accepted entry of the same room
+    timelines = {}
+    for (schedule_id, room_id, start, length) in sorted(existing, key=lambda screening: screening[2]):
+        timelines.setdefault(room_id, RoomTimeline()).add(start, start + timedelta(minutes=length),
+                                                          f"screening {schedule_id}")
+
+    accepted = []
+    rejected = []
+    for (row_no, (movie_id, room_id, start)) in enumerate(entries, start=1):
+        if movie_id not in lengths:
+            rejected.append((row_no, (movie_id, room_id, start), f"No movie {movie_id}"))
+            continue
+        if room_id not in rooms:
+            rejected.append((row_no, (movie_id, room_id, start), f"No room {room_id}"))
+            continue
+
+        end = start + timedelta(minutes=lengths[movie_id])
+        timeline = timelines.setdefault(room_id, RoomTimeline())
+        conflict = timeline.overlap(start, end)
+        if conflict:
+            rejected.append((row_no, (movie_id, room_id, start), f"Movie overlap with {conflict}"))
+            continue
+
+        timeline.add(start, end, f"row {row_no}")
+        accepted.append((row_no, (movie_id, room_id, start)))
+
+    return accepted, rejected
@@ -0,0 +1,133 @@
+import threading
+import time
+
+from cinema_backend import Error as DBError, MariaDBBackend, PoolError
+
+
+
+# Pool of open database connections for a single role - connections are checked out
+# by DBConnector.open() and returned by DBConnector.close() instead of reconnecting
+class ConnectionPool:
+    def __init__(self, **kwargs):
+        self.credentials = kwargs.get("credentials", None)
+        self.host = kwargs.get("host", None)
+        self.port = kwargs.get("port", None)
+        self.database = kwargs.get("database", None)
+        self.backend = kwargs.get("backend", None) or MariaDBBackend()
+
+        self.size = kwargs.get("size", 4)                           # max. open connections
+        self.idle_timeout = kwargs.get("idle_timeout", 300)         # seconds before an idle connection is closed
+        self.checkout_timeout = kwargs.get("checkout_timeout", 10)  # seconds to wait for a free connection
+        self.ping_interval = kwargs.get("ping_interval", 5)         # idle seconds after which a connection is pinged
+        self.statements = kwargs.get("statements", None)            # StatementRegistry of the connections
+
+        self._idle = []     # (connection, returned_at) - the most recently returned connection is last
+        self._n_open = 0
+        self._lock = threading.Condition()
+
+
+    def __getattribute__(self, name: str):
+        return object.__getattribute__(self, name)
+
+
+    @property
+    def n_open(self) -> int:
+        return self._n_open
+
+
+
+    def checkout(self):
+        deadline = time.monotonic() + self.checkout_timeout
+
+        with self._lock:
+            while True:
+                self._evict_idle()
+
+                if self._idle:
+                    connection, returned_at = self._idle.pop()
+                    break
+
+                if self._n_open < self.size:
+                    self._n_open += 1
+                    connection, returned_at = None, None
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolError(f"No free connection for '{self.credentials.username}' "
+                                    f"within {self.checkout_timeout} s")
+                self._lock.wait(remaining)
+
+        if connection:
+            if time.monotonic() - returned_at < self.ping_interval or self._is_alive(connection):
+                return connection
+            self._close(connection)
+
+        try:
+            return self._connect()
+        except DBError:
+            with self._lock:
+                self._n_open -= 1
+                self._lock.notify()
+            raise
+
+
+
+    def checkin(self, connection):
+        with self._lock:
+            self._idle.append((connection, time.monotonic()))
+            self._lock.notify()
+
+
+
+    def discard(self, connection):
+        # Drops a broken connection - its slot becomes free for a new one
+        self._close(connection)
+        with self._lock:
+            self._n_open -= 1
+            self._lock.notify()
+
+
+
+    def close(self):
+        with self._lock:
+            for (connection, _) in self._idle:
+                self._close(connection)
+            self._n_open -= len(self._idle)
+            self._idle = []
+            self._lock.notify_all()
+
+
+
+    def _connect(self):
+        return self.backend.connect(self.credentials, self.host, self.port, self.database)
+
+
+    def _evict_idle(self):
+        # Must be called with the lock held
+        now = time.monotonic()
+        expired = [c for c in self._idle if now - c[1] >= self.idle_timeout]
+        if not expired:
+            return
+
+        self._idle = [c for c in self._idle if now - c[1] < self.idle_timeout]
+        for (connection, _) in expired:
+            self._close(connection)
+        self._n_open -= len(expired)
+
+
+    def _is_alive(self, connection) -> bool:
+        try:
+            self.backend.ping(connection)
+            return True
+        except DBError:
+            return False
+
+
+    def _close(self, connection):
+        if self.statements:
+            self.statements.forget(connection)
+        try:
+            connection.close()
+        except DBError:
+            pass
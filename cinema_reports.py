@@ -0,0 +1,99 @@
+# Sales and occupancy reports
+# The revenue reports read the DailySales summary (migration 2) maintained by the ticket triggers and
+# the occupancy report reads Schedule.s_taken - none of them scans the Tickets table
+# DailySales keeps the sales of the archived screenings (migration 7), the reports reading the screenings
+# take them from {schedule}: Schedule or Schedule with ArchiveSchedule
+
+
+
+# name -> (description, columns, query)
+# Every query takes the [start, end) range of the screening days, 'top' also the number of rows
+REPORTS = {
+    'occupancy': ("Occupancy of every screening",
+                  ['id', 'movie', 'room', 'start_time', 'taken', 'seats', 'occupancy_pct'],
+                  """
+                  SELECT s.id, m.title, s.room_id, s.start_time, s.s_taken, r.s_max,
+                         ROUND(100.0 * s.s_taken / r.s_max, 1)
+                      FROM {schedule} AS s
+                          JOIN Movies AS m ON s.movie_id = m.id
+                          JOIN Rooms AS r ON s.room_id = r.id
+                      WHERE s.start_time >= ? AND s.start_time < ?
+                      ORDER BY s.start_time, s.room_id
+                  """),
+
+    'movies': ("Revenue per movie",
+               ['movie_id', 'movie', 'tickets', 'seats', 'revenue'],
+               """
+               SELECT m.id, m.title, SUM(d.tickets), SUM(d.seats), SUM(d.revenue)
+                   FROM DailySales AS d JOIN Movies AS m ON d.movie_id = m.id
+                   WHERE d.day >= ? AND d.day < ?
+                   GROUP BY m.id, m.title
+                   ORDER BY SUM(d.revenue) DESC, m.id
+               """),
+
+    'rooms': ("Revenue and occupancy per room",
+              ['room', 'screenings', 'tickets', 'seats', 'revenue', 'occupancy_pct'],
+              """
+              SELECT r.id, o.screenings, COALESCE(d.tickets, 0), COALESCE(d.seats, 0), COALESCE(d.revenue, 0),
+                     ROUND(100.0 * o.taken / (o.screenings * r.s_max), 1)
+                  FROM Rooms AS r
+                      JOIN (SELECT s.room_id, COUNT(*) AS screenings, SUM(s.s_taken) AS taken
+                                FROM {schedule} AS s
+                                WHERE s.start_time >= ? AND s.start_time < ?
+                                GROUP BY s.room_id) AS o ON o.room_id = r.id
+                      LEFT JOIN (SELECT room_id, SUM(tickets) AS tickets, SUM(seats) AS seats, SUM(revenue) AS revenue
+                                     FROM DailySales
+                                     WHERE day >= ? AND day < ?
+                                     GROUP BY room_id) AS d ON d.room_id = r.id
+                  ORDER BY r.id
+              """),
+
+    'days': ("Revenue per day",
+             ['day', 'tickets', 'seats', 'revenue'],
+             """
+             SELECT d.day, SUM(d.tickets), SUM(d.seats), SUM(d.revenue)
+                 FROM DailySales AS d
+                 WHERE d.day >= ? AND d.day < ?
+                 GROUP BY d.day
+                 ORDER BY d.day
+             """),
+
+    'top': ("Best selling movies by the number of seats",
+            ['movie_id', 'movie', 'seats', 'revenue'],
+            """
+            SELECT m.id, m.title, SUM(d.seats), SUM(d.revenue)
+                FROM DailySales AS d JOIN Movies AS m ON d.movie_id = m.id
+                WHERE d.day >= ? AND d.day < ?
+                GROUP BY m.id, m.title
+                ORDER BY SUM(d.seats) DESC, m.id
+                LIMIT ?
+            """)
+}
+
+TOP_SIZE = 10
+
+ARCHIVED_SCHEDULE = """(SELECT id, movie_id, room_id, start_time, s_taken FROM Schedule
+                         UNION ALL
+                         SELECT id, movie_id, room_id, start_time, s_taken FROM ArchiveSchedule)"""
+
+
+
+def report(cursor, name: str, start, end, limit: int = TOP_SIZE, archive: bool = False) -> tuple:
+    # (columns, rows) of the report over the screenings from start (datetime) until end (exclusive)
+    # archive: with the archived screenings
+    if name not in REPORTS:
+        raise ValueError(f"unknown report '{name}' - must be one of: {', '.join(REPORTS)}")
+
+    (_, columns, query) = REPORTS[name]
+    days = (start.date(), end.date())
+    if name == "occupancy":
+        params = (start, end)
+    elif name == "rooms":
+        params = (start, end) + days
+    elif name == "top":
+        params = days + (limit,)
+    else:
+        params = days
+
+    cursor.execute(query.format(schedule=ARCHIVED_SCHEDULE if archive else "Schedule"), params)
+    return columns, cursor.fetchall()
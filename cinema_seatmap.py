@@ -0,0 +1,122 @@
+import sys
+from array import array
+
+
+
+class SeatConflict(Exception):
+    pass
+
+
+
+# Taken seats of a screening as a bitset - bit i of the bytes is seat i (row i // row_length, seat i % row_length)
+# A 500 seat room takes 63 bytes
+class SeatMap:
+    def __init__(self, n_seats: int, row_length: int, bits: bytes = None):
+        self.n_seats = n_seats
+        self.row_length = max(1, min(row_length, n_seats))
+        # A shorter stored map (e.g. the empty map of a new screening) has the remaining seats free
+        self.bits = bytearray(bytes(bits or b"")[:size(n_seats)].ljust(size(n_seats), b"\0"))
+
+
+    def __getattribute__(self, name: str):
+        return object.__getattribute__(self, name)
+
+
+
+    @property
+    def n_rows(self) -> int:
+        return -(-self.n_seats // self.row_length)
+
+
+
+    def is_taken(self, seat: int) -> bool:
+        return bool(self.bits[seat >> 3] & (1 << (seat & 7)))
+
+
+
+    def n_taken(self) -> int:
+        return sum(bin(byte).count('1') for byte in self.bits)
+
+
+
+    def reserve(self, seats: list):
+        # All or nothing - the map is not changed when any of the seats is taken or out of the room
+        for seat in seats:
+            if not 0 <= seat < self.n_seats:
+                raise SeatConflict(f"No seat {label(seat, self.row_length)}")
+            if self.is_taken(seat):
+                raise SeatConflict(f"Seat {label(seat, self.row_length)} is taken")
+        for seat in seats:
+            self.bits[seat >> 3] |= 1 << (seat & 7)
+
+
+
+    def release(self, seats: list):
+        for seat in seats:
+            if 0 <= seat < self.n_seats:
+                self.bits[seat >> 3] &= ~(1 << (seat & 7)) & 0xFF
+
+
+
+    def best_adjacent(self, n: int) -> list:
+        # n free seats next to each other in one row, as close to the middle of the room as possible
+        # (the middle row first, then the middle of the row) - None when no row has such a block
+        if n <= 0 or n > self.row_length:
+            return None
+
+        taken = int.from_bytes(self.bits, 'little')
+        block = (1 << n) - 1
+        middle_row = (self.n_rows - 1) / 2
+
+        best = None
+        for row in sorted(range(self.n_rows), key=lambda row: abs(row - middle_row)):
+            if best and abs(row - middle_row) > best[0]:
+                break
+
+            first_seat = row * self.row_length
+            row_seats = min(self.row_length, self.n_seats - first_seat)
+            middle_seat = (row_seats - n) / 2
+            for start in range(row_seats - n + 1):
+                if (taken >> (first_seat + start)) & block:
+                    continue
+                score = (abs(row - middle_row), abs(start - middle_seat))
+                if not best or score < best[:2]:
+                    best = score + (first_seat + start,)
+
+        return list(range(best[2], best[2] + n)) if best else None
+
+
+
+    def rows(self) -> list:
+        # One '.' (free) / '#' (taken) string per row
+        return [''.join('#' if self.is_taken(seat) else '.'
+                        for seat in range(row * self.row_length, min((row + 1) * self.row_length, self.n_seats)))
+                for row in range(self.n_rows)]
+
+
+
+
+
+def size(n_seats: int) -> int:
+    return (n_seats + 7) // 8
+
+
+def label(seat: int, row_length: int) -> str:
+    # 'row-seat' counted from 1
+    return f"{seat // row_length + 1}-{seat % row_length + 1}"
+
+
+def pack(seats: list) -> bytes:
+    # Seat numbers of a ticket - 2 bytes per seat, little endian
+    seats = array('H', seats)
+    if sys.byteorder == "big":
+        seats.byteswap()
+    return seats.tobytes()
+
+
+def unpack(data: bytes) -> list:
+    seats = array('H')
+    seats.frombytes(bytes(data))
+    if sys.byteorder == "big":
+        seats.byteswap()
+    return seats.tolist()
@@ -0,0 +1,129 @@
+import threading
+import time
+from bisect import bisect_left
+from datetime import datetime, time as day_time
+
+
+
+# Free seats per screening of a day grouped by movie and ordered by the start time
+class _Day:
+    def __init__(self, rows: list, ttl: int):
+        self.expires_at = time.monotonic() + ttl
+        self.movies = {}    # movie_id -> [schedule rows ordered by start_time]
+        self.starts = {}    # movie_id -> [start_time] for bisecting the time windows
+
+        for row in sorted(rows, key=lambda row: (row[1], row[5])):
+            self.movies.setdefault(row[1], []).append(row)
+        for (movie_id, screenings) in self.movies.items():
+            self.starts[movie_id] = [row[5] for row in screenings]
+
+
+
+# In-memory index of free seats (r.s_max - s.s_taken) per screening
+# Rows have the DBConnector schedule layout: (s.id, m.id, m.title, l.name, l.type, s.start_time, s.s_taken, r.s_max)
+class SeatIndex:
+    def __init__(self, **kwargs):
+        self.ttl = kwargs.get("ttl", 300)  # seconds before a day is reloaded from the database
+
+        self._days = {}         # date -> _Day
+        self._screenings = {}   # schedule_id -> (date, movie_id)
+        self._lock = threading.RLock()
+
+
+    def __getattribute__(self, name: str):
+        return object.__getattribute__(self, name)
+
+
+
+    def loaded(self, date) -> bool:
+        with self._lock:
+            day = self._days.get(_to_date(date), None)
+            return bool(day) and day.expires_at > time.monotonic()
+
+
+
+    def load(self, date, rows: list):
+        date = _to_date(date)
+        with self._lock:
+            day = _Day(rows, self.ttl)
+            self._days[date] = day
+            for row in rows:
+                self._screenings[row[0]] = (date, row[1])
+
+
+
+    def find(self, n_seats: int, date, **kwargs) -> list:
+        # Screenings on the date with at least n_seats free seats, optionally of the movie_id
+        # and starting within the [start, end) time window
+        date = _to_date(date)
+        movie_id = kwargs.get("movie_id", None)
+        start = datetime.combine(date, kwargs.get("start", None) or day_time.min)
+        end = kwargs.get("end", None)
+        end = datetime.combine(date, end) if end else None
+
+        with self._lock:
+            day = self._days.get(date, None)
+            if not day:
+                return []
+
+            movies = [movie_id] if movie_id else sorted(day.movies.keys())
+            found = []
+            for movie in movies:
+                screenings = day.movies.get(movie, [])
+                starts = day.starts.get(movie, [])
+                first = bisect_left(starts, start)
+                last = bisect_left(starts, end) if end else len(starts)
+
+                found.extend(row for row in screenings[first:last] if row[7] - row[6] >= n_seats)
+
+            return found
+
+
+
+    def update(self, schedule_id: int, delta: int):
+        # Applies a change of s_taken of the screening
+        with self._lock:
+            screening = self._screenings.get(schedule_id, None)
+            if not screening:
+                return
+
+            (date, movie_id) = screening
+            day = self._days.get(date, None)
+            if not day:
+                return
+
+            screenings = day.movies[movie_id]
+            for (i, row) in enumerate(screenings):
+                if row[0] == schedule_id:
+                    screenings[i] = row[:6] + (row[6] + delta,) + row[7:]
+                    break
+
+
+
+    def invalidate(self, date=None):
+        with self._lock:
+            if date is None:
+                self._days.clear()
+                self._screenings.clear()
+            else:
+                self._days.pop(_to_date(date), None)
+
+
+
+    def invalidate_screening(self, schedule_id: int):
+        # The day of the screening is reloaded by its next search
+        with self._lock:
+            screening = self._screenings.get(schedule_id, None)
+            if screening:
+                self._days.pop(screening[0], None)
+
+
+
+
+
+def _to_date(date):
+    if isinstance(date, str):
+        return datetime.strptime(date, '%Y-%m-%d').date()
+    if isinstance(date, datetime):
+        return date.date()
+    return date
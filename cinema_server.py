@@ -0,0 +1,212 @@
+import argparse
+import socket
+import socketserver
+import sys
+import threading
+from getpass import getpass
+
+import cinema
+import cinema_utils as utils
+
+this = sys.modules[__name__]
+
+
+
+# sys.stdout replacement routing print() of each session thread to its own terminal
+# Threads without a session (the server itself) write to the original stdout
+class _SessionOutput:
+    def __init__(self, stdout):
+        self._stdout = stdout
+        self._local = threading.local()
+
+
+    def __getattr__(self, name: str):
+        return getattr(self._stdout, name)
+
+
+    def bind(self, write_fn):
+        self._local.write = write_fn
+
+
+    def unbind(self):
+        self._local.write = None
+
+
+    def write(self, text: str) -> int:
+        write_fn = getattr(self._local, "write", None)
+        if write_fn:
+            write_fn(text)
+            return len(text)
+        return self._stdout.write(text)
+
+
+    def flush(self):
+        if not getattr(self._local, "write", None):
+            self._stdout.flush()
+
+
+
+class _SessionHandler(socketserver.StreamRequestHandler):
+    disable_nagle_algorithm = True
+
+    def handle(self):
+        if not this.sessions.acquire(blocking=False):
+            self.wfile.write(b"Error: Too many sessions - try again later\n")
+            return
+
+        sys.stdout.bind(self._write)
+        try:
+            print("Cinema ticket sales app\n")
+            _run_session(utils.Prompt(None, read=self._read, read_password=self._read, console=False))
+
+        except (SystemExit, EOFError, ConnectionError):
+            pass
+
+        finally:
+            sys.stdout.unbind()
+            this.sessions.release()
+
+
+    def _read(self, prompt: str) -> str:
+        self._write(prompt)
+        line = self.rfile.readline()
+        if not line:
+            raise EOFError
+        return line.decode().rstrip("\r\n")
+
+
+    def _write(self, text: str):
+        self.wfile.write(text.encode())
+
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    request_queue_size = 128
+    daemon_threads = True
+
+
+
+def _login(init_cmd: utils.Prompt) -> str:
+    # Same as cinema._open_app, but the init connection is borrowed only for the role check
+    while True:
+        credentials = init_cmd.get_credentials()
+        if not credentials:
+            continue
+
+        init_connector = cinema._connector(this.config['init_user'])
+        if not init_connector.open():
+            raise SystemExit
+        role = init_connector.get_role(credentials)
+        init_connector.close()
+
+        if role:
+            return role
+        print("Error: Invalid credentials\nTry again!")
+
+
+
+def _run_session(init_cmd: utils.Prompt):
+    while True:
+        role = _login(init_cmd)
+        connector = cinema._connector(role)
+
+        if not connector.open():
+            print("Error: Database connection\nTry again!")
+            continue
+        connector.close()
+
+        print(f"Success: Logged in as {role}")
+        cmd = utils.Prompt(connector, read=init_cmd.read, read_password=init_cmd.read_password, console=False)
+        while True:
+            command = cmd.read("cmd> ")
+
+            # A pooled connection is borrowed only while a command runs, so idle terminals do not hold one
+            if not connector.open():
+                continue
+            try:
+                logOut = cmd.exec(command)
+            finally:
+                connector.close()
+
+            if logOut:
+                break
+
+
+
+def serve(host: str = None, port: int = None):
+    cinema._init()
+    this.config = cinema.config
+
+    server_config = this.config.get('server', {})
+    host = host or server_config.get('host', "127.0.0.1")
+    port = port or server_config.get('port', 7070)
+    this.sessions = threading.BoundedSemaphore(server_config.get('max_sessions', 64))
+
+    sys.stdout = _SessionOutput(sys.stdout)
+    with _Server((host, port), _SessionHandler) as server:
+        print(f"Serving cinema sessions on {host}:{port}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+    # The group commit writer and the journal sell their last sales before the pools are closed
+    cinema._shutdown()
+    for pool in cinema.pools.values():
+        pool.close()
+
+
+
+def client(host: str, port: int):
+    # Terminal for a session - passwords are read without echo
+    sock = socket.create_connection((host, port))
+    prompted = threading.Event()
+    last_output = [""]
+
+    def receive():
+        while True:
+            data = sock.recv(4096)
+            if not data:
+                break
+            text = data.decode()
+            sys.stdout.write(text)
+            sys.stdout.flush()
+            last_output[0] = (last_output[0] + text)[-16:]
+            if last_output[0].endswith((": ", "> ")):
+                prompted.set()
+        last_output[0] = None
+        prompted.set()
+
+    threading.Thread(target=receive, daemon=True).start()
+    try:
+        while True:
+            prompted.wait()
+            prompted.clear()
+            if last_output[0] is None:
+                break
+            line = getpass("") if last_output[0].endswith("Password: ") else input()
+            sock.sendall((line + "\n").encode())
+    except (EOFError, KeyboardInterrupt, ConnectionError):
+        pass
+    finally:
+        sock.close()
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cinema multi-session sales server")
+    parser.add_argument("--connect", action="store_true", help="open a terminal session on a running server")
+    parser.add_argument("--host", default=None, help="default: 'server' section of the config or 127.0.0.1")
+    parser.add_argument("--port", type=int, default=None, help="default: 'server' section of the config or 7070")
+    args = parser.parse_args()
+
+    if args.connect:
+        client(args.host or "127.0.0.1", args.port or 7070)
+    else:
+        serve(args.host, args.port)
+
+
+
+if __name__ == "__main__":
+    main()
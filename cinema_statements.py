@@ -0,0 +1,99 @@
+import threading
+
+from cinema_backend import Error as DBError, MariaDBBackend
+
+
+
+# Named statements prepared once per connection and reused by every call
+# Each statement gets its own prepared cursor on every connection it runs on (MariaDB keeps the parsed
+# statement on the server and sends only the parameters in the binary protocol). The cursors live as long
+# as their connection - pooled connections keep them across sessions and the pool drops them (forget)
+# when it closes the connection, so a reconnected session prepares the statements again
+class StatementRegistry:
+    def __init__(self, **kwargs):
+        self.statements = kwargs.get("statements", {})      # name -> SQL
+        self.backend = kwargs.get("backend", None) or MariaDBBackend()
+        self.metrics = kwargs.get("metrics", None)          # cinema_metrics.Metrics wrapping the cursors
+
+        self.prepares = 0   # statements prepared so far
+        self.calls = 0
+
+        self._connections = {}  # id(connection) -> (connection, {name: cursor})
+        self._lock = threading.Lock()
+
+
+    def __getattribute__(self, name: str):
+        return object.__getattribute__(self, name)
+
+
+
+    def execute(self, connection, name: str, params: tuple = ()):
+        # Runs the statement on its prepared cursor of the connection - returns the cursor for the fetches
+        cursor = self.cursor(connection, name)
+        cursor.execute(self.statements[name], params)
+        return cursor
+
+
+
+    def cursor(self, connection, name: str):
+        # Lock-free lookup of an already prepared statement - the connection is used by one thread at a time
+        entry = self._connections.get(id(connection), None)
+        if entry and entry[0] is connection and name in entry[1]:
+            self.calls += 1
+            return entry[1][name]
+
+        if name not in self.statements:
+            raise KeyError(f"unknown statement '{name}'")
+
+        with self._lock:
+            entry = self._connections.get(id(connection), None)
+            if not entry or entry[0] is not connection:
+                entry = self._connections[id(connection)] = (connection, {})
+            cursors = entry[1]
+            self.calls += 1
+
+            cursor = cursors.get(name, None)
+            if not cursor:
+                cursor = self.backend.prepared_cursor(connection)
+                if self.metrics:
+                    cursor = self.metrics.cursor(cursor)
+                cursors[name] = cursor
+                self.prepares += 1
+            return cursor
+
+
+
+    def flush(self, connection):
+        # Records the last statements of the connection's instrumented cursors - see InstrumentedCursor
+        entry = self._connections.get(id(connection), None)
+        if not self.metrics or not entry or entry[0] is not connection:
+            return
+        for cursor in list(entry[1].values()):
+            cursor.flush()
+
+
+
+    def forget(self, connection):
+        # Closes the prepared statements of a connection which is being closed
+        with self._lock:
+            entry = self._connections.get(id(connection), None)
+            if not entry or entry[0] is not connection:
+                return
+            del self._connections[id(connection)]
+
+        for cursor in entry[1].values():
+            try:
+                cursor.close()
+            except DBError:
+                pass
+
+
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'statements': len(self.statements),
+                'connections': len(self._connections),
+                'prepares': self.prepares,
+                'calls': self.calls
+            }
@@ -1,11 +1,117 @@
 # Imports
 import os
+import sys
+import csv
+import json
 from getpass import getpass
 import re
-import mariadb
-import pandas as pd
-from datetime import datetime
-from tabulate import tabulate
+import time
+import random
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from cinema_backend import Error as DBError, MariaDBBackend
+from cinema_seats import SeatIndex
+from cinema_metrics import BUCKETS
+from cinema_statements import StatementRegistry
+import cinema_reports
+import cinema_planner
+import cinema_seatmap
+from cinema_seatmap import SeatConflict
+
+
+
+FETCH_CHUNK_SIZE = 10000
+SEAT_MAP_RETRIES = 5    # compare-and-swap attempts of a seat map update
+HOLD_TTL = 120          # seconds a seat hold is kept before it expires
+HOLD_RETRIES = 10       # compare-and-swap attempts of a seat hold
+HOLD_BACKOFF = 0.002    # seconds - the random wait before a retry doubles with every attempt
+CUSTOMER_PAGE_SIZE = 20
+ARCHIVE_CHUNK = 20      # screenings (with their tickets) moved to the archive per transaction
+READ_YOUR_WRITES = 5    # seconds after a write of the session during which its reads go to the primary
+REPLICA_RETRY = 30      # seconds the read replica is not used after it failed
+EXPORT_QUERY = """
+SELECT t.id, c.id, c.name, c.surname, c.phoneNumber, c.email,
+       s.id, m.title, l.name, l.type, r.id, s.start_time, t.n_seats, r.ticket_price, t.n_seats * r.ticket_price
+    FROM Tickets AS t
+        JOIN Customers AS c ON t.customer_id = c.id
+        JOIN Schedule AS s ON t.schedule_id = s.id
+        JOIN Movies AS m ON s.movie_id = m.id
+        JOIN Languages AS l ON m.language_id = l.id
+        JOIN Rooms AS r ON s.room_id = r.id
+"""
+
+EXPORT_COLUMNS = ['ticket_id', 'customer_id', 'name', 'surname', 'phone_number', 'email',
+                  'schedule_id', 'movie', 'language', 'language_type', 'room_id', 'start_time',
+                  'n_seats', 'ticket_price', 'amount']
+
+# Prompt commands - labels of the command metrics
+COMMANDS = ("exit", "logOut", "clear", "help", "staff", "repertoire", "schedule", "cache", "stats", "report",
+            "available", "seats", "price", "customer", "ticket", "archive", "journal")
+
+REPERTOIRE_QUERY = """
+SELECT DISTINCT(m.title)
+    FROM Schedule AS s JOIN Movies AS m ON s.movie_id = m.id
+    WHERE s.start_time >= ? AND s.start_time < ?
+    ORDER BY m.title
+"""
+
+SCHEDULE_QUERY = """
+SELECT s.id, m.id, m.title, l.name, l.type, s.start_time, s.s_taken, r.s_max
+    FROM Schedule AS s
+        JOIN Movies AS m ON s.movie_id = m.id
+        JOIN Languages AS l ON m.language_id = l.id
+        JOIN Rooms AS r ON s.room_id = r.id
+    WHERE s.start_time >= ? AND s.start_time < ?
+    ORDER BY m.id, s.start_time
+"""
+
+TICKET_QUERY = """
+SELECT t.id, c.name, c.surname, c.phoneNumber, c.email,
+       s.id, m.title, l.name, l.type, s.start_time, t.n_seats, r.ticket_price
+    FROM Tickets AS t
+        JOIN Customers AS c ON t.customer_id = c.id
+        JOIN Schedule AS s ON t.schedule_id = s.id
+        JOIN Movies AS m ON s.movie_id = m.id
+        JOIN Languages AS l ON m.language_id = l.id
+        JOIN Rooms AS r ON s.room_id = r.id
+"""
+
+# Statements of the frequent calls - prepared once per connection by cinema_statements.StatementRegistry
+STATEMENTS = {
+    'role': "SELECT role FROM Staff WHERE username = ? AND pswd = PASSWORD(?)",
+    'price': """
+    SELECT r.ticket_price
+        FROM Schedule AS s JOIN Rooms AS r ON s.room_id = r.id
+        WHERE s.id = ?
+    """,
+    'customer': """
+    SELECT name, surname, phoneNumber, email
+        FROM Customers
+        WHERE id = ?
+    """,
+    'last_ticket': "SELECT id FROM Tickets ORDER BY id DESC LIMIT 1",
+    'ticket': TICKET_QUERY + "WHERE t.id = ?",
+    'schedule': SCHEDULE_QUERY,
+    'repertoire': REPERTOIRE_QUERY,
+    'hold_check': """
+    SELECT s.s_taken, s.version, r.s_max,
+           (SELECT COALESCE(SUM(h.n_seats), 0)
+                FROM SeatHolds AS h
+                WHERE h.schedule_id = s.id AND h.expires_at > ?)
+        FROM Schedule AS s JOIN Rooms AS r ON s.room_id = r.id
+        WHERE s.id = ?
+    """,
+    'hold_version': "UPDATE Schedule SET version = version + 1 WHERE id = ? AND version = ?",
+    'sale_version': "UPDATE Schedule SET version = version + 1 WHERE id = ?",
+    'hold_cleanup': "DELETE FROM SeatHolds WHERE schedule_id = ? AND expires_at <= ?",
+    'hold_insert': "INSERT INTO SeatHolds(schedule_id, n_seats, expires_at) VALUES (?, ?, ?)",
+    'ticket_insert': """
+    INSERT INTO Tickets(customer_id, schedule_id, n_seats)
+        VALUES (?, ?, ?)
+    """
+}
 
 
 
@@ -15,6 +121,8 @@ class Credentials:
     def __init__(self, **kwargs):
         user = kwargs.get("username", None)
         pswd = kwargs.get("password", None)
+        self.username = None
+        self.password = None
 
         if _check_input(user) and _check_input(pswd):
             self.username = user
@@ -25,13 +133,13 @@ class Credentials:
         return object.__getattribute__(self, name)
 
     
-    def set(self, username: str, password: str) -> bool:
+    def set(self, username: str, password: str, output: str = "table") -> bool:
         if _check_input(username) and _check_input(password):
             self.username = username
             self.password = password
             return True
 
-        print("Error: Invalid credentials\nTry again!")
+        _print_message("Error: Invalid credentials\nTry again!", output)
         return False
 
 
@@ -42,10 +150,12 @@ class Ticket:
     def __init__(self, **kwargs):
         self.id = kwargs.get("id", None)
         self.customer = kwargs.get("customer", None)
+        self.schedule_id = kwargs.get("schedule_id", None)
         self.movie = kwargs.get("movie", None)
         self.start_time = kwargs.get("start_time", None)
         self.n_seats = kwargs.get("n_seats", None)
         self.seat_price = kwargs.get("seat_price", None)
+        self.seats = kwargs.get("seats", None)      # 'row-seat' labels of the assigned seats
 
 
     def __str__(self):
@@ -58,11 +168,106 @@ class Ticket:
         ticket.append(f"Movie: {self.movie}")
         ticket.append(f"Start time: {self.start_time}")
         ticket.append(f"No. seats: {self.n_seats}")
+        if self.seats:
+            ticket.append(f"Seats: {', '.join(self.seats)}")
         ticket.append(f"Price: {self.n_seats * self.seat_price}")
 
         return '\n\t'.join(ticket)
 
 
+    def to_dict(self) -> dict:
+        return {'id': self.id,
+                'schedule_id': self.schedule_id,
+                **{key.lower().replace(' ', '_'): value for (key, value) in (self.customer or {}).items()},
+                'movie': self.movie,
+                'start_time': self.start_time,
+                'n_seats': self.n_seats,
+                **({'seats': ' '.join(self.seats)} if self.seats else {}),
+                'price': self.n_seats * self.seat_price if self.n_seats and self.seat_price else None}
+
+
+
+
+
+class ResultSet:
+    def __init__(self, columns: list):
+        self.columns = list(columns)
+        self.data = {column: [] for column in self.columns}
+        self.n_rows = 0
+
+
+    def __len__(self) -> int:
+        return self.n_rows
+
+
+    def extend(self, rows: list, row_fn=None):
+        # Appends a chunk of rows column-wise: one transposition per chunk
+        # instead of one DataFrame per row
+        if row_fn:
+            rows = [row_fn(*row) for row in rows]
+        if not rows:
+            return
+
+        for column, values in zip(self.columns, zip(*rows)):
+            self.data[column].extend(values)
+        self.n_rows += len(rows)
+
+
+    @classmethod
+    def from_cursor(cls, cursor, columns: list, row_fn=None, chunk_size: int = None):
+        result = cls(columns)
+        if not chunk_size:
+            result.extend(cursor.fetchall(), row_fn)
+            return result
+
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            result.extend(rows, row_fn)
+        return result
+
+
+    def to_frame(self):
+        # pandas is imported only here - it is not needed to display the results
+        import pandas as pd
+        return pd.DataFrame(self.data, columns=self.columns)
+
+
+    def table(self) -> str:
+        # Rounded outline table with the row numbers in the first column (the former tabulate layout)
+        # built directly from the fetched columns
+        columns = [('', _format_column(range(self.n_rows)))] if self.n_rows else []
+        columns += [(column, _format_column(self.data[column])) for column in self.columns]
+
+        widths = [max([len(header) + 2] + [len(cell) for cell in cells]) for (header, (cells, _)) in columns]
+        header = [header.rjust(width) if numeric else header.ljust(width)
+                  for ((header, (_, numeric)), width) in zip(columns, widths)]
+        rows = zip(*[[cell.rjust(width) if numeric else cell.ljust(width) for cell in cells]
+                     for ((_, (cells, numeric)), width) in zip(columns, widths)])
+
+        rule = lambda left, middle, right: left + middle.join('─' * (width + 2) for width in widths) + right
+        line = lambda cells: '│ ' + ' │ '.join(cells) + ' │'
+        return '\n'.join([rule('╭', '┬', '╮'), line(header), rule('├', '┼', '┤')] +
+                         [line(row) for row in rows] +
+                         [rule('╰', '┴', '╯')])
+
+
+    def show(self, output: str = "table"):
+        # output: 'table' for terminals, 'jsonl' or 'csv' for scripts
+        if output == "jsonl":
+            for row in zip(*(self.data[column] for column in self.columns)):
+                print(json.dumps(dict(zip(self.columns, row)), default=str))
+
+        elif output == "csv":
+            writer = csv.writer(sys.stdout, lineterminator='\n')
+            writer.writerow(self.columns)
+            writer.writerows(zip(*(self.data[column] for column in self.columns)))
+
+        else:
+            print(self.table())
+
+
 
 
 
@@ -72,9 +277,42 @@ class DBConnector:
         self.host = kwargs.get("host", None)
         self.port = kwargs.get("port", None)
         self.database = kwargs.get("database", None)
+        self.pool = kwargs.get("pool", None)
+        self.backend = kwargs.get("backend", None) or (self.pool.backend if self.pool else MariaDBBackend())
+        self.cache = kwargs.get("cache", None)
+        self.seat_index = kwargs.get("seat_index", None) or SeatIndex()
+        self.output = kwargs.get("output", "table")     # 'table', 'jsonl' or 'csv' - see ResultSet.show
+        self.metrics = kwargs.get("metrics", None)      # cinema_metrics.Metrics recording every statement
+        self.hold_ttl = kwargs.get("hold_ttl", HOLD_TTL)
+        self.archive_chunk = kwargs.get("archive_chunk", ARCHIVE_CHUNK)
+        # Prepared statements - shared by the connectors of the application (and their pools)
+        self.statements = kwargs.get("statements", None) or StatementRegistry(statements=STATEMENTS,
+                                                                               backend=self.backend,
+                                                                               metrics=self.metrics)
+        # cinema_commit.GroupCommitter selling the 'ticket new' tickets of all sessions - None: every
+        # command commits its own sale
+        self.group_commit = kwargs.get("group_commit", None)
+        # cinema_journal.SalesJournal acknowledging the 'ticket new' sales before they reach the database -
+        # None: the sales are sold right away
+        self.journal = kwargs.get("journal", None)
+        # Read replica - the SELECT-only methods read from its pool (or from read_host:read_port) when set
+        self.read_pool = kwargs.get("read_pool", None)
+        self.read_host = kwargs.get("read_host", None)
+        self.read_port = kwargs.get("read_port", None)
+        self.read_your_writes = kwargs.get("read_your_writes", READ_YOUR_WRITES)
+        self.replica_retry = kwargs.get("replica_retry", REPLICA_RETRY)
+        self.replica_reads = 0
+        self.replica_fallbacks = 0  # reads sent to the primary because the replica failed
+        self.hold_retries = 0   # compare-and-swap races lost by hold_seats
+        self.failed = False     # the current unit of work reported an error - see transaction
         self.engine = None
         self.connection = None
         self.cursor = None
+        self.read_connection = None
+        self.read_cursor = None
+        self._written_at = None
+        self._replica_down_until = 0
+        self._seat_deltas = None    # (schedule_id, delta) of the current unit of work - see _update_taken_seats
 
     
 
@@ -85,37 +323,168 @@ class DBConnector:
     
     def open(self) -> bool:
         try:
-            self.connection = mariadb.connect(
-                user=self.credentials.username,
-                password=self.credentials.password,
-                host=self.host,
-                port=self.port,
-                database=self.database
-            )
+            if self.pool:
+                self.connection = self.pool.checkout()
+            else:
+                self.connection = self.backend.connect(self.credentials, self.host, self.port, self.database)
             self.cursor = self.connection.cursor()
+            if self.metrics:
+                self.cursor = self.metrics.cursor(self.cursor)
             return True
 
-        except mariadb.Error as e:
-            print(f"Error: MariaDB connection: {e}")
+        except DBError as e:
+            _print_message(f"Error: Database connection: {e}", self.output)
             return False
 
 
 
+    @contextmanager
+    def transaction(self):
+        # Unit of work of a command: committed when the command succeeds, rolled back when it raises
+        # a database error or reports one (the methods catching their errors call _error)
+        # Commands which close the connector (exit, logOut) end their unit of work themselves
+        self.failed = False
+        self._seat_deltas = []
+        try:
+            yield
+        except BaseException:
+            self._end_transaction(commit=False)
+            raise
+        self._end_transaction(commit=not self.failed)
+
+
+
+    def _end_transaction(self, commit: bool):
+        (deltas, self._seat_deltas) = (self._seat_deltas or [], None)
+        if self.read_connection:
+            # The next command reads a new snapshot of the replica
+            try:
+                self.read_connection.rollback()
+            except DBError:
+                self._close_replica(broken=True)
+
+        if not self.connection:
+            self._forget_taken_seats(deltas)
+            return
+
+        try:
+            if commit:
+                self.connection.commit()
+                for (schedule_id, delta) in deltas:
+                    self._apply_taken_seats(schedule_id, delta)
+            else:
+                self.connection.rollback()
+                self._forget_taken_seats(deltas)
+        except DBError as e:
+            # e.g. a deadlock detected at the commit - nothing of the command is kept
+            _print_message(f"Error: Commit: {e}", self.output)
+            self._forget_taken_seats(deltas)
+            try:
+                self.connection.rollback()
+            except DBError:
+                pass
+
+
+
+    def has_replica(self) -> bool:
+        return bool(self.read_pool or self.read_host)
+
+
+
+    def _read(self, read_fn):
+        # Runs read_fn(connection, cursor) of a SELECT-only method on the read replica - on the primary
+        # when there is no replica, for read_your_writes seconds after a write of the session (the replica
+        # may not have it yet), for replica_retry seconds after the replica failed and when it fails now
+        now = time.monotonic()
+        if (not self.has_replica() or now < self._replica_down_until
+                or (self._written_at is not None and now - self._written_at < self.read_your_writes)):
+            return read_fn(self.connection, self.cursor)
+
+        try:
+            if not self.read_connection:
+                self._open_replica()
+            result = read_fn(self.read_connection, self.read_cursor)
+            self.replica_reads += 1
+            return result
+
+        except DBError:
+            self._close_replica(broken=True)
+            self._replica_down_until = time.monotonic() + self.replica_retry
+            self.replica_fallbacks += 1
+            return read_fn(self.connection, self.cursor)
+
+
+
+    def _open_replica(self):
+        if self.read_pool:
+            self.read_connection = self.read_pool.checkout()
+        else:
+            self.read_connection = self.backend.connect(self.credentials, self.read_host, self.read_port,
+                                                        self.database)
+        try:
+            self.backend.read_only(self.read_connection)
+            self.read_cursor = self.read_connection.cursor()
+        except DBError:
+            self._close_replica(broken=True)
+            raise
+        if self.metrics:
+            self.read_cursor = self.metrics.cursor(self.read_cursor)
+
+
+
+    def _close_replica(self, broken: bool = False):
+        if not self.read_connection:
+            return
+
+        try:
+            if self.read_cursor:
+                self.read_cursor.close()
+            self.read_connection.rollback()
+        except DBError:
+            broken = True
+
+        if not self.read_pool:
+            self.statements.forget(self.read_connection)
+            try:
+                self.read_connection.close()
+            except DBError:
+                pass
+        elif broken:
+            self.read_pool.discard(self.read_connection)
+        else:
+            self.read_pool.checkin(self.read_connection)
+
+        self.read_connection = None
+        self.read_cursor = None
+
+
+
+    def _wrote(self):
+        # The session's next reads go to the primary for read_your_writes seconds - see _read
+        self._written_at = time.monotonic()
+
+
+
+    def _error(self, e: Exception):
+        # Reports a caught error and marks the current unit of work to be rolled back
+        _print_message(f"Error: {e}", self.output)
+        self.failed = True
+
+
+
     def get_role(self, credentials: Credentials) -> str:
         try:
-            self.cursor.execute(
-                "SELECT role FROM Staff WHERE username = ? AND pswd = PASSWORD(?)",
-                (credentials.username, credentials.password)
-            )
+            cursor = self.statements.execute(self.connection, "role",
+                                             (credentials.username, credentials.password))
 
-            role = self.cursor.fetchone()
-            self.cursor.fetchall()
+            role = cursor.fetchone()
+            cursor.fetchall()
             if not role:
                 return None
             return role[0]
 
-        except mariadb.Error as e:
-            print(f"Error: {e}")
+        except DBError as e:
+            self._error(e)
             return None
 
 
@@ -123,184 +492,951 @@ class DBConnector:
     def manage_staff(self, action: str, **kwargs):
         if action == "show":
             try:
-                self.cursor.execute("SELECT username, role FROM Staff",)
+                self._show(self._read(lambda connection, cursor: ResultSet.from_cursor(
+                    _execute(cursor, "SELECT username, role FROM Staff"), ['username', 'role'])))
 
-                staff = pd.DataFrame(columns=['username', 'role'])
-                for (user, role) in self.cursor.fetchall():
-                    row = pd.DataFrame({'username': user,
-                                        'role': role}, index=[0])
-                    staff = pd.concat([staff, row]).reset_index(drop=True)
-
-                print(tabulate(staff, headers='keys', tablefmt='rounded_outline'))
-
-            except mariadb.Error as e:
-                print(f"Error: {e}")
+            except DBError as e:
+                self._error(e)
                 return
 
         elif action == "hire":
             try:
                 credentials = kwargs.get("credentials", None)
                 if not credentials:
-                    print("Error: Invalid credentials")
+                    _print_message("Error: Invalid credentials", self.output)
                     return
 
                 self.cursor.execute("""
                 INSERT INTO Staff(username, pswd, role)
                     VALUES(?, PASSWORD(?), 'salesman')
                 """, (credentials.username, credentials.password))
+                self._wrote()
                 
                 self.manage_staff("show")
 
-            except mariadb.Error as e:
-                print(f"Error: {e}")
+            except DBError as e:
+                self._error(e)
                 return 
 
         elif action == "fire":
             try:
                 user = kwargs.get("username", None)
                 if not user:
-                    print("Error: Invalid user")
+                    _print_message("Error: Invalid user", self.output)
                     return
 
                 self.cursor.execute("DELETE FROM Staff WHERE username = ?", (user,))
+                self._wrote()
                 
                 self.manage_staff("show")
 
-            except mariadb.Error as e:
-                print(f"Error: {e}")
+            except DBError as e:
+                self._error(e)
                 return
 
             pass
 
         else:
-            print("Error: invalid value of 'action' - must be 'show', 'hire' or 'fire'")
+            _print_message("Error: invalid value of 'action' - must be 'show', 'hire' or 'fire'", self.output)
 
 
 
-    def display_repertoire(self, date: str):
+    def display_repertoire(self, date: str, date_to: str = None):
         try:
-            self.cursor.execute("""
-            SELECT DISTINCT(m.title)
-                FROM Schedule AS s JOIN Movies AS m ON s.movie_id = m.id
-                WHERE DATE(s.start_time) = DATE(?)
-                ORDER BY m.title;
-            """, (date,))
+            date_to = date_to or date
+            titles = self._cached(("repertoire", date, date_to), self._fetch_repertoire, date, date_to)
 
-            schedule = pd.DataFrame(columns=['title'])
-            for (title) in self.cursor.fetchall():
-                row = pd.DataFrame({'title': title}, index=[0])
-                schedule = pd.concat([schedule, row]).reset_index(drop=True)
+            result = ResultSet(['title'])
+            result.extend(titles)
+            self._show(result)
 
-            print(tabulate(schedule, headers='keys', tablefmt='rounded_outline'))
+        except ValueError as e:
+            _print_message(f"Error: Invalid date: {e}", self.output)
 
-        except mariadb.Error as e:
-            print(f"Error: {e}")
+        except DBError as e:
+            self._error(e)
 
 
 
-    def display_schedule(self, date: str):
+    def display_schedule(self, date: str, date_to: str = None):
         try:
-            self.cursor.execute("""
-            SELECT s.id, m.id, m.title, l.name, l.type, s.start_time, s.s_taken, r.s_max 
-                FROM Schedule AS s 
-                    JOIN Movies AS m ON s.movie_id = m.id
-                    JOIN Languages AS l ON m.language_id = l.id
-                    JOIN Rooms AS r ON s.room_id = r.id
-                WHERE DATE(s.start_time) = DATE(?)
-                ORDER BY m.id;
-            """, (date,))
+            date_to = date_to or date
+            schedule = self._cached(("schedule", date, date_to), self._fetch_schedule, date, date_to)
+
+            result = ResultSet(['id', 'movie', 'start_time', 'free_seats'])
+            result.extend(schedule, row_fn=_schedule_row)
+            self._show(result)
+
+        except ValueError as e:
+            _print_message(f"Error: Invalid date: {e}", self.output)
+
+        except DBError as e:
+            self._error(e)
+
+
+
+    def display_report(self, name: str, date: str, date_to: str = None, limit: int = cinema_reports.TOP_SIZE,
+                       archive: bool = False):
+        try:
+            (start, end) = _date_range(date, date_to or date)
+            (columns, rows) = self._read(lambda connection, cursor: cinema_reports.report(cursor, name, start, end,
+                                                                                           limit, archive))
+
+            result = ResultSet(columns)
+            result.extend(rows)
+            self._show(result)
+
+        except ValueError as e:
+            _print_message(f"Error: Invalid arguments: {e}", self.output)
+
+        except DBError as e:
+            self._error(e)
 
-            schedule = pd.DataFrame(columns=['id', 'movie', 'start_time', 'free_seats'])
-            for (s_id, m_id, title, l_name, l_type, start, s_taken, s_max) in self.cursor.fetchall():
-                row = pd.DataFrame({'id': s_id,
-                                    'movie': f"{m_id}: {title} ({l_name} - {l_type})",
-                                    'start_time': start,
-                                    'free_seats': s_max - s_taken}, index=[0])
-                schedule = pd.concat([schedule, row]).reset_index(drop=True)
 
-            print(tabulate(schedule, headers='keys', tablefmt='rounded_outline'))
 
-        except mariadb.Error as e:
-            print(f"Error: {e}")
+    def find_screenings(self, n_seats: int, date: str, **kwargs) -> list:
+        # Screenings with at least n_seats free seats - kwargs: movie_id, start, end (see SeatIndex.find)
+        if not self.seat_index.loaded(date):
+            self.seat_index.load(date, self._cached(("schedule", date, date), self._fetch_schedule, date, date))
+
+        return self.seat_index.find(n_seats, date, **kwargs)
+
+
+
+    def display_available(self, n_seats: int, date: str, **kwargs):
+        try:
+            result = ResultSet(['id', 'movie', 'start_time', 'free_seats'])
+            result.extend(self.find_screenings(n_seats, date, **kwargs), row_fn=_schedule_row)
+            self._show(result)
+
+        except DBError as e:
+            self._error(e)
+
+
+
+    def _show(self, result: ResultSet):
+        result.show(self.output)
+
+
+
+    def _show_ticket(self, ticket: Ticket):
+        self._show_tickets([ticket])
+
+
+
+    def _show_tickets(self, tickets: list):
+        # One result set for all tickets - a single CSV header
+        if self.output == "table":
+            for ticket in tickets:
+                print(f"\n{ticket}\n")
+        elif tickets:
+            result = ResultSet(list(tickets[0].to_dict().keys()))
+            result.extend([tuple(ticket.to_dict().values()) for ticket in tickets])
+            result.show(self.output)
+
+
+
+    def display_stats(self, kind: str = None):
+        # kind: 'statements' or 'commands' - both on terminals when not given, the statements in the
+        # jsonl / csv output (one result set per command: one CSV header, one JSON record shape)
+        if not self.metrics:
+            _print_message("Error: Metrics disabled", self.output)
+            return
+        if kind not in (None, "statements", "commands"):
+            _print_message("Error: Invalid arguments - 'statements' or 'commands'", self.output)
+            return
+        if not kind and self.output != "table":
+            kind = "statements"
+
+        self.flush_metrics()
+        if kind != "commands":
+            statements = ResultSet(['statement', 'calls', 'errors', 'rows', 'avg_ms', 'max_ms'] +
+                                   [f"<={bound * 1e3:g}ms" for bound in BUCKETS] + ['>5000ms'])
+            statements.extend(self.metrics.statement_stats(),
+                              row_fn=lambda statement, *stats: (statement[:60], *stats))
+            self._show(statements)
+
+        if kind != "statements":
+            commands = ResultSet(['command', 'calls', 'avg_ms', 'max_ms', 'avg_round_trips', 'max_round_trips'])
+            commands.extend(self.metrics.command_stats())
+            self._show(commands)
+        if self.output == "table":
+            prepared = self.statements.stats()
+            print(f"Prepared statements: {prepared['prepares']} prepared on {prepared['connections']} connections "
+                  f"for {prepared['calls']} calls\n")
+            if self.has_replica():
+                print(f"Read replica: {self.replica_reads} reads, {self.replica_fallbacks} sent to the primary "
+                      f"after a replica failure\n")
+            if self.group_commit:
+                group = self.group_commit.stats()
+                print(f"Group commit: {group['sales']} sales in {group['batches']} commits "
+                      f"({group['avg_batch']:.1f} per commit)\n")
+
+        if self.metrics.prometheus_file:
+            self.metrics.dump()
+
+
+
+    def display_journal(self):
+        # Journaled sales waiting for the database and the sales it rejected
+        if not self.journal:
+            _print_message("Error: Sales journal disabled", self.output)
+            return
+
+        # One result set - a single CSV header and one JSON record shape
+        (pending, conflicts) = (self.journal.pending(), self.journal.conflicts())
+        result = ResultSet(['status', 'sale', 'customer_id', 'schedule_id', 'n_seats', 'at', 'error'])
+        result.extend([("pending", *sale, None) for sale in pending] +
+                      [("rejected", *conflict) for conflict in conflicts])
+        self._show(result)
+        if self.output == "table":
+            print(f"Sales journal: {len(pending)} pending, {len(conflicts)} rejected, {self.journal.flushed} sold "
+                  f"by this run" + (f" - the last flush failed: {self.journal.last_error}"
+                                    if self.journal.last_error else "") + "\n")
+
+
+
+    def flush_metrics(self):
+        # Records the last statement of a command - its fetches are over
+        if self.metrics and self.cursor:
+            self.cursor.flush()
+            self.statements.flush(self.connection)
+        if self.metrics and self.read_cursor:
+            self.read_cursor.flush()
+            self.statements.flush(self.read_connection)
+
+
+
+    def display_price(self, schedule_id: int):
+        price = self.get_price(schedule_id)
+        if price is None:
+            if not self.failed:
+                _print_message(f"Error: No screening {schedule_id}", self.output)
+            return
+
+        result = ResultSet(['schedule_id', 'price'])
+        result.extend([(int(schedule_id), price)])
+        self._show(result)
+
+
+
+    def display_customer(self, customer_id: int):
+        customer = self.get_customer_data(customer_id)
+        if customer:
+            result = ResultSet(['id', 'name', 'surname', 'phone_number', 'email'])
+            result.extend([(int(customer_id), *customer)])
+            self._show(result)
+
+
+
+    def display_cache(self):
+        stats = self.cache_stats()
+        if not stats:
+            _print_message("Error: Cache disabled", self.output)
+            return
+
+        result = ResultSet(list(stats.keys()))
+        result.extend([tuple(stats.values())])
+        self._show(result)
+
+
+
+    def cache_stats(self) -> dict:
+        if not self.cache:
+            return None
+        return self.cache.stats()
+
+
+
+    def _cached(self, key: tuple, fetch_fn, *args) -> list:
+        if not self.cache:
+            return fetch_fn(*args)
+
+        rows = self.cache.get(key)
+        if rows is None:
+            rows = fetch_fn(*args)
+            self.cache.put(key, rows)
+        return rows
+
+
+
+    def _fetch_repertoire(self, date_from: str, date_to: str) -> list:
+        days = _date_range(date_from, date_to)
+        return self._read(lambda connection, _: self.statements.execute(connection, "repertoire", days).fetchall())
+
+
+
+    def _fetch_schedule(self, date_from: str, date_to: str) -> list:
+        # Rows: (s.id, m.id, m.title, l.name, l.type, s.start_time, s.s_taken, r.s_max)
+        days = _date_range(date_from, date_to)
+        return self._read(lambda connection, _: self.statements.execute(connection, "schedule", days).fetchall())
+
+
+
+    def _update_taken_seats(self, schedule_id: int, delta: int):
+        # Applies a ticket write to the cached schedules so the free seat counts stay correct
+        # Inside a unit of work (see transaction) it is applied when the unit of work commits
+        schedule_id = int(schedule_id)
+        self._wrote()
+        if self._seat_deltas is not None:
+            self._seat_deltas.append((schedule_id, delta))
+        else:
+            self._apply_taken_seats(schedule_id, delta)
+
+
+
+    def _apply_taken_seats(self, schedule_id: int, delta: int):
+        self.seat_index.update(schedule_id, delta)
+        if not self.cache:
+            return
+
+        def update(key: tuple, rows: list) -> list:
+            if key[0] != "schedule":
+                return rows
+            return [row[:6] + (row[6] + delta,) + row[7:] if row[0] == schedule_id else row
+                    for row in rows]
+
+        self.cache.update(update)
+
+
+
+    def _forget_taken_seats(self, deltas: list):
+        # A rolled back unit of work may have committed some of its sales (e.g. a ticket sold before a
+        # failed fetch) - its screenings are reloaded from the database instead
+        for schedule_id in {schedule_id for (schedule_id, _) in deltas}:
+            self.seat_index.invalidate_screening(schedule_id)
+            if self.cache:
+                self.cache.invalidate_if(lambda key, rows: key[0] == "schedule" and
+                                         any(row[0] == schedule_id for row in rows))
 
 
 
     def get_price(self, schedule_id: int) -> int:
         try:
-            self.cursor.execute("""
-            SELECT r.ticket_price
-                FROM Schedule AS s JOIN Rooms AS r ON s.room_id = r.id
-                WHERE s.id = ?;
-            """, (schedule_id,))
+            cursor = self.statements.execute(self.connection, "price", (schedule_id,))
 
-            (price,) = self.cursor.fetchone()
-            self.cursor.fetchall()
+            (price,) = cursor.fetchone() or (None,)
+            cursor.fetchall()
             if not price:
                 return None
             return price
 
-        except mariadb.Error as e:
-            print(f"Error: {e}")
+        except DBError as e:
+            self._error(e)
             return None
 
 
 
     def get_customer_data(self, customer_id: int) -> tuple:
         try:
-            self.cursor.execute("""
-            SELECT name, surname, phoneNumber, email
-                FROM Customers
-                WHERE id = ?
-            """, (customer_id,))
+            cursor = self.statements.execute(self.connection, "customer", (customer_id,))
 
-            customer_data = self.cursor.fetchone()
-            self.cursor.fetchone()
+            customer_data = cursor.fetchone()
+            cursor.fetchall()
 
             if not customer_data:
-                print("Error: Could not fetch customer data")
+                _print_message("Error: Could not fetch customer data", self.output)
                 return
             
             return customer_data
 
-        except mariadb.Error as e:
-            print(f"Error: {e}")
+        except DBError as e:
+            self._error(e)
             return None
 
 
 
+    def find_customers(self, text: str, page: int = 1, size: int = CUSTOMER_PAGE_SIZE) -> tuple:
+        # Customers whose surname or name (the phone number for digits, the email for a text with '@' or '.')
+        # starts with the text - (rows of the page, more pages) ordered by the matched column
+        # Every column is an index range scan stopping after the rows of the requested pages
+        columns = _customer_columns(text)
+        pattern = re.sub(r"([!%_])", r"!\1", text.strip()) + "%"
+        offset = (page - 1) * size
+
+        params = []
+        for (i, _) in enumerate(columns):
+            params += [pattern] * (i + 1) + [offset + size + 1]
+        query = _customer_search_query(columns, self.backend.nocase)
+        params += [size + 1, offset]
+        rows = self._read(lambda connection, cursor: _execute(cursor, query, tuple(params)).fetchall())
+        return rows[:size], len(rows) > size
+
+
+
+    def display_customers(self, text: str, page: int = 1):
+        try:
+            (rows, more) = self.find_customers(text, page)
+
+            result = ResultSet(['id', 'name', 'surname', 'phone_number', 'email'])
+            result.extend(rows)
+            self._show(result)
+            if self.output == "table":
+                print(f"Page {page}" + (f" - next: customer find {text} {page + 1}" if more else "") + "\n")
+
+        except DBError as e:
+            self._error(e)
+
+
+
     def get_last_ticket(self) -> int:
         try:
-            self.cursor.execute("SELECT id FROM Tickets ORDER BY id DESC LIMIT 1",)
+            cursor = self.statements.execute(self.connection, "last_ticket")
+
+            (ticket,) = cursor.fetchone()
+            cursor.fetchall()
+            if not ticket:
+                return None
+            return ticket
+
+        except DBError as e:
+            self._error(e)
+            return None
+
+
+
+    def get_ticket(self, ticket_id: int) -> Ticket:
+        try:
+            cursor = self.statements.execute(self.connection, "ticket", (ticket_id,))
+
+            ticket_data = cursor.fetchone()
+            cursor.fetchall()
+            if not ticket_data:
+                return None
+
+            return _ticket_from_row(*ticket_data)
+
+        except DBError as e:
+            self._error(e)
+            return None
+
+
+
+    def get_tickets(self, ticket_ids: list) -> list:
+        if not ticket_ids:
+            return []
+
+        try:
+            self.cursor.execute(TICKET_QUERY + f"WHERE t.id IN ({', '.join('?' * len(ticket_ids))}) ORDER BY t.id",
+                                tuple(ticket_ids))
+
+            return [_ticket_from_row(*row) for row in self.cursor.fetchall()]
+
+        except DBError as e:
+            self._error(e)
+            return []
+
+
+
+    def issue_tickets(self, orders: list) -> tuple:
+        # Issues a batch of (customer_id, schedule_id, n_seats) orders in one transaction
+        # Returns the issued tickets and the (order_no, order, error) list of rejected orders
+        orders = [tuple(order) for order in orders]
+        if not orders:
+            return [], []
+
+        try:
+            (ticket_ids, failed) = self.insert_orders(orders)
+        except DBError as e:
+            self._error(e)
+            return [], [(order_no, order, str(e)) for (order_no, order) in enumerate(orders, start=1)]
+
+        tickets = self.get_tickets(ticket_ids)
+        for ticket in tickets:
+            self._update_taken_seats(ticket.schedule_id, ticket.n_seats)
+
+        return tickets, failed
+
+
+
+    def insert_orders(self, orders: list) -> tuple:
+        # Inserts the tickets of the orders in the open transaction (not committed) - returns the ticket ids
+        # of the inserted orders (in their order) and the (order_no, order, error) list of rejected orders
+        # The free seats are checked against the sold and the live held seats like hold_seats does: the
+        # version of every screening of the batch is bumped first (in the id order - concurrent batches
+        # lock the rows in the same order), so its row stays locked until the commit and concurrent holds
+        # lose their compare-and-swap
+        ticket_ids = []
+        failed = []
+        now = datetime.now().replace(microsecond=0)
+
+        self.backend.begin(self.connection)
+        free = {}
+        for schedule_id in sorted({int(schedule_id) for (_, schedule_id, _) in orders}):
+            self.statements.execute(self.connection, "sale_version", (schedule_id,))
+            self.cursor.execute(STATEMENTS['hold_check'] + self.backend.locking_read, (now, schedule_id))
+            screening = self.cursor.fetchone()
+            self.cursor.fetchall()
+            if screening:
+                (s_taken, _, s_max, held) = screening
+                free[schedule_id] = s_max - s_taken - held
+
+        accepted = []
+        for (order_no, order) in enumerate(orders, start=1):
+            (schedule_id, n_seats) = (int(order[1]), int(order[2]))
+            if schedule_id not in free:
+                failed.append((order_no, order, f"No screening {schedule_id}"))
+                continue
+            if n_seats > free[schedule_id]:
+                failed.append((order_no, order, f"Only {max(free[schedule_id], 0)} free seats"))
+                continue
+            free[schedule_id] -= n_seats
+            accepted.append((order_no, order))
+        if not accepted:
+            return ticket_ids, failed
+
+        # One executemany for the whole batch - the ids are read back with one query (they increase but are
+        # not always consecutive); no other session can insert tickets of these screenings while their rows
+        # stay locked, the id count is checked anyway
+        self.cursor.execute("SELECT COALESCE(MAX(id), 0) FROM Tickets")
+        (last_id,) = self.cursor.fetchone()
+        schedule_ids = sorted({int(order[1]) for (_, order) in accepted})
+        self.cursor.execute("SAVEPOINT ticket_import")
+        try:
+            self.cursor.executemany(STATEMENTS['ticket_insert'], [tuple(order) for (_, order) in accepted])
+            self.cursor.execute(f"""
+            SELECT id FROM Tickets
+                WHERE id > ? AND schedule_id IN ({", ".join("?" * len(schedule_ids))})
+                ORDER BY id
+            """, (last_id, *schedule_ids))
+            ticket_ids = [ticket_id for (ticket_id,) in self.cursor.fetchall()]
+            if len(ticket_ids) == len(accepted):
+                self.cursor.execute("RELEASE SAVEPOINT ticket_import")
+                return ticket_ids, failed
+        except DBError:
+            pass
+
+        # Orders rejected by the triggers (e.g. an invalid customer) are dropped alone - the batch is redone
+        # row by row with a savepoint per row
+        self.cursor.execute("ROLLBACK TO SAVEPOINT ticket_import")
+        ticket_ids = []
+        for (order_no, order) in accepted:
+            self.cursor.execute("SAVEPOINT ticket_import_row")
+            try:
+                ticket_ids.append(self.statements.execute(self.connection, "ticket_insert", order).lastrowid)
+                self.cursor.execute("RELEASE SAVEPOINT ticket_import_row")
+            except DBError as e:
+                self.cursor.execute("ROLLBACK TO SAVEPOINT ticket_import_row")
+                failed.append((order_no, order, str(e)))
+        self.cursor.execute("RELEASE SAVEPOINT ticket_import")
+        failed.sort(key=lambda rejected: rejected[0])
+
+        return ticket_ids, failed
+
+
+
+    def export_tickets(self, path: str, date_from: str = None, date_to: str = None) -> int:
+        # Streams the tickets (of the screenings from date_from to date_to) into a CSV, gzipped CSV
+        # or Parquet file chunk by chunk - the memory use does not depend on the number of tickets
+        query = EXPORT_QUERY
+        params = ()
+        if date_from:
+            query += "WHERE s.start_time >= ? AND s.start_time < ?\n"
+            params = _date_range(date_from, date_to or date_from)
+        query += "ORDER BY s.start_time, t.id"
+
+        def export(connection, _) -> int:
+            cursor = self.backend.stream_cursor(connection)
+            if self.metrics:
+                cursor = self.metrics.cursor(cursor)
+
+            # Written to a temporary file first - a failed export does not leave a truncated file behind
+            n_rows = 0
+            try:
+                cursor.execute(query, params)
+                with _export_writer(path + ".part", EXPORT_COLUMNS) as write:
+                    while True:
+                        rows = cursor.fetchmany(FETCH_CHUNK_SIZE)
+                        if not rows:
+                            break
+                        write(rows)
+                        n_rows += len(rows)
+                os.replace(path + ".part", path)
+
+            finally:
+                cursor.close()
+                if os.path.exists(path + ".part"):
+                    os.remove(path + ".part")
+
+            return n_rows
+
+        return self._read(export)
+
+
+
+    def import_schedule(self, entries: list) -> tuple:
+        # Adds a batch of (movie_id, room_id, start) screenings in one transaction after checking them
+        # against the existing screenings and each other (cinema_planner)
+        # Returns the added (row_no, entry) and the rejected (row_no, entry, reason) rows
+        if not entries:
+            return [], []
+
+        self.cursor.execute("SELECT id, length FROM Movies")
+        lengths = dict(self.cursor.fetchall())
+        self.cursor.execute("SELECT id FROM Rooms")
+        rooms = {room_id for (room_id,) in self.cursor.fetchall()}
+
+        room_ids = sorted({room_id for (_, room_id, _) in entries if room_id in rooms})
+        existing = []
+        if room_ids:
+            self.cursor.execute(f"""
+            SELECT s.id, s.room_id, s.start_time, m.length
+                FROM Schedule AS s JOIN Movies AS m ON s.movie_id = m.id
+                WHERE s.room_id IN ({', '.join('?' * len(room_ids))})
+                    AND s.start_time >= ? AND s.start_time < ?
+            """, (*room_ids, *cinema_planner.window(entries, lengths)))
+            existing = self.cursor.fetchall()
+
+        (accepted, rejected) = cinema_planner.plan(entries, lengths, rooms, existing)
+        if not accepted:
+            return [], rejected
+
+        try:
+            self.backend.begin(self.connection)
+            self.cursor.execute("SAVEPOINT schedule_import")
+            try:
+                self.cursor.executemany("""
+                INSERT INTO Schedule(movie_id, room_id, start_time, s_taken)
+                    VALUES (?, ?, ?, 0)
+                """, [entry for (_, entry) in accepted])
+                self.cursor.execute("RELEASE SAVEPOINT schedule_import")
+
+            except DBError as e:
+                # e.g. a screening added by another session in the meantime - nothing is added
+                self.cursor.execute("ROLLBACK TO SAVEPOINT schedule_import")
+                return [], rejected + [(row_no, entry, str(e)) for (row_no, entry) in accepted]
+
+        except DBError as e:
+            return [], rejected + [(row_no, entry, str(e)) for (row_no, entry) in accepted]
+
+        # The cached listings and the seat index do not have the new screenings
+        self._wrote()
+        if self.cache:
+            self.cache.invalidate()
+        self.seat_index.invalidate()
+        return accepted, sorted(rejected)
+
+
+
+    def archive(self, before: str) -> tuple:
+        # Moves the screenings finished before the date (and their tickets) to ArchiveSchedule, ArchiveTickets
+        # and ArchiveTicketSeats - archive_chunk screenings per transaction, so the rows of a chunk are locked
+        # only for its few statements. Returns the numbers of the archived (screenings, tickets)
+        # The sales stay in DailySales (migration 7) - the revenue reports do not change
+        self.cursor.execute("SELECT MAX(length) FROM Movies")
+        (max_length,) = self.cursor.fetchone()
+        self.cursor.fetchall()
+        # A screening starting before the cutoff has ended
+        cutoff = min(_date_range(before, before)[0], datetime.now() - timedelta(minutes=max_length or 0))
 
-            (ticket,) = self.cursor.fetchone()
+        self.connection.commit()
+        (n_screenings, n_tickets) = (0, 0)
+        while True:
+            self.cursor.execute("SELECT id FROM Schedule WHERE start_time < ? ORDER BY start_time, id LIMIT ?",
+                                (cutoff, self.archive_chunk))
+            ids = tuple(schedule_id for (schedule_id,) in self.cursor.fetchall())
+            if not ids:
+                break
+
+            self.backend.begin(self.connection)
+            in_ids = f"IN ({', '.join('?' * len(ids))})"
+            try:
+                # A late sale of a locked screening waits for the chunk and then fails on the foreign key
+                # instead of being deleted without a copy
+                self.cursor.execute(f"SELECT id FROM Schedule WHERE id {in_ids}" + self.backend.locking_read, ids)
+                self.cursor.fetchall()
+                self.cursor.execute(f"""
+                INSERT INTO ArchiveSchedule(id, movie_id, room_id, start_time, s_taken)
+                    SELECT id, movie_id, room_id, start_time, s_taken FROM Schedule WHERE id {in_ids}
+                """, ids)
+                self.cursor.execute(f"""
+                INSERT INTO ArchiveTickets(id, customer_id, schedule_id, n_seats)
+                    SELECT id, customer_id, schedule_id, n_seats FROM Tickets WHERE schedule_id {in_ids}
+                """, ids)
+                # Deleted with the tickets (ON DELETE CASCADE)
+                self.cursor.execute(f"""
+                INSERT INTO ArchiveTicketSeats(ticket_id, schedule_id, seats)
+                    SELECT ticket_id, schedule_id, seats FROM TicketSeats WHERE schedule_id {in_ids}
+                """, ids)
+                self.cursor.execute(f"DELETE FROM Tickets WHERE schedule_id {in_ids}", ids)
+                tickets = self.cursor.rowcount
+                self.cursor.execute(f"DELETE FROM Schedule WHERE id {in_ids}", ids)
+                self.connection.commit()
+
+            except DBError:
+                # The archived chunks stay archived - archive can be run again
+                self.connection.rollback()
+                raise
+
+            n_screenings += len(ids)
+            n_tickets += tickets
+
+        if n_screenings:
+            self._wrote()
+            if self.cache:
+                self.cache.invalidate()
+            self.seat_index.invalidate()
+        return n_screenings, n_tickets
+
+
+
+    def hold_seats(self, schedule_id: int, n_seats: int) -> tuple:
+        # Holds n_seats of the screening for hold_ttl seconds - returns (hold_id, expires_at)
+        # The free seats are checked against the sold and the live held seats and the hold is written
+        # only if Schedule.version did not change since the check (compare-and-swap), otherwise the check
+        # is retried after a random backoff. A hold is committed right away in a transaction of its own, so
+        # the screening's row is locked only for the few statements of the hold - the callers commit their
+        # pending work (and end their read snapshot) before calling it
+        for attempt in range(HOLD_RETRIES):
+            self.backend.begin(self.connection)
+            now = datetime.now().replace(microsecond=0)
+            cursor = self.statements.execute(self.connection, "hold_check", (now, schedule_id))
+            screening = cursor.fetchone()
+            cursor.fetchall()
+            if not screening:
+                raise SeatConflict(f"No screening {schedule_id}")
+
+            (s_taken, version, s_max, held) = screening
+            if s_taken + held + n_seats > s_max:
+                raise SeatConflict(f"Only {max(s_max - s_taken - held, 0)} free seats")
+
+            if self.statements.execute(self.connection, "hold_version", (schedule_id, version)).rowcount == 1:
+                # Expired holds are removed by the next hold of the screening
+                self.statements.execute(self.connection, "hold_cleanup", (schedule_id, now))
+                expires_at = now + timedelta(seconds=self.hold_ttl)
+                hold_id = self.statements.execute(self.connection, "hold_insert",
+                                                  (schedule_id, n_seats, expires_at)).lastrowid
+                self.connection.commit()
+                return hold_id, expires_at
+
+            # Another hold or sale won the race - a new transaction reads the current version
+            self.connection.rollback()
+            self.hold_retries += 1
+            time.sleep(random.uniform(0, HOLD_BACKOFF * 2 ** attempt))
+
+        raise SeatConflict("The screening keeps changing - try again")
+
+
+
+    def _sell_hold(self, hold_id: int, customer_id: int) -> tuple:
+        # Turns a live hold into a ticket - returns (ticket_id, schedule_id, n_seats)
+        # Not committed - the caller commits the sale with its other writes
+        self.backend.begin(self.connection)
+        self.cursor.execute("SAVEPOINT sell_hold")
+        try:
+            self.cursor.execute("SELECT schedule_id, n_seats FROM SeatHolds WHERE id = ? AND expires_at > ?" +
+                                self.backend.locking_read, (hold_id, datetime.now()))
+            hold = self.cursor.fetchone()
             self.cursor.fetchall()
+            if not hold:
+                raise SeatConflict(f"No hold {hold_id} - it expired or was already sold")
+
+            self.cursor.execute("DELETE FROM SeatHolds WHERE id = ?", (hold_id,))
+            ticket_id = self.statements.execute(self.connection, "ticket_insert", (customer_id, *hold)).lastrowid
+            self.cursor.execute("RELEASE SAVEPOINT sell_hold")
+            return (ticket_id, *hold)
+
+        except DBError + (SeatConflict,):
+            self.cursor.execute("ROLLBACK TO SAVEPOINT sell_hold")
+            raise
+
+
+
+    def sell_orders(self, orders: list) -> list:
+        # Sells a batch of (customer_id, schedule_id, n_seats) orders in the open transaction - the ticket id
+        # or the SeatConflict / database error of every order, the caller commits the batch
+        # The screening's version is bumped first: its row stays locked until the commit, concurrent
+        # holds lose their compare-and-swap and the locking read below sees every committed hold
+        self.backend.begin(self.connection)
+        results = []
+        for (customer_id, schedule_id, n_seats) in orders:
+            self.cursor.execute("SAVEPOINT group_sale")
+            try:
+                self.statements.execute(self.connection, "sale_version", (schedule_id,))
+                self.cursor.execute(STATEMENTS['hold_check'] + self.backend.locking_read,
+                                    (datetime.now().replace(microsecond=0), schedule_id))
+                screening = self.cursor.fetchone()
+                self.cursor.fetchall()
+                if not screening:
+                    raise SeatConflict(f"No screening {schedule_id}")
+
+                (s_taken, _, s_max, held) = screening
+                if s_taken + held + n_seats > s_max:
+                    raise SeatConflict(f"Only {max(s_max - s_taken - held, 0)} free seats")
+
+                ticket_id = self.statements.execute(self.connection, "ticket_insert",
+                                                    (customer_id, schedule_id, n_seats)).lastrowid
+                self.cursor.execute("RELEASE SAVEPOINT group_sale")
+                results.append(ticket_id)
+
+            except DBError + (SeatConflict,) as e:
+                self.cursor.execute("ROLLBACK TO SAVEPOINT group_sale")
+                results.append(e)
+
+        return results
+
+
+
+    def get_seat_map(self, schedule_id: int, lock: bool = False) -> tuple:
+        # (SeatMap, version) of the screening - (None, None) when there is no such screening
+        # lock: locking read for a following compare-and-swap update
+        self.cursor.execute("""
+        SELECT r.s_max, r.row_length
+            FROM Schedule AS s JOIN Rooms AS r ON s.room_id = r.id
+            WHERE s.id = ?
+        """, (schedule_id,))
+        room = self.cursor.fetchone()
+        self.cursor.fetchall()
+        if not room:
+            return None, None
+
+        self.cursor.execute("SELECT seats, version FROM SeatMaps WHERE schedule_id = ?" +
+                            (self.backend.locking_read if lock else ""), (schedule_id,))
+        (bits, version) = self.cursor.fetchone() or (None, None)
+        self.cursor.fetchall()
+        return cinema_seatmap.SeatMap(*room, bits), version
+
+
+
+    def _update_seat_map(self, schedule_id: int, change_fn):
+        # Compare-and-swap of the screening's seat bitmap: change_fn(seat_map) changes the map and its
+        # result is returned - retried when another session changed the map in the meantime
+        for _ in range(SEAT_MAP_RETRIES):
+            (seat_map, version) = self.get_seat_map(schedule_id, lock=True)
+            if not seat_map:
+                raise SeatConflict(f"No screening {schedule_id}")
+            if version is None:
+                raise SeatConflict(f"No seat map of the screening {schedule_id}")
+
+            result = change_fn(seat_map)
+            self.cursor.execute("""
+            UPDATE SeatMaps
+                SET seats = ?, version = version + 1
+                WHERE schedule_id = ? AND version = ?
+            """, (bytes(seat_map.bits), schedule_id, version))
+            if self.cursor.rowcount == 1:
+                return result
+
+        raise SeatConflict("The seat map keeps changing - try again")
+
+
+
+    def display_seat_map(self, schedule_id: int):
+        try:
+            (seat_map, _) = self.get_seat_map(schedule_id)
+            if not seat_map:
+                _print_message(f"Error: No screening {schedule_id}", self.output)
+                return
+
+            result = ResultSet(['row', 'seats'])
+            result.extend(list(enumerate(seat_map.rows(), start=1)))
+            self._show(result)
+            if self.output == "table":
+                print(f"Taken: {seat_map.n_taken()} of {seat_map.n_seats} seats ('#')\n")
+
+        except DBError as e:
+            self._error(e)
+
+
+
+    def issue_seat_ticket(self, schedule_id: int, n_seats: int, customer_id: int = 1) -> Ticket:
+        # Ticket for the best n_seats adjacent free seats (SeatMap.best_adjacent) of the screening
+        # The seats, the ticket and its seat list are written in one savepoint
+        def reserve(seat_map: cinema_seatmap.SeatMap) -> tuple:
+            seats = seat_map.best_adjacent(n_seats)
+            if not seats:
+                raise SeatConflict(f"No {n_seats} adjacent free seats")
+            seat_map.reserve(seats)
+            return seats, seat_map.row_length
+
+        try:
+            # Nothing of the command is written yet - the commit only ends the snapshot of the customer lookup
+            self.connection.commit()
+            (hold_id, _) = self.hold_seats(schedule_id, n_seats)
+            self.backend.begin(self.connection)
+            self.cursor.execute("SAVEPOINT seat_ticket")
+            try:
+                (seats, row_length) = self._update_seat_map(schedule_id, reserve)
+                (ticket_id, _, _) = self._sell_hold(hold_id, customer_id)
+                self.cursor.execute("INSERT INTO TicketSeats(ticket_id, schedule_id, seats) VALUES (?, ?, ?)",
+                                    (ticket_id, schedule_id, cinema_seatmap.pack(seats)))
+                self.cursor.execute("RELEASE SAVEPOINT seat_ticket")
+                self.connection.commit()
+
+            except DBError + (SeatConflict,):
+                self.cursor.execute("ROLLBACK TO SAVEPOINT seat_ticket")
+                self._release_hold(hold_id)
+                raise
+
+            ticket = self.get_ticket(ticket_id)
             if not ticket:
+                _print_message("Error: Could not fetch ticket data", self.output)
                 return None
+            ticket.seats = [cinema_seatmap.label(seat, row_length) for seat in seats]
+            self._update_taken_seats(ticket.schedule_id, ticket.n_seats)
+
+            self._show_ticket(ticket)
             return ticket
 
-        except mariadb.Error as e:
-            print(f"Error: {e}")
+        except DBError + (SeatConflict,) as e:
+            self._error(e)
             return None
 
 
 
+    def _release_hold(self, hold_id: int):
+        # The seats of a failed sale are free again at once instead of after hold_ttl
+        self.cursor.execute("DELETE FROM SeatHolds WHERE id = ?", (hold_id,))
+        self.connection.commit()
+
+
+
+    def _journal_sale(self, customer_id: int, schedule_id: int, n_seats: int) -> str:
+        # Journals the sale (raises SeatConflict when the cached seats do not allow it) - the ticket is issued
+        # by the journal's flusher, a rejected sale is reported to this session by report_conflicts
+        sale_id = self.journal.record((customer_id, schedule_id, n_seats), owner=self)
+        # The sale id identifies the sale in 'journal' until its ticket is issued
+        result = ResultSet(['sale', 'customer_id', 'schedule_id', 'n_seats'])
+        result.extend([(sale_id, int(customer_id), int(schedule_id), n_seats)])
+        self._show(result)
+        self._update_taken_seats(int(schedule_id), n_seats)
+        return sale_id
+
+
+
+    def report_conflicts(self):
+        # Journaled sales of this session rejected by the database since the last report
+        if not self.journal:
+            return
+
+        conflicts = self.journal.new_conflicts(self)
+        for (conflict_id, customer, schedule, seats, at, error) in conflicts:
+            _print_message(f"Error: Journaled sale {conflict_id} ({seats} seats of the screening {schedule} for the "
+                           f"customer {customer} at {at}) rejected: {error}", self.output)
+        # The shared counts may have been reloaded since the sale - the screenings are read again
+        self._forget_taken_seats([(schedule, -seats) for (_, _, schedule, seats, _, _) in conflicts])
+
+
+
+    def _release_seats(self, ticket_id: int):
+        # Frees the assigned seats of a ticket in its screening's seat map
+        self.cursor.execute("SELECT schedule_id, seats FROM TicketSeats WHERE ticket_id = ?", (ticket_id,))
+        assigned = self.cursor.fetchone()
+        self.cursor.fetchall()
+        if assigned:
+            self._update_seat_map(assigned[0], lambda seat_map: seat_map.release(cinema_seatmap.unpack(assigned[1])))
+
+
+
     def manage_tickets(self, action: str, **kwargs):
         if action == "showall":
             try:
-                self.cursor.execute("SELECT * FROM Tickets",)
-                
-                tickets = pd.DataFrame(columns=['id', 'customer_id', 'schedule_id', 'n_seats'])
-                for (id, customer, schedule, n_seats) in self.cursor.fetchall():
-                    row = pd.DataFrame({'id': id,
-                                        'customer_id': customer,
-                                        'schedule_id': schedule,
-                                        'n_seats': n_seats}, index=[0])
-                    tickets = pd.concat([tickets, row]).reset_index(drop=True)
-
-                print(tabulate(tickets, headers='keys', tablefmt='rounded_outline'))
-
-            except mariadb.Error as e:
-                print(f"Error: {e}")
+                self._show(self._read(lambda connection, cursor: ResultSet.from_cursor(
+                    _execute(cursor, "SELECT * FROM Tickets"), ['id', 'customer_id', 'schedule_id', 'n_seats'],
+                    chunk_size=FETCH_CHUNK_SIZE)))
+
+            except DBError as e:
+                self._error(e)
                 return
 
         elif action == "new":
@@ -309,99 +1445,239 @@ class DBConnector:
                 schedule_id = kwargs.get("schedule_id", None)
                 n_seats = kwargs.get("n_seats", None)
 
-                if not all([customer_id, schedule_id, n_seats]):
-                    print("Error: Invalid data")
+                if not all([customer_id, schedule_id, n_seats]) or not str(n_seats).isdigit():
+                    _print_message("Error: Invalid data", self.output)
                     return
 
-                # Add a new ticket to the database
-                self.cursor.execute("""
-                INSERT INTO Tickets(customer_id, schedule_id, n_seats)
-                    VALUES (?, ?, ?)
-                """, (customer_id, schedule_id, n_seats))
+                if self.journal:
+                    return self._journal_sale(customer_id, schedule_id, int(n_seats))
 
-                # Extract the ticket data from the database TODO: get all customer data
-                self.cursor.execute("""
-                SELECT t.customer_id, s.id, m.title, l.name, l.type, s.start_time, t.n_seats
-                    FROM Tickets AS t
-                        JOIN Schedule AS s ON t.schedule_id = s.id
-                        JOIN Movies AS m ON s.movie_id = m.id
-                        JOIN Languages AS l ON m.language_id = l.id
-                    WHERE t.id = (SELECT id FROM Tickets ORDER BY id DESC LIMIT 1)
-                """,)
+                if self.group_commit:
+                    # Sold on the group committer's connection with the sales of the other sessions - the
+                    # ticket is committed when submit returns. The session commits its own work first: it
+                    # keeps no locks while waiting and reads the sale in a new transaction
+                    self.connection.commit()
+                    ticket_id = self.group_commit.submit((customer_id, schedule_id, int(n_seats)))
+                else:
+                    # The seats are held first (a short optimistic transaction) and the hold is sold and
+                    # committed right away - the screening's row is not locked for the rest of the session
+                    # Nothing of the command is written yet - the commit ends the snapshot of the customer lookup
+                    self.connection.commit()
+                    (hold_id, _) = self.hold_seats(schedule_id, int(n_seats))
+                    try:
+                        (ticket_id, _, _) = self._sell_hold(hold_id, customer_id)
+                        self.connection.commit()
+                    except DBError + (SeatConflict,):
+                        self._release_hold(hold_id)
+                        raise
+
+                # Fetch the whole ticket by the id of the inserted row - concurrent sales cannot be
+                # picked up instead
+                ticket = self.get_ticket(ticket_id)
+                if not ticket:
+                    _print_message("Error: Could not fetch ticket data", self.output)
+                    return
+                self._update_taken_seats(ticket.schedule_id, ticket.n_seats)
 
-                ticket_data = self.cursor.fetchone()
-                self.cursor.fetchall()
+                self._show_ticket(ticket)
+                return ticket
+
+            except DBError + (SeatConflict,) as e:
+                self._error(e)
+                return 
 
-                if not ticket_data:
-                    print("Error: Could not fetch ticket data")
+        elif action == "hold":
+            try:
+                schedule_id = kwargs.get("schedule_id", None)
+                n_seats = kwargs.get("n_seats", None)
+
+                if not schedule_id or not str(n_seats).isdigit() or not int(n_seats):
+                    _print_message("Error: Invalid data", self.output)
                     return
-                    
-                (customer, schedule, m_title, l_name, l_type, start, seats) = ticket_data
-                (c_name, c_surname, c_phone, c_email) = self.get_customer_data(customer)
-
-                ticket = Ticket(id=self.get_last_ticket(),
-                                customer={'Name': c_name,
-                                          'Surname': c_surname,
-                                          'Phone number': c_phone,
-                                          'Email': c_email},
-                                movie=f"{m_title} ({l_name} - {l_type})",
-                                start_time=start,
-                                n_seats=seats,
-                                seat_price=self.get_price(schedule))
-                print(f"\n{ticket}\n")
 
+                (hold_id, expires_at) = self.hold_seats(schedule_id, int(n_seats))
+                # The hold_id is needed by 'ticket confirm' - a result set scripts can parse
+                result = ResultSet(['hold_id', 'schedule_id', 'n_seats', 'expires_at'])
+                result.extend([(hold_id, int(schedule_id), int(n_seats), expires_at)])
+                self._show(result)
+                return hold_id
 
-            except mariadb.Error as e:
-                print(f"Error: {e}")
-                return 
+            except DBError + (SeatConflict,) as e:
+                self._error(e)
+                return
+
+        elif action == "confirm":
+            try:
+                hold_id = kwargs.get("hold_id", None)
+                customer_id = kwargs.get("customer_id", 1)
+
+                if not hold_id:
+                    _print_message("Error: Invalid data", self.output)
+                    return
+
+                (ticket_id, _, _) = self._sell_hold(hold_id, customer_id)
+                self.connection.commit()
+
+                ticket = self.get_ticket(ticket_id)
+                if not ticket:
+                    _print_message("Error: Could not fetch ticket data", self.output)
+                    return
+                self._update_taken_seats(ticket.schedule_id, ticket.n_seats)
+
+                self._show_ticket(ticket)
+                return ticket
+
+            except DBError + (SeatConflict,) as e:
+                self._error(e)
+                return
 
         elif action == "cancel":
             try:
                 id = kwargs.get("id", None)
 
                 if not id:
-                    print("Error: Invalid data")
+                    _print_message("Error: Invalid data", self.output)
                     return
 
+                self.cursor.execute("SELECT schedule_id, n_seats FROM Tickets WHERE id = ?", (id,))
+                ticket_data = self.cursor.fetchone()
+                self.cursor.fetchall()
+
+                self._release_seats(id)
                 self.cursor.execute("DELETE FROM Tickets WHERE id = ?", (id,))
 
-            except mariadb.Error as e:
-                print(f"Error: {e}")
+                if ticket_data:
+                    (schedule, n_seats) = ticket_data
+                    self._update_taken_seats(schedule, -n_seats)
+
+            except DBError + (SeatConflict,) as e:
+                self._error(e)
                 return 
             
+        elif action == "import":
+            try:
+                orders = _read_orders(kwargs.get("path", None))
+            except (OSError, ValueError) as e:
+                _print_message(f"Error: Reading orders: {e}", self.output)
+                return
+
+            tickets, failed = self.issue_tickets(orders)
+            self._show_tickets(tickets)
+
+            for (order_no, (customer, schedule, n_seats), error) in failed:
+                _print_message(f"Error: Order {order_no} (customer: {customer}, schedule: {schedule}, "
+                               f"seats: {n_seats}): {error}", self.output)
+            if self.output == "table":
+                print(f"Issued {len(tickets)} of {len(orders)} tickets\n")
+
+        elif action == "export":
+            path = kwargs.get("path", None)
+            try:
+                start = time.perf_counter()
+                n_rows = self.export_tickets(path, kwargs.get("date_from", None), kwargs.get("date_to", None))
+                elapsed = time.perf_counter() - start
+                _print_message(f"Exported {n_rows} tickets to {path} in {elapsed:.2f} s "
+                               f"({n_rows / max(elapsed, 1e-9):.0f} rows/s)", self.output)
+
+            except ValueError as e:
+                _print_message(f"Error: Invalid arguments: {e}", self.output)
+
+            except (OSError, ImportError) as e:
+                _print_message(f"Error: Writing {path}: {e}", self.output)
+
+            except DBError as e:
+                self._error(e)
+
         else:
-            print("Error: invalid value of 'action' - must be 'new' or 'cancel'")
+            _print_message("Error: invalid value of 'action' - must be 'showall', 'new', 'hold', 'confirm', 'import', "
+                           "'export' or 'cancel'", self.output)
 
 
     
     def close(self):
-        self.connection.commit()
-        self.connection.close()
+        self._close_replica()
+        if not self.connection:
+            return
+
+        try:
+            self.cursor.close()
+            self.connection.commit()
+            reusable = True
+        except DBError as e:
+            _print_message(f"Error: {e}", self.output)
+            reusable = False
+
+        # Pooled connections are returned for the next login instead of being closed
+        if not self.pool:
+            self.statements.forget(self.connection)
+            self.connection.close()
+        elif reusable:
+            self.pool.checkin(self.connection)
+        else:
+            self.pool.discard(self.connection)
+
         self.connection = None
+        self.cursor = None
 
 
 
 
 
 class Prompt:
-    def __init__(self, connector: DBConnector):
+    def __init__(self, connector: DBConnector, **kwargs):
         self.connector = connector
+        self.read = kwargs.get("read", input)                   # reads a line after printing the prompt
+        self.read_password = kwargs.get("read_password", getpass)
+        self.console = kwargs.get("console", True)              # False when serving a remote terminal
         self.help = """
         Cinema application commands:
-            - repertoire <date> : Displays all movies played on the <date>
-                                  If the <date> parameters is not specified it will be set to the current system date
-            - schedule <date> : Displays all movies with their language, start time and free seats count on the <date>
-                                If the <date> parameters is not specified it will be set to the current system date
+            - repertoire <date> [to_date] : Displays all movies played on the <date> (or from <date> to [to_date])
+                                            If the <date> parameters is not specified it will be set to the current system date
+            - schedule <date> [to_date] : Displays all movies with their language, start time and free seats count on the <date>
+                                          (or from <date> to [to_date])
+                                          If the <date> parameters is not specified it will be set to the current system date
+            - seats <schedule_id> : Displays the seat map of the screening
+            - schedule import <file> : Adds the 'movie_id, room_id, yyyy-mm-dd hh:mm' screenings of the CSV <file>
+                                       in a single transaction - overlapping screenings are rejected
+            - available <n> [date] [hh:mm-hh:mm] [movie_id] : Displays screenings with at least <n> free seats
+                                                             on the [date] (default: the current system date),
+                                                             optionally within a time window and of a single movie
+            - customer find <text> [page] : Lists the customers whose surname or name (the phone number for digits,
+                                            the email for a <text> with '@' or '.') starts with the <text>,
+                                            [page] (default: 1) of the results
             - staff <action> : Staff management:
                                <action> parameter values:
                                     - show : Displays all staff members
-                                    - hire : Adds a new salesman to the staff
-                                    - fire <username> : Removes a salesman from staff
+                                    - hire [username] [password] : Adds a new salesman to the staff
+                                    - fire [username] : Removes a salesman from staff
             - ticket <action> : Ticket mangement
                                 <action> parameter values:
                                     - showall : Displays all current tickets
-                                    - new : Adds a new ticket to the database
+                                    - new [schedule_id] [seats] [customer] : Adds a new ticket to the database - [customer]
+                                                                             is an id or a 'customer find' <text>
+                                    - hold <schedule_id> <n> : Holds <n> seats of the screening for a few minutes
+                                    - confirm <hold_id> [customer_id] : Issues the ticket for the held seats
+                                    - seats <schedule_id> <n> [customer_id] : Issues a ticket for the best <n> adjacent
+                                                                             free seats of the screening
+                                    - import <file> : Issues tickets for all 'customer_id, schedule_id, n_seats'
+                                                      lines of the CSV <file> in a single transaction
+                                    - export <file> [date] [to_date] : Writes all tickets (of the screenings on the [date]
+                                                                       or from [date] to [to_date]) with the customer, movie
+                                                                       and price to a .csv, .csv.gz or .parquet <file>
                                     - cancel <ticket_no> : Cancels the ticket
+            - report <name> [date] [to_date] [archive] : Sales reports of the screenings on the [date] (default: the current system date)
+                                               or from [date] to [to_date], [archive] adds the archived screenings:
+                                                    - occupancy : Taken seats of every screening
+                                                    - movies / rooms / days : Revenue per movie / room / day
+                                                    - top [n] [date] [to_date] : The [n] (default: 10) best selling movies
+            - archive <before_date> : Moves the screenings finished before the <before_date> and their tickets
+                                      to the archive tables
+            - cache : Displays the schedule / repertoire cache hit and miss counters
+            - stats [statements|commands] : Displays the statement and command timing histograms, row counts,
+                                            round-trips and errors (the script mode's jsonl / csv output: the
+                                            statements unless 'commands' is given)
+            - journal [flush] : Displays the journaled ticket sales waiting for the database and the rejected ones,
+                                [flush] sends the waiting sales to the database without waiting for the flush interval
             - exit : Exits the application
         """
 
@@ -413,23 +1689,74 @@ class Prompt:
     def get_credentials(self) -> Credentials:
         c = Credentials()
         while True:
-            username = input("\nUsername: ")
+            username = self.read("\nUsername: ")
             if username == "exit":
                 _close_application(self.connector)
 
             if username == "cancel":
                 return None
 
-            password = getpass("Password: ")
+            password = self.read_password("Password: ")
             if c.set(username, password):
                 break
             
-        print()
+        _print_message("", self.connector.output if self.connector else "table")
         return c
 
 
-    def exec(self) -> bool:
-        command = input("cmd> ")
+    def exec(self, command: str = None) -> bool:
+        if command is None:
+            command = self.read("cmd> ")
+
+        # Every command is a unit of work of its own - see DBConnector.transaction
+        # The journaled sales of the session rejected in the meantime are reported after it
+        metrics = self.connector.metrics
+        try:
+            if not metrics:
+                with self.connector.transaction():
+                    return self._exec(command)
+
+            name = command.split(" ")[0]
+            with metrics.command(name if name in COMMANDS else "invalid"):
+                try:
+                    with self.connector.transaction():
+                        return self._exec(command)
+                finally:
+                    self.connector.flush_metrics()
+        finally:
+            self.connector.report_conflicts()
+
+
+    def _find_customer(self, text: str) -> int:
+        # Customer of a new ticket: an id or a 'customer find' text - several matches are listed
+        # and the id is asked for, no text is the anonymous customer
+        if not text:
+            return 1
+        if text.isdigit():
+            return int(text)
+
+        try:
+            (rows, more) = self.connector.find_customers(text)
+        except DBError as e:
+            _print_message(f"Error: {e}", self.connector.output)
+            return None
+
+        if len(rows) == 1 and not more:
+            return rows[0][0]
+        if not rows:
+            _print_message(f"Error: No customer matching '{text}'", self.connector.output)
+            return None
+
+        self.connector.display_customers(text)
+        customer = self.read("customer_id: ")
+        if not customer.isdigit():
+            _print_message("", self.connector.output)
+            return None
+        return int(customer)
+
+
+
+    def _exec(self, command: str) -> bool:
         args = re.split(" ", command)
         n_args = len(args)
 
@@ -444,26 +1771,34 @@ class Prompt:
             return True
 
         if args[0] == "clear":
-            os.system('cls' if os.name == 'nt' else 'clear')
+            if self.console:
+                os.system('cls' if os.name == 'nt' else 'clear')
+            elif self.connector.output == "table":
+                print("\033[2J\033[H", end='')
 
         elif args[0] == "help":
-            print(self.help)
+            _print_message(self.help, self.connector.output)
 
         elif args[0] == "staff": 
             if n_args < 2:
-                print("Error: Invalid arguments")
+                _print_message("Error: Invalid arguments", self.connector.output)
                 return
 
             if args[1] == "show":
                 self.connector.manage_staff("show")
 
             elif args[1] == "hire":
-                hire = self.get_credentials()
+                if n_args >= 4:
+                    hire = Credentials()
+                    if not hire.set(args[2], args[3], self.connector.output):
+                        return False
+                else:
+                    hire = self.get_credentials()
                 if hire:
                     self.connector.manage_staff("hire", credentials=hire)
 
             elif args[1] == "fire":
-                user = input("Username: ")
+                user = args[2] if n_args >= 3 else self.read("Username: ")
                 if not user or user == "cancel":
                     return False
 
@@ -473,58 +1808,177 @@ class Prompt:
             if n_args == 1:
                 self.connector.display_repertoire(datetime.today().strftime('%Y-%m-%d'))
             else:
-                self.connector.display_repertoire(args[1])
+                self.connector.display_repertoire(*args[1:3])
+
+        elif args[0] == "schedule" and n_args >= 2 and args[1] == "import":
+            if n_args == 2:
+                _print_message("Error: Invalid arguments", self.connector.output)
+                return False
+
+            try:
+                entries = _read_screenings(args[2])
+            except (OSError, ValueError) as e:
+                _print_message(f"Error: Reading the schedule: {e}", self.connector.output)
+                return False
+
+            (added, rejected) = self.connector.import_schedule(entries)
+            for (row_no, (movie, room, start), error) in rejected:
+                _print_message(f"Error: Row {row_no} (movie: {movie}, room: {room}, start: {start}): {error}",
+                               self.connector.output)
+            if self.connector.output == "table":
+                print(f"Added {len(added)} of {len(entries)} screenings")
 
         elif args[0] == "schedule":
             if n_args == 1:
                 self.connector.display_schedule(datetime.today().strftime('%Y-%m-%d'))
             else:
-                self.connector.display_schedule(args[1])
+                self.connector.display_schedule(*args[1:3])
+
+        elif args[0] == "archive":
+            if n_args != 2:
+                _print_message("Error: Invalid arguments", self.connector.output)
+                return False
+
+            try:
+                start = time.perf_counter()
+                (screenings, tickets) = self.connector.archive(args[1])
+                _print_message(f"Archived {screenings} screenings and {tickets} tickets in "
+                               f"{time.perf_counter() - start:.2f} s", self.connector.output)
+
+            except ValueError as e:
+                _print_message(f"Error: Invalid date: {e}", self.connector.output)
+
+            except DBError as e:
+                _print_message(f"Error: {e}", self.connector.output)
+
+        elif args[0] == "cache":
+            self.connector.display_cache()
+
+        elif args[0] == "report":
+            if n_args == 1:
+                _print_message("Error: Invalid arguments", self.connector.output)
+            else:
+                report_args = [arg for arg in args[2:] if arg != "archive"]
+                limit = cinema_reports.TOP_SIZE
+                if args[1] == "top" and report_args and report_args[0].isdigit():
+                    limit = int(report_args.pop(0))
+
+                self.connector.display_report(args[1], *(report_args[:2] or [datetime.today().strftime('%Y-%m-%d')]),
+                                              limit=limit, archive="archive" in args[2:])
+
+        elif args[0] == "stats":
+            self.connector.display_stats(args[1] if n_args >= 2 else None)
+
+        elif args[0] == "journal":
+            if n_args >= 2 and args[1] == "flush" and self.connector.journal:
+                self.connector.journal.flush()
+            self.connector.display_journal()
+
+        elif args[0] == "available":
+            if n_args == 1 or not args[1].isdigit():
+                _print_message("Error: Invalid arguments", self.connector.output)
+            else:
+                try:
+                    (date, filters) = _parse_available_args(args[2:])
+                    self.connector.display_available(int(args[1]), date, **filters)
+                except ValueError as e:
+                    _print_message(f"Error: Invalid arguments: {e}", self.connector.output)
+
+        elif args[0] == "seats":
+            if n_args == 1 or not args[1].isdigit():
+                _print_message("Error: Invalid arguments", self.connector.output)
+            else:
+                self.connector.display_seat_map(int(args[1]))
 
         elif args[0] == "price":
             if n_args == 1:
-                print("Error: Invalid arguments")
+                _print_message("Error: Invalid arguments", self.connector.output)
+            else:
+                self.connector.display_price(args[1])
+
+        elif args[0] == "customer" and n_args >= 3 and args[1] == "find":
+            if n_args >= 4 and (not args[3].isdigit() or not int(args[3])):
+                _print_message("Error: Invalid arguments", self.connector.output)
             else:
-                print(self.connector.get_price(args[1]))
+                self.connector.display_customers(args[2], int(args[3]) if n_args >= 4 else 1)
 
         elif args[0] == "customer":
             if n_args == 1:
-                print("Error: Invalid arguments")
+                _print_message("Error: Invalid arguments", self.connector.output)
             else:
-                print(self.connector.get_customer_data(args[1]))
+                self.connector.display_customer(args[1])
 
         elif args[0] == "ticket":
             if n_args == 1:
-                print("Error: Invalid arguments")
+                _print_message("Error: Invalid arguments", self.connector.output)
             else:
                 if args[1] == "showall":
                     self.connector.manage_tickets("showall")
 
                 elif args[1] == "new":
-                    # TODO: customer = getCustomer()
-                    schedule = input("schedule_id: ")
-                    seats = input("seats: ")
+                    if n_args >= 4:
+                        (schedule, seats, customer) = (args[2], args[3], args[4] if n_args >= 5 else "")
+                    else:
+                        schedule = self.read("schedule_id: ")
+                        seats = self.read("seats: ")
+                        customer = self.read("customer (id or 'customer find' text) [anonymous]: ")
 
-                    if any([(not var or var == "cancel") for var in (schedule, seats)]):
-                        print()
+                    if any([(not var or var == "cancel") for var in (schedule, seats)]) or customer == "cancel":
+                        _print_message("", self.connector.output)
                         return False
 
-                    self.connector.manage_tickets("new", customer_id=1,
-                                                        schedule_id=schedule,
-                                                        n_seats=seats)
+                    customer_id = self._find_customer(customer)
+                    if customer_id:
+                        self.connector.manage_tickets("new", customer_id=customer_id,
+                                                            schedule_id=schedule,
+                                                            n_seats=seats)
+
+                elif args[1] == "hold":
+                    if n_args < 4:
+                        _print_message("Error: Invalid arguments", self.connector.output)
+                    else:
+                        self.connector.manage_tickets("hold", schedule_id=args[2], n_seats=args[3])
+
+                elif args[1] == "confirm":
+                    if n_args == 2:
+                        _print_message("Error: Invalid arguments", self.connector.output)
+                    else:
+                        self.connector.manage_tickets("confirm", hold_id=args[2],
+                                                      customer_id=args[3] if n_args >= 4 else 1)
+
+                elif args[1] == "seats":
+                    if n_args < 4 or not args[2].isdigit() or not args[3].isdigit():
+                        _print_message("Error: Invalid arguments", self.connector.output)
+                    else:
+                        self.connector.issue_seat_ticket(int(args[2]), int(args[3]),
+                                                         int(args[4]) if n_args >= 5 else 1)
+
+                elif args[1] == "import":
+                    if n_args == 2:
+                        _print_message("Error: Invalid arguments", self.connector.output)
+                    else:
+                        self.connector.manage_tickets("import", path=args[2])
+
+                elif args[1] == "export":
+                    if n_args == 2:
+                        _print_message("Error: Invalid arguments", self.connector.output)
+                    else:
+                        self.connector.manage_tickets("export", path=args[2],
+                                                      date_from=args[3] if n_args >= 4 else None,
+                                                      date_to=args[4] if n_args >= 5 else None)
 
                 elif args[1] == "cancel":
                     if n_args == 2:
-                        print("Error: Invalid arguments")
+                        _print_message("Error: Invalid arguments", self.connector.output)
                     else:
                         self.connector.manage_tickets("cancel", id=args[2])
 
                 else:
-                    print("Error: Invalid arguments")
+                    _print_message("Error: Invalid arguments", self.connector.output)
 
 
         else:
-            print("Error: Invalid commant - To get commands' overview type 'help'")
+            _print_message("Error: Invalid commant - To get commands' overview type 'help'", self.connector.output)
 
         return False
 
@@ -533,6 +1987,199 @@ class Prompt:
 
 
 
+def _print_message(message: str, output: str = "table"):
+    # Messages for the user (errors, progress, summaries) - the jsonl / csv output of the script mode is parsed
+    # by other programs and holds only the result sets, its messages go to stderr
+    print(message, file=sys.stdout if output == "table" else sys.stderr)
+
+
+
+def _execute(cursor, query: str, params: tuple = ()):
+    # The cursor with the query's rows to fetch - for the read functions of DBConnector._read
+    cursor.execute(query, params)
+    return cursor
+
+
+
+def _date_range(date_from: str, date_to: str) -> tuple:
+    # [date_from 00:00, date_to + 1 day 00:00) - compares the raw start_time column so
+    # the Schedule.start_time index can be used instead of DATE(start_time) scanning every row
+    start = datetime.strptime(date_from, '%Y-%m-%d')
+    end = datetime.strptime(date_to, '%Y-%m-%d') + timedelta(days=1)
+    if end <= start:
+        raise ValueError(f"{date_to} is before {date_from}")
+    return (start, end)
+
+
+
+def _format_column(values) -> tuple:
+    # (cells, numeric) - numbers are right-aligned on their decimal points
+    values = list(values)
+    numeric = bool(values) and all(value is None or (isinstance(value, (int, float)) and not isinstance(value, bool))
+                                   for value in values)
+    if not numeric:
+        return ["" if value is None else str(value) for value in values], False
+
+    parts = [("", "") if value is None else
+             (str(value), "") if isinstance(value, int) else
+             tuple(_plain_float(value).partition('.')[::2]) for value in values]
+    int_width = max(len(whole) for (whole, _) in parts)
+    frac_width = max((len(frac) + 1 if frac else 0) for (_, frac) in parts)
+    return [whole.rjust(int_width) + (('.' + frac) if frac else "").ljust(frac_width)
+            for (whole, frac) in parts], True
+
+
+
+def _plain_float(value: float) -> str:
+    # All digits of the shortest round-trip repr without the exponent: 1234567.5, 0.0000001, 2
+    text = format(Decimal(repr(value)), 'f')
+    return text.rstrip('0').rstrip('.') if '.' in text else text
+
+
+
+def _customer_columns(text: str) -> list:
+    # Searched columns - a customer is listed under the first one it matches
+    text = text.strip()
+    if re.fullmatch(r"\d+", text):
+        return ['phoneNumber']
+    if '@' in text or '.' in text:
+        return ['email']
+    # Not the emails too - they start with the names, so the email range would be read to the end
+    # only to drop the customers listed under the names already
+    return ['surname', 'name']
+
+
+def _customer_search_query(columns: list, nocase: str) -> str:
+    # UNION ALL of one LIKE prefix range per column, each limited to the rows of the requested pages
+    # Parameters per column: the pattern for it and every earlier column, the row limit
+    # and then the page size + 1 and the offset
+    branches = []
+    for (i, column) in enumerate(columns):
+        # The order of the column's index - (surname, name, id) or (column, id)
+        (key2, order) = ("name", f"surname{nocase}, name{nocase}") if column == "surname" else ("''", column + nocase)
+        earlier = ''.join(f" AND NOT COALESCE({c}, '') LIKE ? ESCAPE '!'" for c in columns[:i])
+        branches.append(f"""
+        SELECT * FROM (SELECT {i} AS g, {column} AS k, {key2} AS k2, id, name, surname, phoneNumber, email
+                           FROM Customers
+                           WHERE {column} LIKE ? ESCAPE '!'{earlier}
+                           ORDER BY {order}, id
+                           LIMIT ?) AS b{i}""")
+
+    return (f"SELECT id, name, surname, phoneNumber, email FROM ({' UNION ALL'.join(branches)}) AS m "
+            f"ORDER BY g, k{nocase}, k2{nocase}, id LIMIT ? OFFSET ?")
+
+
+def _schedule_row(s_id, m_id, title, l_name, l_type, start, s_taken, s_max) -> tuple:
+    return (s_id, f"{m_id}: {title} ({l_name} - {l_type})", start, s_max - s_taken)
+
+
+
+def _ticket_from_row(t_id, c_name, c_surname, c_phone, c_email,
+                     s_id, m_title, l_name, l_type, start, seats, price) -> Ticket:
+    return Ticket(id=t_id,
+                  customer={'Name': c_name,
+                            'Surname': c_surname,
+                            'Phone number': c_phone,
+                            'Email': c_email},
+                  schedule_id=s_id,
+                  movie=f"{m_title} ({l_name} - {l_type})",
+                  start_time=start,
+                  n_seats=seats,
+                  seat_price=price)
+
+
+
+def _read_orders(path: str) -> list:
+    # Reads 'customer_id, schedule_id, n_seats' CSV lines - an optional header line is skipped
+    if not path:
+        raise ValueError("no file given")
+
+    orders = []
+    with open(path, 'r', newline='') as file:
+        for (line_no, row) in enumerate(csv.reader(file), start=1):
+            if not row or row[0].strip().startswith('#'):
+                continue
+            if line_no == 1 and not row[0].strip().isdigit():
+                continue
+            if len(row) != 3:
+                raise ValueError(f"line {line_no}: expected 3 values, got {len(row)}")
+            orders.append(tuple(int(value) for value in row))
+
+    return orders
+
+
+
+def _read_screenings(path: str) -> list:
+    # Reads 'movie_id, room_id, start_time' CSV lines - an optional header line is skipped
+    screenings = []
+    with open(path, 'r', newline='') as file:
+        for (line_no, row) in enumerate(csv.reader(file), start=1):
+            if not row or row[0].strip().startswith('#'):
+                continue
+            if line_no == 1 and not row[0].strip().isdigit():
+                continue
+            if len(row) != 3:
+                raise ValueError(f"line {line_no}: expected 3 values, got {len(row)}")
+            screenings.append((int(row[0]), int(row[1]), datetime.fromisoformat(row[2].strip())))
+
+    return screenings
+
+
+
+@contextmanager
+def _export_writer(path: str, columns: list):
+    # Yields write(rows) for the format given by the final extension of path (ignoring '.part')
+    target = path[:-len(".part")] if path.endswith(".part") else path
+
+    if target.endswith(".parquet"):
+        # pyarrow is optional and only needed here
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        types = [pa.int64(), pa.int64(), pa.string(), pa.string(), pa.string(), pa.string(),
+                 pa.int64(), pa.string(), pa.string(), pa.string(), pa.int64(), pa.timestamp('s'),
+                 pa.int64(), pa.int64(), pa.int64()]
+        schema = pa.schema(list(zip(columns, types)))
+        with pq.ParquetWriter(path, schema) as writer:
+            yield lambda rows: writer.write_table(
+                pa.Table.from_arrays([pa.array(values, type=column_type)
+                                      for (values, column_type) in zip(zip(*rows), types)], schema=schema))
+        return
+
+    if target.endswith(".gz"):
+        import gzip
+        file = gzip.open(path, 'wt', newline='')
+    else:
+        file = open(path, 'w', newline='')
+
+    with file:
+        writer = csv.writer(file, lineterminator='\n')
+        writer.writerow(columns)
+        yield writer.writerows
+
+
+
+def _parse_available_args(args: list) -> tuple:
+    # [date] [hh:mm-hh:mm] [movie_id] in any order -> (date, SeatIndex.find kwargs)
+    date = datetime.today().strftime('%Y-%m-%d')
+    filters = {}
+
+    for arg in args:
+        if ':' in arg:
+            (start, _, end) = arg.partition('-')
+            filters['start'] = datetime.strptime(start, '%H:%M').time()
+            if end:
+                filters['end'] = datetime.strptime(end, '%H:%M').time()
+        elif arg.isdigit():
+            filters['movie_id'] = int(arg)
+        else:
+            datetime.strptime(arg, '%Y-%m-%d')
+            date = arg
+
+    return date, filters
+
+
+
 def _check_input(input: str) -> bool:
     if not input or re.match(".*['\";, ]+.*", input):
         return False
@@ -544,5 +2191,5 @@ def _check_input(input: str) -> bool:
 def _close_application(connector: DBConnector):
     if connector:
         connector.close()
-    print("Bye!")
+    _print_message("Bye!", connector.output if connector else "table")
     raise SystemExit
\ No newline at end of file
@@ -1,9 +1,13 @@
 from getpass import getpass
 import yaml
 
+import cinema_backend
+
 
 
 config = {
+    'engine': 'mariadb',
+    'sqlite_path': 'docs/cinema.sqlite',
     'init_user': 'init',
     'host': 'localhost',
     'port': 3306,
@@ -12,6 +16,56 @@ config = {
         'init': '',
         'salesman': '',
         'manager': ''
+    },
+    'pool': {
+        'size': 4,
+        'idle_timeout': 300,
+        'checkout_timeout': 10,
+        'ping_interval': 5
+    },
+    'cache': {
+        'ttl': 60,
+        'max_size': 64
+    },
+    'seat_index': {
+        'ttl': 300
+    },
+    'holds': {
+        'ttl': 120
+    },
+    'archive': {
+        'chunk': 20
+    },
+    'replica': {
+        'host': None,
+        'port': 3306,
+        'read_your_writes': 5,
+        'retry_interval': 30
+    },
+    'group_commit': {
+        'enabled': False,
+        'role': 'salesman',
+        'window_ms': 5,
+        'max_batch': 64
+    },
+    'journal': {
+        'enabled': False,
+        'path': 'docs/sales_journal.jsonl',
+        'role': 'salesman',
+        'flush_interval': 1,
+        'batch': 500,
+        'refresh_interval': 60
+    },
+    'metrics': {
+        'slow_query_ms': 100,
+        'slow_query_log': 'docs/slow_queries.log',
+        'prometheus_file': None,
+        'dump_interval': 15
+    },
+    'server': {
+        'host': '127.0.0.1',
+        'port': 7070,
+        'max_sessions': 64
     }
 }
 
@@ -20,9 +74,31 @@ config = {
 with open("./docs/db_config.yaml", 'w') as file:
     print("Generating config.yaml...")
 
-    config['credentials']['init'] = getpass("Enter initial user's password: ")
-    config['credentials']['salesman'] = getpass("Enter salesman's password: ")
-    config['credentials']['manager'] = getpass("Enter managers's password: ")
+    config['engine'] = input("Database engine - mariadb or sqlite [mariadb]: ") or 'mariadb'
+
+    if config['engine'] == 'sqlite':
+        # The embedded database has no users - it is created with the first manager's staff account
+        config['sqlite_path'] = input(f"SQLite database file [{config['sqlite_path']}]: ") or config['sqlite_path']
+        username = input("Enter the first manager's username: ")
+        password = getpass("Enter the first manager's password: ")
+
+        connection = cinema_backend.SQLiteBackend(config['sqlite_path']).connect()
+        connection.execute("INSERT OR REPLACE INTO Staff(username, pswd, role) VALUES (?, PASSWORD(?), 'manager')",
+                           (username, password))
+        connection.commit()
+        connection.close()
+
+    else:
+        config['credentials']['init'] = getpass("Enter initial user's password: ")
+        config['credentials']['salesman'] = getpass("Enter salesman's password: ")
+        config['credentials']['manager'] = getpass("Enter managers's password: ")
+
+        # Listings and reports are read from the replica, everything else from the server above
+        replica = input("Read replica host:port (empty: no replica): ")
+        if replica:
+            (host, _, port) = replica.partition(':')
+            config['replica']['host'] = host
+            config['replica']['port'] = int(port or config['port'])
 
     yaml.dump(config, file)
     print("Success!")
\ No newline at end of file
@@ -0,0 +1,212 @@
+import argparse
+import random
+import time
+import yaml
+from datetime import datetime, timedelta
+
+import migrate
+
+
+
+# Number of tickets for the predefined data set sizes
+SIZES = {
+    'small': 1000,
+    'medium': 100000,
+    'large': 10000000
+}
+
+NAMES = ["Anna", "Jan", "Maria", "Piotr", "Katarzyna", "Tomasz", "Agnieszka", "Pawel", "Ewa", "Michal",
+         "Zofia", "Jakub", "Julia", "Adam", "Alicja", "Marek", "Natalia", "Krzysztof", "Ola", "Lukasz"]
+SURNAMES = ["Nowak", "Kowalski", "Wisniewski", "Wojcik", "Kowalczyk", "Kaminski", "Lewandowski", "Zielinski",
+            "Szymanski", "Wozniak", "Dabrowski", "Kozlowski", "Jankowski", "Mazur", "Kwiatkowski", "Krawczyk"]
+WORDS = ["Night", "Return", "Last", "Dark", "City", "Summer", "Dream", "Storm", "Silent", "Lost", "Star",
+         "River", "Secret", "Empire", "Road", "Winter", "Heart", "Shadow", "Glass", "Iron"]
+
+OPENING_TIME = 10 * 60      # first screening of a day [min]
+CLOSING_TIME = 23 * 60      # no screening starts later [min]
+BREAK_TIME = 15             # cleaning break between screenings in a room [min]
+
+
+
+def _next_id(cursor, table: str) -> int:
+    cursor.execute(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {table}")
+    (next_id,) = cursor.fetchone()
+    return next_id
+
+
+
+def _insert(connection, query: str, rows, chunk_size: int) -> int:
+    # executemany in chunks, one transaction per chunk
+    cursor = connection.cursor()
+    chunk = []
+    n_rows = 0
+
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            cursor.executemany(query, chunk)
+            connection.commit()
+            n_rows += len(chunk)
+            chunk = []
+
+    if chunk:
+        cursor.executemany(query, chunk)
+        connection.commit()
+        n_rows += len(chunk)
+    return n_rows
+
+
+
+def _movies(rng: random.Random, first_id: int, n_movies: int, n_languages: int):
+    for movie_id in range(first_id, first_id + n_movies):
+        title = f"{rng.choice(WORDS)} {rng.choice(WORDS)} {movie_id}"
+        yield (movie_id, title, rng.randrange(80, 181, 5), rng.randint(1, n_languages))
+
+
+
+def _rooms(rng: random.Random, first_id: int, n_rooms: int):
+    for room_id in range(first_id, first_id + n_rooms):
+        s_max = rng.choice([40, 60, 80, 120, 200, 300])
+        yield (room_id, s_max, s_max // 2)
+
+
+
+def _customers(rng: random.Random, first_id: int, n_customers: int):
+    for customer_id in range(first_id, first_id + n_customers):
+        name = rng.choice(NAMES)
+        surname = rng.choice(SURNAMES)
+        phone = f"{rng.randint(500, 899)}{customer_id % 1000000:06d}"
+        yield (customer_id, name, surname, phone, f"{name}.{surname}{customer_id}@example.com".lower(), 0)
+
+
+
+def _screenings(rng: random.Random, first_id: int, start_date: datetime, movies: list, rooms: list):
+    # Day by day, room by room: the next screening starts after the previous one and a break,
+    # so the rooms never play overlapping movies
+    schedule_id = first_id
+    day = start_date
+    while True:
+        for (room_id, s_max, _) in rooms:
+            minute = OPENING_TIME + rng.randrange(0, 60, 5)
+            while minute <= CLOSING_TIME:
+                (movie_id, _, length, _) = rng.choice(movies)
+                yield (schedule_id, movie_id, room_id, day + timedelta(minutes=minute), s_max)
+                schedule_id += 1
+                minute += length + BREAK_TIME + (-(length + BREAK_TIME) % 5)
+        day += timedelta(days=1)
+
+
+
+def _tickets(rng: random.Random, first_id: int, n_tickets: int, screenings, customers: tuple,
+             schedule_rows: list):
+    # Every screening is filled up to a random occupancy - the seat capacity is never exceeded
+    ticket_id = first_id
+    for (schedule_id, movie_id, room_id, start, s_max) in screenings:
+        schedule_rows.append((schedule_id, movie_id, room_id, start, 0))
+
+        free = int(s_max * rng.uniform(0.2, 0.95))
+        while free > 0 and ticket_id < first_id + n_tickets:
+            n_seats = min(free, rng.choice([1, 1, 2, 2, 2, 3, 4, 5, 6]))
+            customer = 1 if rng.random() < 0.3 else rng.randint(*customers)
+            yield (ticket_id, customer, schedule_id, n_seats)
+            ticket_id += 1
+            free -= n_seats
+
+        if ticket_id >= first_id + n_tickets:
+            return
+
+
+
+def generate(connection, args):
+    rng = random.Random(args.seed)
+    cursor = connection.cursor()
+    timer = time.perf_counter()
+
+    cursor.execute("SELECT COUNT(*) FROM Languages")
+    (n_languages,) = cursor.fetchone()
+    if not n_languages:
+        cursor.executemany("INSERT INTO Languages(name, type) VALUES (?, ?)",
+                           [("English", "Subtitles"), ("English", "Voiceover"), ("English", "Dubbing")])
+        connection.commit()
+        n_languages = 3
+
+    movies = list(_movies(rng, _next_id(cursor, "Movies"), args.movies, n_languages))
+    _insert(connection, "INSERT INTO Movies(id, title, length, language_id) VALUES (?, ?, ?, ?)",
+            movies, args.chunk)
+    print(f"Movies: {len(movies)}")
+
+    rooms = list(_rooms(rng, _next_id(cursor, "Rooms"), args.rooms))
+    _insert(connection, "INSERT INTO Rooms(id, s_max, ticket_price) VALUES (?, ?, ?)", rooms, args.chunk)
+    print(f"Rooms: {len(rooms)}")
+
+    first_customer = _next_id(cursor, "Customers")
+    n_customers = _insert(connection, """
+        INSERT INTO Customers(id, name, surname, phoneNumber, email, n_tickets) VALUES (?, ?, ?, ?, ?, ?)
+        """, _customers(rng, first_customer, args.customers or max(args.tickets // 10, 1)), args.chunk)
+    print(f"Customers: {n_customers}")
+
+    # The screenings of a chunk of tickets are inserted before the tickets, so the
+    # seat triggers always find their Schedule rows
+    first_schedule = _next_id(cursor, "Schedule")
+    screenings = _screenings(rng, first_schedule, args.start, movies, rooms)
+    schedule_rows = []
+    tickets = _tickets(rng, _next_id(cursor, "Tickets"), args.tickets, screenings,
+                       (first_customer, first_customer + n_customers - 1), schedule_rows)
+
+    ticket_chunk = []
+    (n_schedule, n_tickets) = (0, 0)
+    for ticket in tickets:
+        ticket_chunk.append(ticket)
+        if len(ticket_chunk) == args.chunk:
+            n_schedule += _flush(connection, schedule_rows, ticket_chunk, args.chunk)
+            n_tickets += len(ticket_chunk)
+            (schedule_rows[:], ticket_chunk) = ([], [])
+    n_schedule += _flush(connection, schedule_rows, ticket_chunk, args.chunk)
+    n_tickets += len(ticket_chunk)
+
+    elapsed = time.perf_counter() - timer
+    print(f"Schedule: {n_schedule}")
+    print(f"Tickets: {n_tickets} ({n_tickets / elapsed:.0f} tickets/s, {elapsed:.1f} s in total)")
+
+
+
+def _flush(connection, schedule_rows: list, tickets: list, chunk_size: int) -> int:
+    n_schedule = _insert(connection, """
+        INSERT INTO Schedule(id, movie_id, room_id, start_time, s_taken) VALUES (?, ?, ?, ?, ?)
+        """, schedule_rows, chunk_size)
+    _insert(connection, "INSERT INTO Tickets(id, customer_id, schedule_id, n_seats) VALUES (?, ?, ?, ?)",
+            tickets, chunk_size)
+    return n_schedule
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic cinema data generator")
+    parser.add_argument("--size", choices=SIZES.keys(), default='small',
+                        help="predefined number of tickets: " + ", ".join(f"{k}={v}" for (k, v) in SIZES.items()))
+    parser.add_argument("--tickets", type=int, default=None, help="number of tickets (overrides --size)")
+    parser.add_argument("--customers", type=int, default=None, help="default: tickets / 10")
+    parser.add_argument("--movies", type=int, default=50)
+    parser.add_argument("--rooms", type=int, default=10)
+    parser.add_argument("--start", type=lambda date: datetime.strptime(date, '%Y-%m-%d'),
+                        default=datetime.today().replace(hour=0, minute=0, second=0, microsecond=0),
+                        help="date of the first generated screenings (default: today)")
+    parser.add_argument("--seed", type=int, default=519)
+    parser.add_argument("--chunk", type=int, default=10000, help="rows per executemany / transaction")
+    args = parser.parse_args()
+    args.tickets = args.tickets or SIZES[args.size]
+
+    with open("docs/db_config.yaml", 'r') as file:
+        config = yaml.safe_load(file)
+
+    (backend, connection) = migrate._connect(config)
+    try:
+        migrate.migrate(connection, engine=backend.name)
+        generate(connection, args)
+    finally:
+        connection.close()
+
+
+
+if __name__ == "__main__":
+    main()
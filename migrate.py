@@ -0,0 +1,501 @@
+import argparse
+import yaml
+from datetime import datetime, timedelta
+from getpass import getpass
+
+import cinema_utils as utils
+import cinema_backend
+
+
+
+# Versioned schema migrations: (version, description, statements)
+# Applied in order by an administrator account - the application roles have no DDL privileges
+# A statement is either common SQL or a {backend name: SQL} dict for dialect specific statements
+# (backends missing in the dict skip the statement)
+MIGRATIONS = [
+    (1, "Secondary indexes for the schedule, ticket and customer lookups", [
+        "CREATE INDEX IF NOT EXISTS idx_schedule_start_time ON Schedule(start_time)",
+        "CREATE INDEX IF NOT EXISTS idx_schedule_room_start ON Schedule(room_id, start_time)",
+        "CREATE INDEX IF NOT EXISTS idx_tickets_schedule ON Tickets(schedule_id)",
+        "CREATE INDEX IF NOT EXISTS idx_customers_surname ON Customers(surname, name)",
+        "CREATE INDEX IF NOT EXISTS idx_customers_name ON Customers(name)",
+        "CREATE INDEX IF NOT EXISTS idx_customers_phone ON Customers(phoneNumber)",
+        "CREATE INDEX IF NOT EXISTS idx_customers_email ON Customers(email)"
+    ]),
+    (2, "DailySales summary of the sold tickets maintained by triggers", [
+        """
+        CREATE TABLE IF NOT EXISTS DailySales (
+            day DATE NOT NULL,
+            movie_id INT NOT NULL,
+            room_id INT NOT NULL,
+            tickets INT NOT NULL DEFAULT 0,
+            seats INT NOT NULL DEFAULT 0,
+            revenue INT NOT NULL DEFAULT 0,
+
+            PRIMARY KEY(day, movie_id, room_id)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_daily_sales_movie ON DailySales(movie_id, day)",
+        # Summary of the tickets sold before the triggers existed
+        """
+        INSERT INTO DailySales(day, movie_id, room_id, tickets, seats, revenue)
+            SELECT DATE(s.start_time), s.movie_id, s.room_id, COUNT(t.id), SUM(t.n_seats), SUM(t.n_seats * r.ticket_price)
+                FROM Tickets AS t
+                    JOIN Schedule AS s ON t.schedule_id = s.id
+                    JOIN Rooms AS r ON s.room_id = r.id
+                GROUP BY DATE(s.start_time), s.movie_id, s.room_id
+        """,
+        {'mariadb': """
+        CREATE TRIGGER IF NOT EXISTS dailySalesInsert
+            AFTER INSERT ON Tickets
+            FOR EACH ROW
+            BEGIN
+                INSERT INTO DailySales(day, movie_id, room_id, tickets, seats, revenue)
+                    SELECT DATE(s.start_time), s.movie_id, s.room_id, 1, NEW.n_seats, NEW.n_seats * r.ticket_price
+                        FROM Schedule AS s JOIN Rooms AS r ON s.room_id = r.id
+                        WHERE s.id = NEW.schedule_id
+                    ON DUPLICATE KEY UPDATE tickets = tickets + 1,
+                                            seats = seats + VALUES(seats),
+                                            revenue = revenue + VALUES(revenue);
+            END
+        """,
+         'sqlite': """
+        CREATE TRIGGER IF NOT EXISTS dailySalesInsert
+            AFTER INSERT ON Tickets
+            FOR EACH ROW
+            BEGIN
+                INSERT INTO DailySales(day, movie_id, room_id, tickets, seats, revenue)
+                    SELECT DATE(s.start_time), s.movie_id, s.room_id, 1, NEW.n_seats, NEW.n_seats * r.ticket_price
+                        FROM Schedule AS s JOIN Rooms AS r ON s.room_id = r.id
+                        WHERE s.id = NEW.schedule_id
+                    ON CONFLICT(day, movie_id, room_id) DO UPDATE SET tickets = tickets + 1,
+                                                                      seats = seats + excluded.seats,
+                                                                      revenue = revenue + excluded.revenue;
+            END
+        """},
+        {'mariadb': """
+        CREATE TRIGGER IF NOT EXISTS dailySalesUpdate
+            AFTER UPDATE ON Tickets
+            FOR EACH ROW
+            BEGIN
+                UPDATE DailySales AS d
+                    JOIN Schedule AS s ON d.day = DATE(s.start_time) AND d.movie_id = s.movie_id AND d.room_id = s.room_id
+                    JOIN Rooms AS r ON s.room_id = r.id
+                    SET d.tickets = d.tickets - 1, d.seats = d.seats - OLD.n_seats,
+                        d.revenue = d.revenue - OLD.n_seats * r.ticket_price
+                    WHERE s.id = OLD.schedule_id;
+                INSERT INTO DailySales(day, movie_id, room_id, tickets, seats, revenue)
+                    SELECT DATE(s.start_time), s.movie_id, s.room_id, 1, NEW.n_seats, NEW.n_seats * r.ticket_price
+                        FROM Schedule AS s JOIN Rooms AS r ON s.room_id = r.id
+                        WHERE s.id = NEW.schedule_id
+                    ON DUPLICATE KEY UPDATE tickets = tickets + 1,
+                                            seats = seats + VALUES(seats),
+                                            revenue = revenue + VALUES(revenue);
+            END
+        """,
+         'sqlite': """
+        CREATE TRIGGER IF NOT EXISTS dailySalesUpdate
+            AFTER UPDATE OF schedule_id, n_seats ON Tickets
+            FOR EACH ROW
+            BEGIN
+                UPDATE DailySales
+                    SET tickets = tickets - 1, seats = seats - OLD.n_seats,
+                        revenue = revenue - OLD.n_seats * (SELECT r.ticket_price
+                                                               FROM Schedule AS s JOIN Rooms AS r ON s.room_id = r.id
+                                                               WHERE s.id = OLD.schedule_id)
+                    WHERE (day, movie_id, room_id) = (SELECT DATE(start_time), movie_id, room_id
+                                                          FROM Schedule WHERE id = OLD.schedule_id);
+                INSERT INTO DailySales(day, movie_id, room_id, tickets, seats, revenue)
+                    SELECT DATE(s.start_time), s.movie_id, s.room_id, 1, NEW.n_seats, NEW.n_seats * r.ticket_price
+                        FROM Schedule AS s JOIN Rooms AS r ON s.room_id = r.id
+                        WHERE s.id = NEW.schedule_id
+                    ON CONFLICT(day, movie_id, room_id) DO UPDATE SET tickets = tickets + 1,
+                                                                      seats = seats + excluded.seats,
+                                                                      revenue = revenue + excluded.revenue;
+            END
+        """},
+        {'mariadb': """
+        CREATE TRIGGER IF NOT EXISTS dailySalesDelete
+            AFTER DELETE ON Tickets
+            FOR EACH ROW
+            BEGIN
+                UPDATE DailySales AS d
+                    JOIN Schedule AS s ON d.day = DATE(s.start_time) AND d.movie_id = s.movie_id AND d.room_id = s.room_id
+                    JOIN Rooms AS r ON s.room_id = r.id
+                    SET d.tickets = d.tickets - 1, d.seats = d.seats - OLD.n_seats,
+                        d.revenue = d.revenue - OLD.n_seats * r.ticket_price
+                    WHERE s.id = OLD.schedule_id;
+            END
+        """,
+         'sqlite': """
+        CREATE TRIGGER IF NOT EXISTS dailySalesDelete
+            AFTER DELETE ON Tickets
+            FOR EACH ROW
+            BEGIN
+                UPDATE DailySales
+                    SET tickets = tickets - 1, seats = seats - OLD.n_seats,
+                        revenue = revenue - OLD.n_seats * (SELECT r.ticket_price
+                                                               FROM Schedule AS s JOIN Rooms AS r ON s.room_id = r.id
+                                                               WHERE s.id = OLD.schedule_id)
+                    WHERE (day, movie_id, room_id) = (SELECT DATE(start_time), movie_id, room_id
+                                                          FROM Schedule WHERE id = OLD.schedule_id);
+            END
+        """}
+    ]),
+    # checkMovieOverlap never set movie_length, only caught screenings starting inside another one,
+    # reported an updated screening overlapping itself and counted over the room's whole history
+    # The SQLite triggers already check the [start, start + length) intervals
+    (3, "checkMovieOverlap with the movie length and a bounded start time range", [
+        {'mariadb': "DROP TRIGGER IF EXISTS movieOverlapInsert"},
+        {'mariadb': "DROP TRIGGER IF EXISTS movieOverlapUpdate"},
+        {'mariadb': "DROP PROCEDURE IF EXISTS checkMovieOverlap"},
+        {'mariadb': """
+        CREATE PROCEDURE checkMovieOverlap (schedule INT, movie INT, room INT, start DATETIME)
+        BEGIN
+            DECLARE movie_length, max_length INT DEFAULT 0;
+
+            SET movie_length = (SELECT length FROM Movies WHERE id = movie);
+            SET max_length = (SELECT MAX(length) FROM Movies);
+
+            IF EXISTS (SELECT 1
+                        FROM Schedule AS s JOIN Movies AS m ON s.movie_id = m.id
+                        WHERE s.room_id = room AND s.id <> schedule
+                            AND s.start_time > DATE_SUB(start, INTERVAL max_length MINUTE)
+                            AND s.start_time < DATE_ADD(start, INTERVAL movie_length MINUTE)
+                            AND start < DATE_ADD(s.start_time, INTERVAL m.length MINUTE)) THEN
+                SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Movie overlap';
+            END IF;
+        END
+        """},
+        {'mariadb': """
+        CREATE TRIGGER movieOverlapInsert
+            BEFORE INSERT ON Schedule
+            FOR EACH ROW
+            BEGIN
+                CALL checkMovieOverlap(0, NEW.movie_id, NEW.room_id, NEW.start_time);
+            END
+        """},
+        {'mariadb': """
+        CREATE TRIGGER movieOverlapUpdate
+            BEFORE UPDATE ON Schedule
+            FOR EACH ROW
+            BEGIN
+                -- Only a moved screening can overlap - not the s_taken and version updates of the sales
+                IF NEW.movie_id <> OLD.movie_id OR NEW.room_id <> OLD.room_id OR NEW.start_time <> OLD.start_time THEN
+                    CALL checkMovieOverlap(NEW.id, NEW.movie_id, NEW.room_id, NEW.start_time);
+                END IF;
+            END
+        """}
+    ]),
+    (4, "Seat maps: room rows, per screening seat bitmaps and the seats of the tickets", [
+        {'mariadb': "ALTER TABLE Rooms ADD COLUMN IF NOT EXISTS row_length INT NOT NULL DEFAULT 20 CHECK(row_length > 0)",
+         'sqlite': "ALTER TABLE Rooms ADD COLUMN row_length INT NOT NULL DEFAULT 20 CHECK(row_length > 0)"},
+        # Bit i of seats is set when the seat i is taken (cinema_seatmap.SeatMap), version is
+        # increased by every change for the compare-and-swap updates
+        """
+        CREATE TABLE IF NOT EXISTS SeatMaps (
+            schedule_id INT NOT NULL,
+            seats BLOB NOT NULL,
+            version INT NOT NULL DEFAULT 0,
+
+            PRIMARY KEY(schedule_id),
+
+            CONSTRAINT fk_seat_map_schedule
+                FOREIGN KEY(schedule_id)
+                REFERENCES Schedule(id)
+                ON DELETE CASCADE
+        )
+        """,
+        # Seat numbers of a ticket: 2 bytes per seat (cinema_seatmap.pack)
+        """
+        CREATE TABLE IF NOT EXISTS TicketSeats (
+            ticket_id INT NOT NULL,
+            schedule_id INT NOT NULL,
+            seats BLOB NOT NULL,
+
+            PRIMARY KEY(ticket_id),
+
+            CONSTRAINT fk_ticket_seats_ticket
+                FOREIGN KEY(ticket_id)
+                REFERENCES Tickets(id)
+                ON DELETE CASCADE
+        )
+        """,
+        "INSERT INTO SeatMaps(schedule_id, seats, version) SELECT id, X'', 0 FROM Schedule",
+        """
+        CREATE TRIGGER IF NOT EXISTS seatMapInsert
+            AFTER INSERT ON Schedule
+            FOR EACH ROW
+            BEGIN
+                INSERT INTO SeatMaps(schedule_id, seats, version) VALUES (NEW.id, X'', 0);
+            END
+        """
+    ]),
+    # Every seat hold increases Schedule.version with a compare-and-swap update instead of holding
+    # the screening's row lock until the sale is committed (DBConnector.hold_seats)
+    (5, "Seat holds and the Schedule version for the optimistic ticket sales", [
+        {'mariadb': "ALTER TABLE Schedule ADD COLUMN IF NOT EXISTS version INT NOT NULL DEFAULT 0",
+         'sqlite': "ALTER TABLE Schedule ADD COLUMN version INT NOT NULL DEFAULT 0"},
+        {'mariadb': """
+        CREATE TABLE IF NOT EXISTS SeatHolds (
+            id INT NOT NULL AUTO_INCREMENT,
+            schedule_id INT NOT NULL,
+            n_seats INT NOT NULL CHECK(n_seats > 0),
+            expires_at DATETIME NOT NULL,
+
+            PRIMARY KEY(id),
+
+            CONSTRAINT fk_seat_hold_schedule
+                FOREIGN KEY(schedule_id)
+                REFERENCES Schedule(id)
+                ON DELETE CASCADE
+        )
+        """,
+         'sqlite': """
+        CREATE TABLE IF NOT EXISTS SeatHolds (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            schedule_id INT NOT NULL REFERENCES Schedule(id) ON DELETE CASCADE,
+            n_seats INT NOT NULL CHECK(n_seats > 0),
+            expires_at DATETIME NOT NULL
+        )
+        """},
+        "CREATE INDEX IF NOT EXISTS idx_seat_holds_schedule ON SeatHolds(schedule_id, expires_at)"
+    ]),
+    # 'customer find': the MariaDB indexes of migration 1 serve the case-insensitive LIKE prefixes already,
+    # SQLite optimizes a LIKE prefix into an index range only with a NOCASE index
+    (6, "Case-insensitive customer indexes for the prefix search", [
+        {'sqlite': "CREATE INDEX IF NOT EXISTS idx_customers_surname_nocase "
+                   "ON Customers(surname COLLATE NOCASE, name COLLATE NOCASE)"},
+        {'sqlite': "CREATE INDEX IF NOT EXISTS idx_customers_name_nocase ON Customers(name COLLATE NOCASE)"},
+        {'sqlite': "CREATE INDEX IF NOT EXISTS idx_customers_phone_nocase ON Customers(phoneNumber COLLATE NOCASE)"},
+        {'sqlite': "CREATE INDEX IF NOT EXISTS idx_customers_email_nocase ON Customers(email COLLATE NOCASE)"}
+    ]),
+    # 'archive <before-date>' moves finished screenings and their tickets (with their seats) out of the hot tables
+    # (DBConnector.archive). Their sales stay in DailySales: a ticket deleted after it was copied
+    # to ArchiveTickets is not subtracted by dailySalesDelete, nor by takenSeatsDelete from its
+    # screening (deleted with it)
+    (7, "Archive tables of the finished screenings and their tickets", [
+        """
+        CREATE TABLE IF NOT EXISTS ArchiveSchedule (
+            id INT NOT NULL,
+            movie_id INT NOT NULL,
+            room_id INT NOT NULL,
+            start_time DATETIME NOT NULL,
+            s_taken INT NOT NULL,
+
+            PRIMARY KEY(id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS ArchiveTickets (
+            id INT NOT NULL,
+            customer_id INT NOT NULL,
+            schedule_id INT NOT NULL,
+            n_seats INT NOT NULL,
+
+            PRIMARY KEY(id)
+        )
+        """,
+        # The seats of the archived tickets - TicketSeats rows are deleted with their tickets
+        """
+        CREATE TABLE IF NOT EXISTS ArchiveTicketSeats (
+            ticket_id INT NOT NULL,
+            schedule_id INT NOT NULL,
+            seats BLOB NOT NULL,
+
+            PRIMARY KEY(ticket_id)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_archive_schedule_start_time ON ArchiveSchedule(start_time)",
+        "CREATE INDEX IF NOT EXISTS idx_archive_tickets_schedule ON ArchiveTickets(schedule_id)",
+        "DROP TRIGGER IF EXISTS takenSeatsDelete",
+        {'mariadb': """
+        CREATE TRIGGER takenSeatsDelete
+            BEFORE DELETE ON Tickets
+            FOR EACH ROW
+            BEGIN
+                IF NOT EXISTS (SELECT 1 FROM ArchiveTickets WHERE id = OLD.id) THEN
+                    CALL updateTakenSeats(OLD.schedule_id, OLD.n_seats, 0);
+                END IF;
+            END
+        """,
+         'sqlite': """
+        CREATE TRIGGER takenSeatsDelete
+            BEFORE DELETE ON Tickets
+            FOR EACH ROW WHEN NOT EXISTS (SELECT 1 FROM ArchiveTickets WHERE id = OLD.id)
+            BEGIN
+                SELECT RAISE(ABORT, 'Seat number overflow')
+                    FROM Schedule AS s
+                    WHERE s.id = OLD.schedule_id AND s.s_taken - OLD.n_seats < 0;
+                UPDATE Schedule SET s_taken = s_taken - OLD.n_seats WHERE id = OLD.schedule_id;
+            END
+        """},
+        "DROP TRIGGER IF EXISTS dailySalesDelete",
+        {'mariadb': """
+        CREATE TRIGGER dailySalesDelete
+            AFTER DELETE ON Tickets
+            FOR EACH ROW
+            BEGIN
+                IF NOT EXISTS (SELECT 1 FROM ArchiveTickets WHERE id = OLD.id) THEN
+                    UPDATE DailySales AS d
+                        JOIN Schedule AS s ON d.day = DATE(s.start_time) AND d.movie_id = s.movie_id AND d.room_id = s.room_id
+                        JOIN Rooms AS r ON s.room_id = r.id
+                        SET d.tickets = d.tickets - 1, d.seats = d.seats - OLD.n_seats,
+                            d.revenue = d.revenue - OLD.n_seats * r.ticket_price
+                        WHERE s.id = OLD.schedule_id;
+                END IF;
+            END
+        """,
+         'sqlite': """
+        CREATE TRIGGER dailySalesDelete
+            AFTER DELETE ON Tickets
+            FOR EACH ROW WHEN NOT EXISTS (SELECT 1 FROM ArchiveTickets WHERE id = OLD.id)
+            BEGIN
+                UPDATE DailySales
+                    SET tickets = tickets - 1, seats = seats - OLD.n_seats,
+                        revenue = revenue - OLD.n_seats * (SELECT r.ticket_price
+                                                               FROM Schedule AS s JOIN Rooms AS r ON s.room_id = r.id
+                                                               WHERE s.id = OLD.schedule_id)
+                    WHERE (day, movie_id, room_id) = (SELECT DATE(start_time), movie_id, room_id
+                                                          FROM Schedule WHERE id = OLD.schedule_id);
+            END
+        """}
+    ]),
+    # Sales of the local sales journal (cinema_journal.SalesJournal) sold so far - committed with their
+    # tickets, so a batch replayed after a crash skips the sales which reached the database
+    (8, "Journaled ticket sales", [
+        """
+        CREATE TABLE IF NOT EXISTS JournalSales (
+            sale_id CHAR(32) NOT NULL,
+            ticket_id INT NOT NULL,
+
+            PRIMARY KEY(sale_id)
+        )
+        """
+    ])
+]
+
+
+
+# Queries whose plans must use an index: (name, query, parameters, table alias, accepted indexes)
+_day = datetime.today().replace(hour=0, minute=0, second=0, microsecond=0)
+EXPLAIN_CHECKS = [
+    ("schedule", utils.SCHEDULE_QUERY, (_day, _day + timedelta(days=1)),
+        's', {'idx_schedule_start_time', 'idx_schedule_room_start'}),
+    ("repertoire", utils.REPERTOIRE_QUERY, (_day, _day + timedelta(days=1)),
+        's', {'idx_schedule_start_time', 'idx_schedule_room_start'}),
+    ("tickets of a screening", "SELECT id FROM Tickets AS t WHERE t.schedule_id = ?", (1,),
+        't', {'idx_tickets_schedule', 'fk_schedule'}),
+    ("customer by surname", "SELECT id FROM Customers AS c WHERE c.surname = ?", ('Smith',),
+        'c', {'idx_customers_surname'}),
+    ("customer by phone", "SELECT id FROM Customers AS c WHERE c.phoneNumber = ?", ('123456789',),
+        'c', {'idx_customers_phone'}),
+    ("customer by email", "SELECT id FROM Customers AS c WHERE c.email = ?", ('a@b.c',),
+        'c', {'idx_customers_email'}),
+    ("customer surname prefix", "SELECT id FROM Customers AS c WHERE c.surname LIKE ? ESCAPE '!'", ('Kow%',),
+        'c', {'idx_customers_surname', 'idx_customers_surname_nocase'}),
+    ("customer phone prefix", "SELECT id FROM Customers AS c WHERE c.phoneNumber LIKE ? ESCAPE '!'", ('600%',),
+        'c', {'idx_customers_phone', 'idx_customers_phone_nocase'})
+]
+
+
+
+def _connect(config: dict):
+    backend = cinema_backend.backend_from_config(config)
+    credentials = utils.Credentials()
+    if backend.has_users:
+        credentials.username = input("Administrator username: ")
+        credentials.password = getpass("Password: ")
+
+    try:
+        return backend, backend.connect(credentials, config['host'], config['port'], config['database'])
+    except cinema_backend.Error as e:
+        print(f"Error: Database connection: {e}")
+        raise SystemExit(1)
+
+
+
+def _current_version(cursor) -> int:
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS SchemaVersion (
+        version INT NOT NULL,
+        description VARCHAR(100) NOT NULL,
+        applied_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+        PRIMARY KEY(version)
+    )
+    """)
+
+    cursor.execute("SELECT MAX(version) FROM SchemaVersion")
+    (version,) = cursor.fetchone()
+    return version or 0
+
+
+
+def migrate(connection, target: int = None, engine: str = "mariadb") -> int:
+    # engine: name of the backend - selects the dialect specific statements
+    cursor = connection.cursor()
+    version = _current_version(cursor)
+
+    for (m_version, description, statements) in MIGRATIONS:
+        if m_version <= version or (target is not None and m_version > target):
+            continue
+
+        print(f"Applying migration {m_version}: {description}...")
+        for statement in statements:
+            if isinstance(statement, dict):
+                statement = statement.get(engine, None)
+            if statement:
+                cursor.execute(statement)
+        cursor.execute("INSERT INTO SchemaVersion(version, description) VALUES (?, ?)",
+                       (m_version, description))
+        connection.commit()
+        version = m_version
+
+    print(f"Schema version: {version}")
+    return version
+
+
+
+def explain(backend, connection) -> bool:
+    cursor = connection.cursor()
+    all_used = True
+
+    for (name, query, params, table, indexes) in EXPLAIN_CHECKS:
+        key = backend.explain_index(cursor, query, params, table)
+
+        used = key in indexes
+        all_used = all_used and used
+        print(f"{'OK' if used else 'FAIL':<5} {name:<24} {table}: index={key}")
+
+    return all_used
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cinema database schema migrations")
+    parser.add_argument("--to", type=int, default=None, help="migrate up to this version only")
+    parser.add_argument("--status", action="store_true", help="only print the current schema version")
+    parser.add_argument("--explain", action="store_true",
+                        help="check with EXPLAIN that the lookup queries use the indexes")
+    args = parser.parse_args()
+
+    with open("docs/db_config.yaml", 'r') as file:
+        config = yaml.safe_load(file)
+
+    (backend, connection) = _connect(config)
+    try:
+        if args.status:
+            print(f"Schema version: {_current_version(connection.cursor())}")
+        elif args.explain:
+            if not explain(backend, connection):
+                raise SystemExit(1)
+        else:
+            migrate(connection, args.to, backend.name)
+    finally:
+        connection.close()
+
+
+
+if __name__ == "__main__":
+    main()